@@ -1,14 +1,54 @@
 """Library for the AS7343 Visible Light Spectral Sensor."""
+import operator
+import struct
 import time
+from array import array
+from collections import namedtuple
+from contextlib import contextmanager
 
 from i2cdevice import BitField, Device, Register
-from i2cdevice.adapter import Adapter, LookupAdapter, U16ByteSwapAdapter
+from i2cdevice.adapter import Adapter, LookupAdapter
 
 __version__ = '0.0.2'
 
 
 PART_ID = 0b10000001
 
+# SMBus block reads are limited to 32 bytes, longer reads are split up
+# unless the bus supports combined i2c_rdwr transactions.
+I2C_BLOCK_MAX = 32
+
+# Time in seconds between polls of the sensor when no interrupt is available
+POLL_INTERVAL = 0.001
+
+# When polling for FIFO frames, wake this long (seconds) before the next frame is
+# due, adjusted as frames arrive, and back off polls up to this fraction of a frame
+SCHEDULE_LEAD = 0.002
+SCHEDULE_BACKOFF = 0.125
+
+# When waiting on the INT pin, re-check the sensor at least this often (seconds)
+# in case an edge was missed.
+INTERRUPT_RECHECK = 0.1
+
+# INT_BUSY is set for ~300us after power on, allow much longer for a soft reset
+RESET_POLL_INTERVAL = 0.001
+RESET_TIMEOUT = 2.0
+
+# Integration time is (ATIME + 1) x (ASTEP + 1) steps of 2.78us, and the ADC
+# full scale is (ATIME + 1) x (ASTEP + 1) counts, up to a maximum of 65535
+STEP_US = 2.78
+ADC_MAX = 65535
+ATIME_MAX = 255
+ASTEP_MAX = 65534  # 65535 must not be used
+
+# FIFO threshold for each channel count, chosen to fall between the last two
+# seven-entry cycles so FINT fires only once the whole frame is in the FIFO.
+FIFO_THRESHOLD = {
+    6: 4,
+    12: 8,
+    18: 16
+}
+
 COMPENSATION_GAIN = {
     "F1": 1.84,
     "F2": 6.03,
@@ -191,294 +231,741 @@ class ResultCycle3(ResultCycle):
             yield c
 
 
+# Non-volatile registers below 0x80, which can only be read with REG_BANK set
+BANK1_SHADOWED = ('AUXID', 'REVID', 'ID', 'CFG10', 'CFG12')
+
+# Channel order of a SpectralFrame
+CHANNELS = ('F1', 'F2', 'F3', 'F4', 'F5', 'F6', 'F7', 'F8', 'FZ', 'FY', 'FXL', 'NIR', 'VIS')
+
+# Compensation gain for each channel, in CHANNELS order
+COMPENSATION = array('d', [COMPENSATION_GAIN.get(channel, 1.0) for channel in CHANNELS])
+
+# Channels in FIFO order for each auto SMUX cycle, after ASTATUS.
+# The VIS channel is taken from the first cycle, None entries are skipped.
+CYCLE_CHANNELS = (
+    ('FZ', 'FY', 'FXL', 'NIR', 'VIS', None),
+    ('F2', 'F3', 'F4', 'F6', None, None),
+    ('F1', 'F7', 'F8', 'F5', None, None),
+)
+
+# Index into one frame of FIFO results for each channel in CHANNELS,
+# or -1 if the channel isn't read, keyed by the number of SMUX cycles.
+FRAME_INDEX = {}
+for _cycles in (1, 2, 3):
+    _index = [-1] * len(CHANNELS)
+    for _cycle in range(_cycles):
+        for _n, _channel in enumerate(CYCLE_CHANNELS[_cycle]):
+            if _channel is not None:
+                _index[CHANNELS.index(_channel)] = _cycle * 7 + 1 + _n
+    FRAME_INDEX[_cycles] = tuple(_index)
+del _cycles, _index, _cycle, _n, _channel
+
+
+class SpectralFrame:
+    """Store a complete AS7343 frame in a compact array.
+
+    Raw counts are held in an array('H') in CHANNELS order, with zero for
+    any channel not read in 6 or 12 channel modes.
+
+    :param counts: array('H') of raw counts in CHANNELS order
+    :param astatus: ASTATUS value, saturation from any cycle is merged in
+    :param atime: ATIME register value the frame was integrated with
+    :param astep: ASTEP register value the frame was integrated with
+    :param timestamp: Host time the frame was read
+    :param cycles: Number of auto SMUX cycles (1, 2 or 3) in the frame
+
+    """
+    __slots__ = ('counts', 'astatus', 'saturated', 'gain', 'atime', 'astep', 'timestamp', 'cycles')
+
+    def __init__(self, counts, astatus, atime=0, astep=0, timestamp=None, cycles=3):
+        self.counts = counts
+        self.cycles = cycles
+        self.astatus = astatus & 0b10001111
+        self.saturated = self.astatus & 0b10000000 > 0
+        gain = self.astatus & 0b00001111
+        self.gain = 1 << (gain - 1) if gain else 0.5
+        self.atime = atime
+        self.astep = astep
+        self.timestamp = time.time() if timestamp is None else timestamp
+
+    @classmethod
+    def from_results(cls, results, atime=0, astep=0, timestamp=None, cycles=None):
+        """Build a frame from FIFO ordered results (see AS7343.read_fifo).
+
+        :param results: 7, 14 or 21 FIFO entries
+        :param atime: ATIME register value
+        :param astep: ASTEP register value
+        :param timestamp: Host time the frame was read
+        :param cycles: Number of auto SMUX cycles, by default from the length of results
+
+        """
+        if cycles is None:
+            cycles = len(results) // 7
+        counts = array('H', [results[i] if i >= 0 else 0 for i in FRAME_INDEX[cycles]])
+        astatus = results[0]
+        for cycle in range(1, cycles):
+            astatus |= results[cycle * 7] & 0b10000000
+        return cls(counts, astatus, atime, astep, timestamp, cycles)
+
+    def to_results(self):
+        """Rebuild FIFO ordered results for this frame.
+
+        Channels a SpectralFrame doesn't keep (the second VIS entry of
+        each cycle) are returned as zero.
+
+        """
+        results = [0] * (self.cycles * 7)
+        for cycle in range(self.cycles):
+            results[cycle * 7] = self.astatus
+        for channel, index in enumerate(FRAME_INDEX[self.cycles]):
+            if index >= 0:
+                results[index] = self.counts[channel]
+        return results
+
+    def __getitem__(self, channel):
+        return self.counts[CHANNELS.index(channel)]
+
+    def __len__(self):
+        return len(self.counts)
+
+    def raw(self):
+        """Get a zero-copy memoryview of the raw counts."""
+        return memoryview(self.counts)
+
+    def compensated(self):
+        """Get the counts multiplied by COMPENSATION_GAIN, as an array('d')."""
+        return array('d', map(operator.mul, self.counts, COMPENSATION))
+
+    def numpy(self):
+        """Get a zero-copy NumPy uint16 view of the raw counts. Requires numpy."""
+        import numpy
+        return numpy.frombuffer(self.counts, dtype=numpy.uint16)
+
+    def as_dict(self):
+        """Get compensated values keyed by lower case channel name, like get_data()."""
+        result = dict(zip((channel.lower() for channel in CHANNELS), map(int, self.compensated())))
+        result['saturated'] = self.saturated
+        result['gain'] = self.gain
+        return result
+
+
+def decode_results(results, read_cycles=None):
+    """Decode one frame of FIFO ordered results into a tuple of ResultCycle dicts.
+
+    :param results: 7, 14 or 21 FIFO entries, for 6, 12 or 18 channels
+    :param read_cycles: Number of auto SMUX cycles, by default from the length of results
+
+    """
+    if read_cycles is None:
+        read_cycles = len(results) // 7
+    if read_cycles == 3:
+        return (
+            dict(ResultCycle1(*results[0:7])),
+            dict(ResultCycle2(*results[7:14])),
+            dict(ResultCycle3(*results[14:21])),
+        )
+    elif read_cycles == 2:
+        return (
+            dict(ResultCycle1(*results[0:7])),
+            dict(ResultCycle2(*results[7:14]))
+        )
+    elif read_cycles == 1:
+        return (
+            dict(ResultCycle1(*results[0:7])),
+        )
+
+
+def _frame_data(spectral_frame, frame):
+    """Get a SpectralFrame as get_data() would return it, shared by the daemon and shm readers.
+
+    :param spectral_frame: SpectralFrame to return
+    :param frame: Return the SpectralFrame itself instead of a tuple of dicts
+
+    """
+    if frame:
+        return spectral_frame
+    return decode_results(spectral_frame.to_results(), spectral_frame.cycles)
+
+
+def solve_integration_time(time_us):
+    """Find the ATIME and ASTEP values closest to an integration time.
+
+    Tries every ATIME that can reach the time with the nearest ASTEP and
+    keeps the closest, preferring the smallest ATIME, eg: 100001 steps is
+    exactly 11 x 9091 but only 2 x 50000 with the smallest ATIME.
+
+    :param time_us: Integration time in microseconds
+    :returns: (ATIME, ASTEP) register values
+
+    """
+    steps = round(time_us / STEP_US)
+    if steps < 1 or time_us > (ATIME_MAX + 1) * (ASTEP_MAX + 1) * STEP_US:
+        raise ValueError("Integration time out of range.")
+    # The closest (ATIME + 1) x (ASTEP + 1) depends on the factors of steps,
+    # which have no closed form, so solve ASTEP for each ATIME from the
+    # smallest that can reach steps. Anything up to 65535 steps is exact
+    # with the first, so the loop only runs on for long integration times.
+    best = None
+    for atime in range((steps - 1) // (ASTEP_MAX + 1), ATIME_MAX + 1):
+        astep = min(max(round(steps / (atime + 1)), 1), ASTEP_MAX + 1) - 1
+        error = abs((atime + 1) * (astep + 1) - steps)
+        if best is None or error < best[0]:
+            best = (error, atime, astep)
+            if error == 0:
+                break
+    return best[1], best[2]
+
+
+# A single frame from AS7343.stream()
+# sequence: frame number since the stream started, including dropped frames
+# timestamp: host time (time.time()) the frame was estimated to complete
+# dropped: number of frames lost to a FIFO overflow just before this one
+# data: the frame, as returned by get_data() (a SpectralFrame if requested)
+StreamFrame = namedtuple('StreamFrame', ('sequence', 'timestamp', 'dropped', 'data'))
+
+
+class _FrameSchedule:
+    """Predict when the next whole frame will be in the FIFO.
+
+    Starts from the frame period set by ATIME, ASTEP, WTIME and the channel
+    count, and learns the real cadence from when frames turn up, so a read
+    can sleep until just before a frame is due instead of polling.
+
+    :param t_start: Time the measurement started, or None if not known
+    :param period: Configured frame period in seconds
+    :param frame_size: FIFO entries per frame
+
+    """
+    def __init__(self, t_start, period, frame_size):
+        self.nominal = period
+        self.period = period
+        self.frame_size = frame_size
+        self.lead = SCHEDULE_LEAD
+        self.words = 0
+        self.anchor(t_start, 0)
+        self._slept = False
+
+    def anchor(self, t, frames):
+        """Count frames from one that arrived at time t, or from none if t is None."""
+        self.t_anchor = t
+        self.n_anchor = frames
+
+    def clear(self):
+        """Forget where the FIFO is up to, eg: after it's cleared."""
+        self.words = 0
+        self.anchor(None, 0)
+
+    @property
+    def max_interval(self):
+        """Longest time to back off between polls."""
+        return max(POLL_INTERVAL, self.period * SCHEDULE_BACKOFF)
+
+    def delay(self, t_now):
+        """Get the time in seconds to sleep before polling for the next frame."""
+        if self.t_anchor is None:
+            return 0
+        due = self.t_anchor + (self.words // self.frame_size + 1 - self.n_anchor) * self.period
+        delay = due - self.lead - t_now
+        self._slept = delay > 0
+        return delay
+
+    def arrived(self, t_now, level, polls):
+        """Learn from a successful wait.
+
+        :param t_now: Time the frame was found
+        :param level: FIFO level found
+        :param polls: Number of times the FIFO level was read
+
+        """
+        frames = (self.words + level) // self.frame_size
+        if self.t_anchor is None:
+            self.anchor(t_now, frames)
+            return
+        if frames <= self.n_anchor:
+            return
+        # Average over every frame since the anchor
+        period = (t_now - self.t_anchor) / (frames - self.n_anchor)
+        if polls == 1:
+            # Already there on waking, so it turned up some time earlier,
+            # and the period can be no longer than this
+            if self._slept:
+                self.lead = min(self.lead * 2, self.period / 4)
+            period = min(period, self.period)
+        elif polls > 3:
+            self.lead = max(self.lead / 2, POLL_INTERVAL)
+        # Ignore outliers, eg: from a restart
+        if 0.5 * self.nominal <= period <= 1.5 * self.nominal:
+            self.period = period
+
+
+# Steps of a wait, see _wait_steps()
+_WAIT_POLL = 0
+_WAIT_SLEEP = 1
+_WAIT_INTERRUPT = 2
+
+
+def _wait_steps(interrupt, timeout, message, schedule=None):
+    """Plan the waits for AS7343._wait_for(), shared with the asyncio driver.
+
+    Yields (step, seconds) for the driver to carry out:
+
+        _WAIT_POLL       call ready() and send back its result
+        _WAIT_SLEEP      sleep for seconds
+        _WAIT_INTERRUPT  wait up to seconds for INT, clearing it if it fires
+
+    and returns the first truthy ready() result.
+
+    :param interrupt: True if the sensor has an interrupt source
+    :param timeout: Time in seconds before TimeoutError is raised
+    :param message: Message for the TimeoutError
+    :param schedule: Optional _FrameSchedule for FIFO frames
+
+    """
+    t_start = time.time()
+    if schedule is not None and not interrupt:
+        delay = schedule.delay(t_start)
+        if delay > 0:
+            yield _WAIT_SLEEP, min(delay, timeout)
+    result = yield _WAIT_POLL, None
+    polls = 1
+    interval = POLL_INTERVAL
+    while not result:
+        remaining = timeout - (time.time() - t_start)
+        if remaining <= 0:
+            raise TimeoutError(message)
+        if interrupt:
+            yield _WAIT_INTERRUPT, min(remaining, INTERRUPT_RECHECK)
+        else:
+            yield _WAIT_SLEEP, interval
+            if schedule is not None:
+                interval = min(interval * 2, schedule.max_interval)
+        result = yield _WAIT_POLL, None
+        polls += 1
+    if schedule is not None:
+        schedule.arrived(time.time(), result, polls)
+    return result
+
+
+class _StreamState:
+    """Track sequence numbers and timing for AS7343.stream()."""
+    def __init__(self, frame_size, period, decode):
+        self.frame_size = frame_size
+        self.period = period
+        self.decode = decode
+        self.sequence = 0
+        self.dropped = 0
+        self.t_last = time.time()
+
+    def overflow(self, t_now):
+        """Account for the frames lost to a FIFO overflow."""
+        lost = max(1, round((t_now - self.t_last) / self.period))
+        self.sequence += lost
+        self.dropped += lost
+        self.t_last = t_now
+
+    def split(self, words, t_now):
+        """Split drained FIFO words into StreamFrames.
+
+        Frames drained together are back-dated by the frame period.
+
+        """
+        frames = []
+        count = len(words) // self.frame_size
+        for n in range(count):
+            timestamp = t_now - (count - 1 - n) * self.period
+            data = self.decode(words[n * self.frame_size:(n + 1) * self.frame_size], timestamp)
+            frames.append(StreamFrame(self.sequence, timestamp, self.dropped, data))
+            self.sequence += 1
+            self.dropped = 0
+        self.t_last = t_now
+        return frames
+
+
+# The AS7343 register map, shared by all instances
+REGISTERS = (
+    # BANK 1
+    Register('AUXID', 0x58, fields=(
+        BitField('AUXID', 0b00001111),   # Auxiliary Identification (0b0000)
+    ), volatile=False),
+    Register('REVID', 0x59, fields=(
+        BitField('REVID', 0b00000111),   # Revision ID (0b000)
+    ), volatile=False),
+    Register('ID', 0x5A, fields=(
+        BitField('ID', 0b11111111),      # Part Number (0b10000001)
+    ), volatile=False),
+    Register('CFG12', 0x66, fields=(
+        BitField('SP_TH_CH', 0b00000111),  # Spectral Threshold Channel
+    ), volatile=False),
+
+    # BANK 0
+    Register('ENABLE', 0x80, fields=(
+        BitField('FDEN', 0b01000000),     # Flicker Detection Enable
+        BitField('SMUXEN', 0b00010000),   # SMUX Enable
+        BitField('WEN', 0b00001000),      # Wait Enable
+        BitField('SP_EN', 0b00000010),    # Spectral Measurement Enable
+        BitField('PON', 0b00000001)       # Power On
+    )),
+    Register('ATIME', 0x81, fields=(
+        BitField('ATIME', 0xFF),          # Integration Time
+                                          # Number of integration steps from 0 to 255
+                                          # (ATIME + 1) x (ASTEP + 1) x 2.78us
+                                          # ADCfs = (ATIME + 1) x (ASTEP + 1)
+    ), volatile=False),
+    Register('ASTEP', 0xD4, fields=(
+        # Integration Time Step Size
+        # 0 = 2.87us
+        # n 2.87us x (n + 1)
+        BitField('ASTEP', 0xFFFF, adapter=ASTEPAdapter()),
+    ), bit_width=16, volatile=False),
+
+    # Spectral Measurement Wait Time
+    # 0 = 1 cycle = 2.78ms
+    # n = 2.78ms x (n + 1)
+    Register('WTIME', 0x83, fields=(
+        BitField('WTIME', 0xFF, adapter=WTIMEAdapter()),
+    ), volatile=False),
+    Register('SP_TH', 0x84, fields=(
+        BitField('SP_TH_L', 0x0000FFFF),  # Spectral Low Threshold
+        BitField('SP_TH_H', 0xFFFF0000)   # Spectral High Threshold
+    ), bit_width=8 * 4, volatile=False),
+    Register('STATUS', 0x93, fields=(
+        BitField('ASAT', 0b10000000),     # Spectral Saturation (if ASIEN set)
+        BitField('AINT', 0b00001000),     # Spectral Channel Interrupt (if SP_IEN set)
+        BitField('FINT', 0b00000100),     # FIFO Buffer Interrupt
+        BitField('SINT', 0b00000001)      # System Interrupt
+    )),
+    Register('ASTATUS', 0x94, fields=(
+        BitField('ASAT_STATUS', 0b10000000),  # Saturation Status
+        BitField('AGAIN_STATUS', 0b00000111)  # Gain Status
+    )),
+    Register('DATA', 0x95, fields=(
+        BitField('DATA_0', 0xFFFF << (0 * 8 * 2)),
+        BitField('DATA_1', 0xFFFF << (1 * 8 * 2)),
+        BitField('DATA_2', 0xFFFF << (2 * 8 * 2)),
+        BitField('DATA_3', 0xFFFF << (3 * 8 * 2)),
+        BitField('DATA_4', 0xFFFF << (4 * 8 * 2)),
+        BitField('DATA_5', 0xFFFF << (5 * 8 * 2)),
+        BitField('DATA_6', 0xFFFF << (6 * 8 * 2)),
+        BitField('DATA_7', 0xFFFF << (7 * 8 * 2)),
+        BitField('DATA_8', 0xFFFF << (8 * 8 * 2)),
+        BitField('DATA_9', 0xFFFF << (9 * 8 * 2)),
+        BitField('DATA_10', 0xFFFF << (10 * 8 * 2)),
+        BitField('DATA_11', 0xFFFF << (11 * 8 * 2)),
+        BitField('DATA_12', 0xFFFF << (12 * 8 * 2)),
+        BitField('DATA_13', 0xFFFF << (13 * 8 * 2)),
+        BitField('DATA_14', 0xFFFF << (14 * 8 * 2)),
+        BitField('DATA_15', 0xFFFF << (15 * 8 * 2)),
+        BitField('DATA_16', 0xFFFF << (16 * 8 * 2)),
+        BitField('DATA_17', 0xFFFF << (17 * 8 * 2)),
+    ), bit_width=8 * 2 * 18),  # 18 data fields, * 2 bytes each
+    Register('STATUS2', 0x90, fields=(
+        BitField('AVALID', 0b01000000),     # Spectral Data Valid
+        BitField('ASAT_DIG', 0b00010000),   # Digital Saturation
+        BitField('ASAT_ANA', 0b00001000),   # Analog Saturation
+        BitField('FDSAT_ANA', 0b00000010),  # Flicker Analog Saturation
+        BitField('FDSAT_DIG', 0b00000001)   # Flicker Digital Saturation
+    )),
+    Register('STATUS3', 0x91, fields=(
+        BitField('INT_SP_H', 0b00100000),   # Spectral Above High Threshold
+        BitField('INT_SP_L', 0b00010000)    # Spectral Below Low Threshold
+    )),
+    Register('STATUS5', 0xBB, fields=(
+        BitField('SINT_FD', 0b00001000),    # Flicker Detect Interrupt (if SIEN_FD set)
+        BitField('SINT_SMUX', 0b00000100)   # SMUX Operation Interrupt (SMUX exec finished)
+    )),
+    Register('STATUS4', 0xBC, fields=(
+        BitField('FIFO_OV', 0b10000000),    # FIFO Buffer Overflow
+        BitField('OVTEMP', 0b00100000),     # Over Temperature
+        BitField('FD_TRIG', 0b00010000),    # Flicker Detetc Trigger Error
+        BitField('SD_TRIG', 0b00000100),    # Spectral Trigger Error
+        BitField('SAI_ACT', 0b00000010),    # Sleep After Interrupt Active
+        BitField('INT_BUSY', 0b00000001)    # Initialization Busy (1 for ~300us after power on)
+    )),
+    Register('CFG0', 0xBF, fields=(
+        BitField('LOW_POWER', 0b00100000),  # Low Power Idle
+        BitField('REG_BANK', 0b00010000),   # 0 - Register 0x80 and above
+                                            # 1 - Register 0x20 to 0x7f
+        BitField('WLONG', 0b00000100)       # Increases WTIME by factor of 16
+    ), volatile=False),
+    Register('CFG1', 0xC6, fields=(
+        # Spectral Engines Gain Setting
+        # 0 = 0.5x, # 1 = 1x, 2 = 2x, 12 = 2048x
+        # GAINx = 1 << (n - 1)
+        BitField('AGAIN', 0b00011111, adapter=AGAINAdapter()),
+    ), volatile=False),
+    Register('CFG3', 0xC7, fields=(
+        BitField('SAI', 0b00010000),    # Sleep After Interrupt (turn off osc after interrupt)
+    ), volatile=False),
+    Register('CFG6', 0xF5, fields=(
+        # SMUS Command To Exec
+        # 0 - ROM code init
+        # 1 - Read SMUX conf to RAM
+        # 2 - Write SMUX conf from RAM
+        # 3 - Reserved
+        BitField('SMUX_CMD', 0b00011000, adapter=LookupAdapter({
+            'ROM_init': 0,
+            'Read_SMUX': 1,
+            'Write_SMUX': 2
+        })),
+    )),
+    Register('CFG8', 0xC9, fields=(
+        # Fifo Threshold
+        BitField('FIFO_TH', 0b11000000, adapter=LookupAdapter({
+            1: 0b00,
+            4: 0b01,
+            8: 0b10,
+            16: 0b11
+        })),
+    ), volatile=False),
+    Register('CFG9', 0xCA, fields=(
+        BitField('SIEN_FD', 0b01000000),    # System Interrupt Flicker Detection
+        BitField('SIEN_SMUX', 0b00010000)   # System Interrupt SMUX Operation
+    ), volatile=False),
+    Register('CFG10', 0x65, fields=(
+        BitField('FD_PERS', 0b00000111),    # Flicker Detect Persistence
+                                            # Number of results that must be diff before status change
+    ), volatile=False),
+    Register('PERS', 0xCF, fields=(
+        BitField('APERS', 0b00001111),
+    ), volatile=False),
+    Register('GPIO', 0x6B, fields=(
+        BitField('GPIO_INV', 0b00001000),    # Invert GPIO output
+        BitField('GPIO_IN_EN', 0b00000100),  # Enable GPIO input
+        BitField('GPIO_OUT', 0b00000010),    # GPIO Output
+        BitField('GPIO_IN', 0b00000001)      # GPIO Input
+    )),
+    Register('CFG20', 0xD6, fields=(
+        BitField('FD_FIFO_8b', 0b10000000),  # Enable 8bit FIFO mode for Flicker Detect (FD_TIME < 256)
+        # Auto channel read-out
+        BitField('auto_SMUX', 0b01100000, adapter=LookupAdapter({
+            6: 0b00,
+            # '': 0b01,  ' reserved
+            12: 0b10,
+            18: 0b11
+        }))
+    ), volatile=False),
+    Register('LED', 0xCD, fields=(
+        BitField('LED_ACT', 0b10000000),   # External LED (LDR) Control
+        # External LED drive strength  (N - 4) >> 1
+        BitField('LED_DRIVE', 0b01111111, adapter=LEDDriveAdapter())
+    ), volatile=False),
+    Register('AGC_GAIN_MAX', 0xD7, fields=(
+        # Flicker Detection AGC Gain Max
+        # Max = 2^N (0 = 0.5x)
+        BitField('AGC_FD_GAIN_MAX', 0b11110000, adapter=AGCFDGainAdapter()),
+    )),
+    Register('AZ_CONFIG', 0xDE, fields=(
+        BitField('AT_NTH_ITERATION', 0b11111111),  # Auto-zero Frequency
+                                                   # 0 NEVER (not recommended)
+                                                   # n = every n integration cycles
+                                                   # 255 = only before first measurement cycle
+    ), volatile=False),
+    Register('FD_TIME_1', 0xE0, fields=(  # Flicker Detection Integration Time
+        BitField('FD_TIME', 0b11111111),  # FD_TIME [7:0] (do not change if FDEN = 1 & PON = 1)
+    ), volatile=False),
+    Register('FD_TIME_2', 0xE2, fields=(
+        # Flicker Detect Gain - 0 = 0.5x, 1 = 1x, 2 = 2x, 12 = 2048x
+        BitField('FD_GAIN', 0b11111000, adapter=AGAINAdapter()),
+        BitField('FD_TIME', 0b00000111)   # FD_TIME [10:8] (do not change if FDEN = 1 & PON = 1)
+    ), volatile=False),
+    Register('FD_CFG0', 0xDF, fields=(
+        BitField('FIFO_WRITE_FD', 0b10000000),   # Write flicker raw data to FIFO (1 byte per sample)
+    ), volatile=False),
+    Register('FD_STATUS', 0xE3, fields=(
+        BitField('FD_VALID', 0b00100000),        # Flicker Detection Valid
+        BitField('FD_SAT', 0b00010000),          # Flicker Detection Saturated
+        BitField('FD_120HZ_VALID', 0b00001000),  # Flicker Detection 120HZ Valid
+        BitField('FD_100HZ_VALID', 0b00000100),  # Flicker Detection 100HZ Valid
+        BitField('FD_120HZ', 0b00000010),        # Flicker Detected at 120HZ
+        BitField('FD_100HZ', 0b00000001)         # Flicker Detected at 100HZ
+    )),
+    Register('INTERNAB', 0xF9, fields=(
+        BitField('ASIEN', 0b10000000),   # Saturation Interrupt Enable
+        BitField('SP_IEN', 0b00001000),  # Spectral Interrupt Enable
+        BitField('FIEN', 0b00000100),    # FIFO Buffer Interrupt Enable
+        BitField('SIEN', 0b00000001)     # System Interrupt Enable
+    ), volatile=False),
+    Register('CONTROL', 0xFA, fields=(
+        BitField('SW_RESET', 0b00001000),   # Software Reset
+        BitField('SP_MAN_AZ', 0b00000100),  # Spectral Manual Autozero
+        BitField('FIFO_CLR', 0b00000010),   # FIFO Buffer Clear
+        BitField('CLEAR_SAI_ACT', 0b00000001)  # Clear Sleep-After-Interrupt
+    )),
+    # FIFO Buffer Included Channels
+    Register('FIFO_MAP', 0xFC, fields=(
+        BitField('FIFO_WRITE_CH5_DATA', 0b01000000),
+        BitField('FIFO_WRITE_CH4_DATA', 0b00100000),
+        BitField('FIFO_WRITE_CH3_DATA', 0b00010000),
+        BitField('FIFO_WRITE_CH2_DATA', 0b00001000),
+        BitField('FIFO_WRITE_CH1_DATA', 0b00000100),
+        BitField('FIFO_WRITE_CH0_DATA', 0b00000010),
+        BitField('FIFO_WRITE_ASTATUS', 0b00000001)
+    ), volatile=False),
+    # FIFO Buffer Level
+    Register('FIFO_LVL', 0xFD, fields=(
+        BitField('FIFO_LVL', 0xFF),
+    ), read_only=True),
+    # FIFO Buffer Data
+    Register('FDATA', 0xFE, fields=(
+        BitField('FDATA', 0xFFFF),
+    ), bit_width=16, read_only=True)
+)
+
+# Export LookupAdapter values as constants, eg: AS7343_CFG20_AUTO_SMUX_18
+# TODO : Integrate into i2cdevice so that LookupAdapter fields can always be exported to constants
+for _register in REGISTERS:
+    for _field in _register.fields.values():
+        if isinstance(_field.adapter, LookupAdapter):
+            for _key in _field.adapter.lookup_table:
+                globals()['AS7343_{register}_{field}_{key}'.format(register=_register.name, field=_field.name, key=_key).upper()] = _key
+del _register, _field, _key
+
+
+class _ShadowDevice(Device):
+    """An i2cdevice Device with a write-through shadow of its registers.
+
+    Registers that aren't marked volatile are read from the sensor once,
+    after which read-modify-writes use the shadow copy and writes that
+    wouldn't change a register are skipped. Status and data registers
+    must stay volatile, since the sensor changes them.
+
+    Between begin_batch() and end_batch() writes to shadowed registers are
+    held back, to be sent with write_registers() in as few transfers as possible.
+
+    """
+    def __init__(self, *args, **kwargs):
+        Device.__init__(self, *args, **kwargs)
+        self.shadow = {}
+        self.dirty = None
+
+    # Multi-byte AS7343 registers are little-endian, where i2cdevice assumes big-endian
+    def _i2c_read(self, register, bit_width):
+        data = self._i2c.read_i2c_block_data(self._i2c_address, register, bit_width // self._bit_width)
+        return int.from_bytes(bytes(data), 'little')
+
+    def _i2c_write(self, register, value, bit_width):
+        self._i2c.write_i2c_block_data(self._i2c_address, register, list(value.to_bytes(bit_width // self._bit_width, 'little')))
+
+    def read_register(self, name):
+        register = self.registers[name]
+        if register.volatile or name not in self.shadow:
+            value = self._i2c_read(register.address, register.bit_width)
+            self.values[name] = value
+            if not register.volatile:
+                self.shadow[name] = value
+        return self.values[name]
+
+    def write_register(self, name):
+        register = self.registers[name]
+        value = self.values[name]
+        if register.volatile:
+            return self._i2c_write(register.address, value, register.bit_width)
+        if self.dirty is not None:
+            self.dirty.add(name)
+        elif self.shadow.get(name) != value:
+            self._i2c_write(register.address, value, register.bit_width)
+            self.shadow[name] = value
+
+    def invalidate(self):
+        """Forget all shadowed values, eg: after a reset."""
+        self.shadow.clear()
+
+    def is_shadowed(self, *names):
+        """Return True if all the named registers are in the shadow."""
+        return all(name in self.shadow for name in names)
+
+    def begin_batch(self):
+        """Hold back writes to shadowed registers."""
+        if self.dirty is None:
+            self.dirty = set()
+
+    def end_batch(self):
+        """Stop holding back writes, returning the registers that need writing."""
+        dirty = self.dirty or ()
+        self.dirty = None
+        return [name for name in dirty if self.shadow.get(name) != self.values[name]]
+
+    def write_registers(self, names):
+        """Write registers, combining runs of adjacent addresses into block writes."""
+        registers = sorted((self.registers[name] for name in names), key=lambda register: register.address)
+        start = None
+        data = []
+        for register in registers:
+            value = self.values[register.name]
+            values = list(value.to_bytes(register.bit_width // self._bit_width, 'little'))
+            if data and start + len(data) == register.address and len(data) + len(values) <= I2C_BLOCK_MAX:
+                data += values
+            else:
+                if data:
+                    self._i2c.write_i2c_block_data(self._i2c_address, start, data)
+                start = register.address
+                data = values
+            self.shadow[register.name] = value
+        if data:
+            self._i2c.write_i2c_block_data(self._i2c_address, start, data)
+
+
 class AS7343:
-    def __init__(self, i2c_dev=None):
-        self._as7343 = Device(0x39, i2c_dev=i2c_dev, bit_width=8, registers=(
-            # BANK 1
-            Register('AUXID', 0x58, fields=(
-                BitField('AUXID', 0b00001111),   # Auxiliary Identification (0b0000)
-            )),
-            Register('REVID', 0x59, fields=(
-                BitField('REVID', 0b00000111),   # Revision ID (0b000)
-            )),
-            Register('ID', 0x5A, fields=(
-                BitField('ID', 0b11111111),      # Part Number (0b10000001)
-            )),
-            Register('CFG12', 0x66, fields=(
-                BitField('SP_TH_CH', 0b00000111),  # Spectral Threshold Channel
-            )),
-
-            # BANK 0
-            Register('ENABLE', 0x80, fields=(
-                BitField('FDEN', 0b01000000),     # Flicker Detection Enable
-                BitField('SMUXEN', 0b00010000),   # SMUX Enable
-                BitField('WEN', 0b00001000),      # Wait Enable
-                BitField('SP_EN', 0b00000010),    # Spectral Measurement Enable
-                BitField('PON', 0b00000001)       # Power On
-            )),
-            Register('ATIME', 0x81, fields=(
-                BitField('ATIME', 0xFF),          # Integration Time
-                                                  # Number of integration steps from 0 to 255
-                                                  # (ATIME + 1) x (ASTEP + 1) x 2.78us
-                                                  # ADCfs = (ATIME + 1) x (ASTEP + 1)
-            )),
-            Register('ASTEP', 0xD4, fields=(
-                # Integration Time Step Size
-                # 0 = 2.87us
-                # n 2.87us x (n + 1)
-                BitField('ASTEP', 0xFFFF, adapter=ASTEPAdapter()),
-            ), bit_width=16),
-
-            # Spectral Measurement Wait Time
-            # 0 = 1 cycle = 2.78ms
-            # n = 2.78ms x (n + 1)
-            Register('WTIME', 0x83, fields=(
-                BitField('WTIME', 0xFF, adapter=WTIMEAdapter()),
-            )),
-            Register('SP_TH', 0x84, fields=(
-                BitField('SP_TH_L', 0xFFFF0000),  # Spectral Low Threshold
-                BitField('SP_TH_H', 0x0000FFFF)   # Spectrail High Threshold
-            ), bit_width=8 * 4),
-            Register('STATUS', 0x93, fields=(
-                BitField('ASAT', 0b10000000),     # Spectral Saturation (if ASIEN set)
-                BitField('AINT', 0b00001000),     # Spectral Channel Interrupt (if SP_IEN set)
-                BitField('FINT', 0b00000100),     # FIFO Buffer Interrupt
-                BitField('SINT', 0b00000001)      # System Interrupt
-            )),
-            Register('ASTATUS', 0x94, fields=(
-                BitField('ASAT_STATUS', 0b10000000),  # Saturation Status
-                BitField('AGAIN_STATUS', 0b00000111)  # Gain Status
-            )),
-            Register('DATA', 0x95, fields=(
-                BitField('DATA_0', 0xFFFF << (17 * 8 * 2)),
-                BitField('DATA_1', 0xFFFF << (16 * 8 * 2)),
-                BitField('DATA_2', 0xFFFF << (15 * 8 * 2)),
-                BitField('DATA_3', 0xFFFF << (14 * 8 * 2)),
-                BitField('DATA_4', 0xFFFF << (13 * 8 * 2)),
-                BitField('DATA_5', 0xFFFF << (12 * 8 * 2)),
-                BitField('DATA_6', 0xFFFF << (11 * 8 * 2)),
-                BitField('DATA_7', 0xFFFF << (10 * 8 * 2)),
-                BitField('DATA_8', 0xFFFF << (9 * 8 * 2)),
-                BitField('DATA_9', 0xFFFF << (8 * 8 * 2)),
-                BitField('DATA_10', 0xFFFF << (7 * 8 * 2)),
-                BitField('DATA_11', 0xFFFF << (6 * 8 * 2)),
-                BitField('DATA_12', 0xFFFF << (5 * 8 * 2)),
-                BitField('DATA_13', 0xFFFF << (4 * 8 * 2)),
-                BitField('DATA_14', 0xFFFF << (3 * 8 * 2)),
-                BitField('DATA_15', 0xFFFF << (2 * 8 * 2)),
-                BitField('DATA_16', 0xFFFF << (2 * 8 * 2)),
-                BitField('DATA_17', 0xFFFF << (0 * 8 * 2)),
-            ), bit_width=8 * 2 * 18),  # 18 data fields, * 2 bytes each
-            Register('STATUS2', 0x90, fields=(
-                BitField('AVALID', 0b01000000),     # Spectral Data Valid
-                BitField('ASAT_DIG', 0b00010000),   # Digital Saturation
-                BitField('ASAT_ANA', 0b00001000),   # Analog Saturation
-                BitField('FDSAT_ANA', 0b00000010),  # Flicker Analog Saturation
-                BitField('FDSAT_DIG', 0b00000001)   # Flicker Digital Saturation
-            )),
-            Register('STATUS3', 0x91, fields=(
-                BitField('INT_SP_H', 0b00100000),   # Spectral Above High Threshold
-                BitField('INT_SP_L', 0b00010000)    # Spectral Below Low Threshold
-            )),
-            Register('STATUS5', 0xBB, fields=(
-                BitField('SINT_FD', 0b00001000),    # Flicker Detect Interrupt (if SIEN_FD set)
-                BitField('SINT_SMUX', 0b00000100)   # SMUX Operation Interrupt (SMUX exec finished)
-            )),
-            Register('STATUS4', 0xBC, fields=(
-                BitField('FIFO_OV', 0b10000000),    # FIFO Buffer Overflow
-                BitField('OVTEMP', 0b00100000),     # Over Temperature
-                BitField('FD_TRIG', 0b00010000),    # Flicker Detetc Trigger Error
-                BitField('SD_TRIG', 0b00000100),    # Spectral Trigger Error
-                BitField('SAI_ACT', 0b00000010),    # Sleep After Interrupt Active
-                BitField('INT_BUSY', 0b00000001)    # Initialization Busy (1 for ~300us after power on)
-            )),
-            Register('CFG0', 0xBF, fields=(
-                BitField('LOW_POWER', 0b00100000),  # Low Power Idle
-                BitField('REG_BANK', 0b00010000),   # 0 - Register 0x80 and above
-                                                    # 1 - Register 0x20 to 0x7f
-                BitField('WLONG', 0b00000100)       # Increases WTIME by factor of 16
-            )),
-            Register('CFG1', 0xC6, fields=(
-                # Spectral Engines Gain Setting
-                # 0 = 0.5x, # 1 = 1x, 2 = 2x, 12 = 2048x
-                # GAINx = 1 << (n - 1)
-                BitField('AGAIN', 0b00011111, adapter=AGAINAdapter()),
-            )),
-            Register('CFG3', 0xC7, fields=(
-                BitField('SAI', 0b00010000),    # Sleep After Interrupt (turn off osc after interrupt)
-            )),
-            Register('CFG6', 0xF5, fields=(
-                # SMUS Command To Exec
-                # 0 - ROM code init
-                # 1 - Read SMUX conf to RAM
-                # 2 - Write SMUX conf from RAM
-                # 3 - Reserved
-                BitField('SMUX_CMD', 0b00011000, adapter=LookupAdapter({
-                    'ROM_init': 0,
-                    'Read_SMUX': 1,
-                    'Write_SMUX': 2
-                })),
-            )),
-            Register('CFG8', 0xC9, fields=(
-                # Fifo Threshold
-                BitField('FIFO_TH', 0b11000000, adapter=LookupAdapter({
-                    1: 0b00,
-                    4: 0b01,
-                    8: 0b10,
-                    16: 0b11
-                })),
-            )),
-            Register('CFG9', 0xCA, fields=(
-                BitField('SIEN_FD', 0b01000000),    # System Interrupt Flicker Detection
-                BitField('SIEN_SMUX', 0b00010000)   # System Interrupt SMUX Operation
-            )),
-            Register('CFG10', 0x65, fields=(
-                BitField('FD_PERS', 0b00000111),    # Flicker Detect Persistence
-                                                    # Number of results that must be diff before status change
-            )),
-            Register('PERS', 0xCF, fields=(
-                BitField('APERS', 0b00001111),
-            )),
-            Register('GPIO', 0x6B, fields=(
-                BitField('GPIO_INV', 0b00001000),    # Invert GPIO output
-                BitField('GPIO_IN_EN', 0b00000100),  # Enable GPIO input
-                BitField('GPIO_OUT', 0b00000010),    # GPIO Output
-                BitField('GPIO_IN', 0b00000001)      # GPIO Input
-            )),
-            Register('CFG20', 0xD6, fields=(
-                BitField('FD_FIFO_8b', 0b10000000),  # Enable 8bit FIFO mode for Flicker Detect (FD_TIME < 256)
-                # Auto channel read-out
-                BitField('auto_SMUX', 0b01100000, adapter=LookupAdapter({
-                    6: 0b00,
-                    # '': 0b01,  ' reserved
-                    12: 0b10,
-                    18: 0b11
-                }))
-            )),
-            Register('LED', 0xCD, fields=(
-                BitField('LED_ACT', 0b10000000),   # External LED (LDR) Control
-                # External LED drive strength  (N - 4) >> 1
-                BitField('LED_DRIVE', 0b01111111, adapter=LEDDriveAdapter())
-            )),
-            Register('AGC_GAIN_MAX', 0xD7, fields=(
-                # Flicker Detection AGC Gain Max
-                # Max = 2^N (0 = 0.5x)
-                BitField('AGC_FD_GAIN_MAX', 0b11110000, adapter=AGCFDGainAdapter()),
-            )),
-            Register('AZ_CONFIG', 0xDE, fields=(
-                BitField('AT_NTH_ITERATION', 0b11111111),  # Auto-zero Frequency
-                                                           # 0 NEVER (not recommended)
-                                                           # n = every n integration cycles
-                                                           # 255 = only before first measurement cycle
-            )),
-            Register('FD_TIME_1', 0xE0, fields=(  # Flicker Detection Integration Time
-                BitField('FD_TIME', 0b11111111),  # FD_TIME [7:0] (do not change if FDEN = 1 & PON = 1)
-            )),
-            Register('FD_TIME_2', 0xE2, fields=(
-                # Flicker Detect Gain - 0 = 0.5x, 1 = 1x, 2 = 2x, 12 = 2048x
-                BitField('FD_GAIN', 0b11111000, adapter=AGAINAdapter()),
-                BitField('FD_TIME', 0b00000111)   # FD_TIME [10:8] (do not change if FDEN = 1 & PON = 1)
-            )),
-            Register('FD_CFG0', 0xDF, fields=(
-                BitField('FIFO_WRITE_FD', 0b10000000),   # Write flicker raw data to FIFO (1 byte per sample)
-            )),
-            Register('FD_STATUS', 0xE3, fields=(
-                BitField('FD_VALID', 0b00100000),        # Flicker Detection Valid
-                BitField('FD_SAT', 0b00010000),          # Flicker Detection Saturated
-                BitField('FD_120HZ_VALID', 0b00001000),  # Flicker Detection 120HZ Valid
-                BitField('FD_100HZ_VALID', 0b00000100),  # Flicker Detection 100HZ Valid
-                BitField('FD_120HZ', 0b00000010),        # Flicker Detected at 120HZ
-                BitField('FD_100HZ', 0b00000001)         # Flicker Detected at 100HZ
-            )),
-            Register('INTERNAB', 0xF9, fields=(
-                BitField('ASIEN', 0b10000000),   # Saturation Interrupt Enable
-                BitField('SP_IEN', 0b00001000),  # Spectral Interrupt Enable
-                BitField('FIEN', 0b00000100),    # FIFO Buffer Interrupt Enable
-                BitField('SIEN', 0b00000001)     # System Interrupt Enable
-            )),
-            Register('CONTROL', 0xFA, fields=(
-                BitField('SW_RESET', 0b00001000),   # Software Reset
-                BitField('SP_MAN_AZ', 0b00000100),  # Spectral Manual Autozero
-                BitField('FIFO_CLR', 0b00000010),   # FIFO Buffer Clear
-                BitField('CLEAR_SAI_ACT', 0b00000001)  # Clear Sleep-After-Interrupt
-            )),
-            # FIFO Buffer Included Channels
-            Register('FIFO_MAP', 0xFC, fields=(
-                BitField('FIFO_WRITE_CH5_DATA', 0b01000000),
-                BitField('FIFO_WRITE_CH4_DATA', 0b00100000),
-                BitField('FIFO_WRITE_CH3_DATA', 0b00010000),
-                BitField('FIFO_WRITE_CH2_DATA', 0b00001000),
-                BitField('FIFO_WRITE_CH1_DATA', 0b00000100),
-                BitField('FIFO_WRITE_CH0_DATA', 0b00000010),
-                BitField('FIFO_WRITE_ASTATUS', 0b00000001)
-            )),
-            # FIFO Buffer Level
-            Register('FIFO_LVL', 0xFD, fields=(
-                BitField('FIFO_LVL', 0xFF),
-            ), read_only=True),
-            # FIFO Buffer Data
-            Register('FDATA', 0xFE, fields=(
-                BitField('FDATA', 0xFFFF, adapter=U16ByteSwapAdapter()),
-            ), bit_width=16, read_only=True)
-        ))
-
-        # TODO : Integrate into i2cdevice so that LookupAdapter fields can always be exported to constants
-        # Iterate through all register fields and export their lookup tables to constants
-        for register in self._as7343.registers:
-            register = self._as7343.registers[register]
-            for field in register.fields:
-                field = register.fields[field]
-                if isinstance(field.adapter, LookupAdapter):
-                    for key in field.adapter.lookup_table:
-                        value = field.adapter.lookup_table[key]
-                        name = 'AS7343_{register}_{field}_{key}'.format(
-                            register=register.name,
-                            field=field.name,
-                            key=key
-                        ).upper()
-                        locals()[name] = key
+    def __init__(self, i2c_dev=None, interrupt=None, reset=True):
+        self._as7343 = _ShadowDevice(0x39, i2c_dev=i2c_dev, bit_width=8, registers=REGISTERS)
 
         self.running = False
+        self._configure_depth = 0
+        self._interrupt = None
+        self._interrupt_direct = None
+        self._instrumentation = None
+        self._schedule = None
 
-        self.soft_reset()
+        # With reset=False, attach to a sensor that is already configured,
+        # eg: after a service restart, leaving its settings and FIFO alone
+        if reset:
+            self.soft_reset()
 
         auxid, revid, id = self.get_version()
 
-        self._as7343.set('ENABLE', PON=True)
-
         if id != PART_ID:
             raise RuntimeError("Invalid part ID: 0x{:02x}, expected 0x{:02x}!".format(id, PART_ID))
 
-        self.bank_select(0)  # For registers 0x80 and above
-
-        self.set_channels(6)
-
-        # ADC gain
-        self.set_gain(1024)
+        self._as7343.set('ENABLE', PON=True)
 
-        self.set_measurement_time(500)
+        self.bank_select(0)  # For registers 0x80 and above
 
-        self.set_integration_time(27800)
+        if not reset:
+            self._attach()
+            if interrupt is not None:
+                self.set_interrupt(interrupt)
+            return
 
-        self._as7343.set(
-            'LED',
-            LED_ACT=False,
-            LED_DRIVE=4)
-
-        # Make sure all channels are written into the FIFO
-        # By default the output from channels is *NOT* written so you can
-        # (even in 18ch mode) select the channels you're interested in.
-        # There's not much point exposing this to the end-user, since in 2 and 3
-        # phase mode these channels will be muxed across multiple sensors...
-        self._as7343.set(
-            'FIFO_MAP',
-            FIFO_WRITE_CH5_DATA=True,
-            FIFO_WRITE_CH4_DATA=True,
-            FIFO_WRITE_CH3_DATA=True,
-            FIFO_WRITE_CH2_DATA=True,
-            FIFO_WRITE_CH1_DATA=True,
-            FIFO_WRITE_CH0_DATA=True,
-            FIFO_WRITE_ASTATUS=True)
+        # Write the initial configuration in as few transfers as possible
+        with self.configure():
+            self.set_channels(6)
+
+            # ADC gain
+            self.set_gain(1024)
+
+            self.set_measurement_time(500)
+
+            self.set_integration_time(27800)
+
+            self._as7343.set(
+                'LED',
+                LED_ACT=False,
+                LED_DRIVE=4)
+
+            # Make sure all channels are written into the FIFO
+            # By default the output from channels is *NOT* written so you can
+            # (even in 18ch mode) select the channels you're interested in.
+            # There's not much point exposing this to the end-user, since in 2 and 3
+            # phase mode these channels will be muxed across multiple sensors...
+            self._as7343.set(
+                'FIFO_MAP',
+                FIFO_WRITE_CH5_DATA=True,
+                FIFO_WRITE_CH4_DATA=True,
+                FIFO_WRITE_CH3_DATA=True,
+                FIFO_WRITE_CH2_DATA=True,
+                FIFO_WRITE_CH1_DATA=True,
+                FIFO_WRITE_CH0_DATA=True,
+                FIFO_WRITE_ASTATUS=True)
 
         # self._as7343.set('FD_CFG0', FIFO_WRITE_FD=True)
 
@@ -488,18 +975,69 @@ class AS7343:
             WEN=True,
             SP_EN=True)
 
+        if interrupt is not None:
+            self.set_interrupt(interrupt)
+
     def bank_select(self, bank=0):
         """Set the AS7343 bank select register."""
         self._as7343.set('CFG0', REG_BANK=bank)
+        # Bank switches can't wait for the end of a configure() block
+        if self._as7343.dirty is not None and 'CFG0' in self._as7343.dirty:
+            self._as7343.dirty.discard('CFG0')
+            self._as7343.write_registers(['CFG0'])
+
+    @contextmanager
+    def configure(self):
+        """Batch configuration changes into as few bus transfers as possible.
+
+        Inside the with block, setters only update the shadow registers.
+        Changed registers are written on exit, with registers at adjacent
+        addresses combined into single block writes.
+
+        """
+        self._configure_depth += 1
+        self._as7343.begin_batch()
+        try:
+            yield self
+        finally:
+            self._configure_depth -= 1
+            if self._configure_depth == 0:
+                dirty = self._as7343.end_batch()
+                bank1 = [name for name in dirty if self._as7343.registers[name].address < 0x80]
+                bank0 = [name for name in dirty if name not in bank1]
+                if bank1:
+                    self.bank_select(1)
+                    self._as7343.write_registers(bank1)
+                    self.bank_select(0)
+                self._as7343.write_registers(bank0)
+
+    def soft_reset(self, timeout=RESET_TIMEOUT):
+        """Set the soft reset register bit of the AS7343 and wait for it to restart.
+
+        :param timeout: Time in seconds to wait for the reset to finish
 
-    def soft_reset(self):
-        """Set the soft reset register bit of the AS7343."""
+        """
         self._as7343.set('CONTROL', SW_RESET=1)
-        # Polling for the state of the reset flag does not work here
-        # since the fragile virtual register state machine cannot
-        # respond while in a soft reset condition
-        # So, just wait long enough for it to reset fully...
-        time.sleep(2.0)
+        self._as7343.invalidate()
+
+        # The sensor may not respond at all while it is resetting, so
+        # treat a failed transfer as busy and poll until INT_BUSY clears
+        t_start = time.time()
+        while True:
+            time.sleep(RESET_POLL_INTERVAL)
+            try:
+                if not self._as7343.get('STATUS4').INT_BUSY:
+                    return
+            except OSError:
+                pass
+            if time.time() - t_start > timeout:
+                raise TimeoutError("Timeout waiting for soft reset.")
+
+    def _attach(self):
+        """Pick up the state of an already configured sensor instead of resetting it."""
+        self._channel_count = self._as7343.get('CFG20').auto_SMUX
+        self._read_cycles = int(self._channel_count / 6)
+        self.running = bool(self._as7343.get('ENABLE').SMUXEN)
 
     def set_channels(self, channel_count):
         """Set the multiplexer mode of the AS7343.
@@ -515,6 +1053,36 @@ class AS7343:
         self._channel_count = channel_count
         self._read_cycles = int(channel_count / 6)
         self._as7343.set('CFG20', auto_SMUX=channel_count)
+        self._as7343.set('CFG8', FIFO_TH=FIFO_THRESHOLD[channel_count])
+
+    def set_interrupt(self, interrupt):
+        """Wait for results on the AS7343 INT pin instead of polling.
+
+        FIFO reads are woken by the FIFO threshold interrupt, direct
+        reads by a spectral interrupt raised at the end of every cycle.
+
+        :param interrupt: An interrupt source from as7343.interrupt, or None to poll
+
+        """
+        self._interrupt = interrupt
+        self._interrupt_direct = None
+        if interrupt is None:
+            self._as7343.set('INTERNAB', FIEN=False, SP_IEN=False)
+        else:
+            self._as7343.set('PERS', APERS=0)  # Spectral interrupt after every cycle
+
+    def _arm_interrupt(self, direct):
+        """Enable the interrupt that matches the read mode, if it has changed."""
+        if self._interrupt is None or self._interrupt_direct == direct:
+            return
+        self._as7343.set('INTERNAB', FIEN=not direct, SP_IEN=direct)
+        self._interrupt_direct = direct
+
+    def _clear_interrupt(self):
+        """Clear the FIFO and spectral interrupts, releasing INT."""
+        # STATUS bits are cleared by writing 1, so skip the read-modify-write
+        self._as7343.values['STATUS'] = 0b00001100
+        self._as7343.write_register('STATUS')
 
     def start_measurement(self):
         if self.running:
@@ -523,44 +1091,250 @@ class AS7343:
         self._as7343.set(
             'ENABLE',
             SMUXEN=True)
+        self._schedule = _FrameSchedule(time.time(), self.get_frame_period(), self._read_cycles * 7)
 
     def stop_measurement(self):
         self.running = False
+        self._schedule = None
         self._as7343.set(
             'ENABLE',
             SMUXEN=False)
 
-    def get_data(self, timeout=5.0):
-        results = list(self.read_fifo(timeout=timeout))
-
-        if self._read_cycles == 3:
-            return (
-                dict(ResultCycle1(*results[0:7])),
-                dict(ResultCycle2(*results[7:14])),
-                dict(ResultCycle3(*results[14:21])),
-            )
-        elif self._read_cycles == 2:
-            return (
-                dict(ResultCycle1(*results[0:7])),
-                dict(ResultCycle2(*results[7:14]))
-            )
-        elif self._read_cycles == 1:
-            return (
-                dict(ResultCycle1(*results[0:7])),
-            )
+    def clear_fifo(self):
+        """Discard the FIFO contents and clear FIFO_OV."""
+        self._as7343.set('CONTROL', FIFO_CLR=True)
+        if self._schedule is not None:
+            self._schedule.clear()
+
+    def _frame_schedule(self):
+        """Get the schedule for the next FIFO frame, starting over if the settings have changed."""
+        period = self.get_frame_period()
+        frame_size = self._read_cycles * 7
+        schedule = self._schedule
+        if schedule is None or schedule.nominal != period or schedule.frame_size != frame_size:
+            schedule = self._schedule = _FrameSchedule(None, period, frame_size)
+        return schedule
+
+    def get_frame_period(self):
+        """Get the time in seconds between complete frames.
+
+        Each auto SMUX cycle lasts for the measurement (wait) time, 16 times
+        longer with CFG0.WLONG, or the integration time, whichever is longer.
+
+        """
+        integration_time = (self._as7343.get('ATIME').ATIME + 1) * self._as7343.get('ASTEP').ASTEP / 1000000.0
+        measurement_time = self._as7343.get('WTIME').WTIME / 1000.0
+        if self._as7343.get('CFG0').WLONG:
+            measurement_time *= 16
+        return max(integration_time, measurement_time) * self._read_cycles
+
+    def get_data(self, timeout=5.0, direct=False, frame=False):
+        """Get one set of results from the AS7343.
+
+        :param timeout: Time in seconds to wait for a result
+        :param direct: Read the DATA registers instead of the FIFO
+        :param frame: Return a SpectralFrame instead of a tuple of dicts
+
+        """
+        if direct:
+            results = self.read_data(timeout=timeout)
+        else:
+            results = list(self.read_fifo(timeout=timeout))
+
+        if frame:
+            return self._decode_frame(results)
+        return self._decode(results)
+
+    def stream(self, timeout=5.0, frame=False):
+        """Yield frames continuously while the measurement keeps running.
+
+        The FIFO is drained in whole frames, so several frames that build
+        up between reads are all returned in order. If the FIFO overflows
+        it is cleared and the measurement restarted to re-synchronise, and
+        the next frame reports an estimate of how many frames were lost.
+
+        :param timeout: Time in seconds to wait for each drain of the FIFO
+        :param frame: Yield SpectralFrame data instead of tuples of dicts
+
+        """
+        state = self._start_stream(frame)
+
+        while True:
+            level = self._wait_for(
+                self._fifo_ready,
+                timeout,
+                f"Timeout waiting for {state.frame_size} entries in FIFO.",
+                self._frame_schedule())
+
+            yield from self._stream_frames(state, level)
+
+    def _start_stream(self, frame=False, decode=None):
+        """Restart the SMUX so the FIFO begins on a cycle 1 boundary.
+
+        :param frame: Decode frames into SpectralFrames instead of tuples of dicts
+        :param decode: Callable taking (results, timestamp) to decode each frame with instead
+
+        """
+        if decode is None:
+            decode = self._decode_frame if frame else self._decode
+        state = _StreamState(self._read_cycles * 7, self.get_frame_period(), decode)
+        self.stop_measurement()
+        self.clear_fifo()
+        self._arm_interrupt(False)
+        self.start_measurement()
+        return state
+
+    def _stream_frames(self, state, level):
+        """Drain all whole frames from the FIFO for a stream.
+
+        :param state: The _StreamState returned by _start_stream
+        :param level: The current FIFO level
+
+        """
+        if self._as7343.get('STATUS4').FIFO_OV:
+            state.overflow(time.time())
+            self.stop_measurement()
+            self.clear_fifo()
+            self.start_measurement()
+            return []
+
+        words = self.drain_fifo(level - level % state.frame_size)
+        return state.split(words, time.time())
+
+    def _decode_frame(self, results, timestamp=None):
+        """Decode one frame of FIFO ordered results into a SpectralFrame."""
+        return SpectralFrame.from_results(results, self._as7343.values['ATIME'], self._as7343.values['ASTEP'], timestamp, self._read_cycles)
+
+    def _decode(self, results, timestamp=None):
+        """Decode one frame of FIFO ordered results into ResultCycle dicts."""
+        return decode_results(results, self._read_cycles)
 
     def read_fifo(self, timeout=5.0):
+        self._arm_interrupt(False)
         self.start_measurement()
 
-        t_start = time.time()
-        while self._as7343.get('FIFO_LVL').FIFO_LVL < self._read_cycles * 7:
-            time.sleep(0.001)
-            if time.time() - t_start > timeout:
-                raise TimeoutError(f"Timeout waiting for {self._read_cycles * 7} entries in FIFO.")
+        level = self._wait_for(
+            self._fifo_ready,
+            timeout,
+            f"Timeout waiting for {self._read_cycles * 7} entries in FIFO.",
+            self._frame_schedule())
+
+        yield from self.drain_fifo(level)
+
+    def _fifo_ready(self):
+        """Return the FIFO level if it holds a whole frame, otherwise 0."""
+        level = self._as7343.get('FIFO_LVL').FIFO_LVL
+        return level if level >= self._read_cycles * 7 else 0
+
+    def read_data(self, timeout=5.0):
+        """Read the results directly from the DATA registers.
+
+        Waits for STATUS2.AVALID and then reads ASTATUS and all enabled
+        DATA registers in one block. Results are returned in the same
+        order as read_fifo, with ASTATUS leading each six channel cycle.
+
+        :param timeout: Time in seconds to wait for valid data
+
+        """
+        self._arm_interrupt(True)
+        self.start_measurement()
+
+        self._wait_for(
+            self._data_ready,
+            timeout,
+            "Timeout waiting for valid spectral data.")
+
+        return self._read_data_registers()
+
+    def _data_ready(self):
+        """Return True if STATUS2.AVALID is set."""
+        return self._as7343.get('STATUS2').AVALID
+
+    def _read_data_registers(self):
+        """Read ASTATUS and the DATA registers, returning FIFO ordered results."""
+        # ASTATUS sits directly before DATA_0 and reading it latches
+        # the data registers, so grab it all in one go.
+        data = self._read_block(self._as7343.registers['ASTATUS'].address, 1 + self._read_cycles * 6 * 2)
+        astatus = data[0]
+        values = struct.unpack_from('<{}H'.format(self._read_cycles * 6), data, 1)
+
+        results = []
+        for cycle in range(self._read_cycles):
+            results.append(astatus)
+            results.extend(values[cycle * 6:cycle * 6 + 6])
+        return results
 
-        while self._as7343.get('FIFO_LVL').FIFO_LVL > 0:
-            result = self._as7343.get('FDATA').FDATA
-            yield result
+    def _wait_for(self, ready, timeout, message, schedule=None, poll=False):
+        """Poll ready() until it returns a truthy value.
+
+        With an interrupt source set, ready() is only checked when INT fires.
+        Otherwise, with a schedule, sleep until just before the next frame is
+        due and then poll, backing off the longer it takes.
+
+        :param ready: Callable to poll, its result is returned
+        :param timeout: Time in seconds before TimeoutError is raised
+        :param message: Message for the TimeoutError
+        :param schedule: Optional _FrameSchedule for FIFO frames
+        :param poll: Poll even with an interrupt source, for a FIFO level below FIFO_TH that INT won't mark
+
+        """
+        steps = _wait_steps(self._interrupt is not None and not poll, timeout, message, schedule)
+        result = None
+        try:
+            while True:
+                step, seconds = steps.send(result)
+                result = None
+                if step == _WAIT_POLL:
+                    result = ready()
+                elif step == _WAIT_SLEEP:
+                    time.sleep(seconds)
+                elif self._interrupt.wait(seconds):
+                    self._clear_interrupt()
+        except StopIteration as done:
+            return done.value
+
+    def drain_fifo(self, level):
+        """Read level 16-bit entries from the FIFO in a single burst.
+
+        :param level: Number of FIFO entries to read, usually the last FIFO_LVL
+
+        """
+        if level <= 0:
+            return ()
+        if self._schedule is not None:
+            self._schedule.words += level
+        data = self._read_block(self._as7343.registers['FDATA'].address, level * 2, auto_increment=False)
+        return struct.unpack('<{}H'.format(level), data)
+
+    def _read_block(self, register, length, auto_increment=True):
+        """Read length bytes starting from register.
+
+        Uses one combined i2c_rdwr transaction if the bus supports it,
+        otherwise as few SMBus block reads as possible.
+
+        :param register: Register address to start reading from
+        :param length: Number of bytes to read
+        :param auto_increment: False to keep reading the same address (FDATA)
+
+        """
+        i2c = self._as7343._i2c
+        address = self._as7343._i2c_address
+
+        if hasattr(i2c, 'i2c_rdwr'):
+            from smbus2 import i2c_msg
+            msg_write = i2c_msg.write(address, [register])
+            msg_read = i2c_msg.read(address, length)
+            i2c.i2c_rdwr(msg_write, msg_read)
+            return bytes(msg_read)
+
+        data = bytearray()
+        while len(data) < length:
+            offset = len(data) if auto_increment else 0
+            chunk = i2c.read_i2c_block_data(address, register + offset, min(length - len(data), I2C_BLOCK_MAX))
+            if not chunk:
+                raise IOError(f"Short read from register 0x{register:02x}.")
+            data += bytes(chunk)
+        return bytes(data)
 
     def set_gain(self, gain):
         """Set the gain amount of the AS7343.
@@ -595,23 +1369,13 @@ class AS7343:
         # Integration time comprises a time (in us) called "ASTEP" for some reason,
         # and a repeat count called "ATIME".
         # The ADC full scale is (ASTEP + 1) * (ATIME + 1). (Saturates at 65535)
+        atime, astep = solve_integration_time(time_us)
 
-        if time_us <= 182187.3:
-            self._as7343.set('ATIME', ATIME=0)         # integration time multiplier, basically
-            self._as7343.set('ASTEP', ASTEP=time_us)   # integration time (us)
-
-        elif time_us <= 182187.3 * 256:
-            orig_time_us = time_us
-            steps = 0
-            while time_us > 182187.3:
-                steps += 1
-                time_us = orig_time_us / steps
-
-            self._as7343.set('ATIME', ATIME=steps - 1)
-            self._as7343.set('ASTEP', ASTEP=time_us)
-
-        else:
-            raise ValueError("Integration time out of range.")
+        with self.configure():
+            self._as7343.set('ATIME', ATIME=atime)     # integration time multiplier, basically
+            # Raw ASTEP, since the adapter rounds microseconds down
+            self._as7343.values['ASTEP'] = astep
+            self._as7343.write_register('ASTEP')
 
     def set_illumination_led_current(self, current):
         """Set the AS7343 illumination LED current in milliamps.
@@ -632,11 +1396,42 @@ class AS7343:
         """
         self._as7343.set('LED', LED_ACT=state)
 
+    def start_instrumentation(self, callback=None):
+        """Record per-frame timings and bus use, see as7343.instrument.
+
+        :param callback: Optional callable(FrameStats), called after every frame
+        :returns: The Instrumentation instance
+
+        """
+        from .instrument import Instrumentation
+        if self._instrumentation is None:
+            self._instrumentation = Instrumentation(self, callback)
+        elif callback is not None:
+            self._instrumentation.callbacks.append(callback)
+        return self._instrumentation
+
+    def stop_instrumentation(self):
+        """Stop recording, removing all instrumentation overhead."""
+        if self._instrumentation is not None:
+            self._instrumentation.close()
+            self._instrumentation = None
+
+    def stats(self):
+        """Get the recorded timings and bus use as a dict, or None if not instrumenting."""
+        if self._instrumentation is None:
+            return None
+        return self._instrumentation.stats()
+
     def get_version(self):
         """Get the hardware type, version and firmware version from the AS7343."""
-        self.bank_select(1)
+        # Read all shadowed bank 1 registers in one bank switch, after
+        # which they can be used without switching banks again.
+        if not self._as7343.is_shadowed(*BANK1_SHADOWED):
+            self.bank_select(1)
+            for register in BANK1_SHADOWED:
+                self._as7343.read_register(register)
+            self.bank_select(0)
         auxid = self._as7343.get('AUXID').AUXID
         revid = self._as7343.get('REVID').REVID
         id = self._as7343.get('ID').ID
-        self.bank_select(0)
         return auxid, revid, id
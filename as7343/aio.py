@@ -0,0 +1,158 @@
+"""asyncio interface for the AS7343 Visible Light Spectral Sensor."""
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from . import _WAIT_POLL, _WAIT_SLEEP, AS7343, _wait_steps
+
+
+class AsyncAS7343:
+    """Drive an AS7343 from asyncio without blocking the event loop.
+
+    All I2C transfers run on a dedicated single thread executor, so calls
+    are never interleaved on the bus, while waiting for results uses
+    asyncio.sleep (or the interrupt source, if the sensor has one).
+
+    Use AsyncAS7343.create() to construct the underlying AS7343 off the
+    event loop, or wrap an existing instance.
+
+    :param sensor: An AS7343 instance
+    :param executor: Executor for bus transfers, defaults to a new single worker
+
+    """
+    # Synchronous AS7343 methods exposed as coroutines
+    PASSTHROUGH = (
+        'set_gain',
+        'set_integration_time',
+        'set_measurement_time',
+        'set_channels',
+        'set_illumination_led',
+        'set_illumination_led_current',
+        'start_measurement',
+        'stop_measurement',
+        'clear_fifo',
+        'get_frame_period',
+        'get_version',
+    )
+
+    def __init__(self, sensor, executor=None):
+        self.sensor = sensor
+        self._own_executor = executor is None
+        self._executor = executor or ThreadPoolExecutor(max_workers=1, thread_name_prefix="as7343")
+
+    @classmethod
+    async def create(cls, executor=None, **kwargs):
+        """Construct an AS7343 on the executor and wrap it.
+
+        :param executor: Executor for bus transfers, defaults to a new single worker
+        :param kwargs: Arguments for AS7343()
+
+        """
+        created = executor is None
+        executor = executor or ThreadPoolExecutor(max_workers=1, thread_name_prefix="as7343")
+        loop = asyncio.get_running_loop()
+        sensor = await loop.run_in_executor(executor, functools.partial(AS7343, **kwargs))
+        instance = cls(sensor, executor)
+        instance._own_executor = created
+        return instance
+
+    def __getattr__(self, name):
+        if name in self.PASSTHROUGH:
+            method = getattr(self.sensor, name)
+
+            async def call(*args, **kwargs):
+                return await self._run(method, *args, **kwargs)
+
+            return call
+        raise AttributeError(name)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    async def close(self):
+        """Shut down the executor if it was created by this instance."""
+        if self._own_executor:
+            # Waiting for the executor to finish blocks, so don't do it on the loop
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, functools.partial(self._executor.shutdown, wait=True))
+
+    async def _run(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+
+    async def _wait_for(self, ready, timeout, message, schedule=None):
+        """Await ready() returning a truthy value, without blocking the loop.
+
+        :param schedule: Optional _FrameSchedule, see AS7343._wait_for()
+
+        """
+        sensor = self.sensor
+        loop = asyncio.get_running_loop()
+        steps = _wait_steps(sensor._interrupt is not None, timeout, message, schedule)
+        result = None
+        try:
+            while True:
+                step, seconds = steps.send(result)
+                result = None
+                if step == _WAIT_POLL:
+                    result = await self._run(ready)
+                elif step == _WAIT_SLEEP:
+                    await asyncio.sleep(seconds)
+                # Block a default executor thread on INT, not the bus executor
+                elif await loop.run_in_executor(None, sensor._interrupt.wait, seconds):
+                    await self._run(sensor._clear_interrupt)
+        except StopIteration as done:
+            return done.value
+
+    async def read_fifo(self, timeout=5.0):
+        """Wait for a whole frame in the FIFO and return all its entries."""
+        sensor = self.sensor
+        await self._run(self._start, False)
+        level = await self._wait_for(
+            sensor._fifo_ready,
+            timeout,
+            f"Timeout waiting for {sensor._read_cycles * 7} entries in FIFO.",
+            await self._run(sensor._frame_schedule))
+        return await self._run(sensor.drain_fifo, level)
+
+    async def read_data(self, timeout=5.0):
+        """Wait for STATUS2.AVALID and return the DATA register results."""
+        sensor = self.sensor
+        await self._run(self._start, True)
+        await self._wait_for(
+            sensor._data_ready,
+            timeout,
+            "Timeout waiting for valid spectral data.")
+        return await self._run(sensor._read_data_registers)
+
+    async def get_data(self, timeout=5.0, direct=False, frame=False):
+        """Get one set of results, see AS7343.get_data()."""
+        if direct:
+            results = await self.read_data(timeout=timeout)
+        else:
+            results = await self.read_fifo(timeout=timeout)
+        if frame:
+            return self.sensor._decode_frame(results)
+        return self.sensor._decode(results)
+
+    async def stream(self, timeout=5.0, frame=False):
+        """Yield StreamFrames continuously, see AS7343.stream()."""
+        sensor = self.sensor
+        state = await self._run(sensor._start_stream, frame)
+
+        while True:
+            level = await self._wait_for(
+                sensor._fifo_ready,
+                timeout,
+                f"Timeout waiting for {state.frame_size} entries in FIFO.",
+                await self._run(sensor._frame_schedule))
+
+            for stream_frame in await self._run(sensor._stream_frames, state, level):
+                yield stream_frame
+
+    def _start(self, direct):
+        self.sensor._arm_interrupt(direct)
+        self.sensor.start_measurement()
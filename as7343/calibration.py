@@ -0,0 +1,238 @@
+"""Per-device calibration of AS7343 counts.
+
+A calibration profile holds, for one sensor:
+
+    dark          dark counts for each channel, by gain
+    responsivity  counts per integration step at 1x gain, per unit of
+                  light, for each channel
+    crosstalk     optional matrix correcting leakage between channels
+
+Applying a profile subtracts the dark offsets for the frame's gain,
+divides by gain and integration steps, and then by the responsivity,
+with the crosstalk correction folded into the same matrix. Results are
+floats, in CHANNELS order, with NaN for channels a frame didn't read.
+
+Build a profile from recordings of dark and reference frames:
+
+    python -m as7343.calibration dark.rec reference.rec profile.json
+"""
+import argparse
+import json
+import math
+import operator
+from array import array
+
+from . import CHANNELS, COMPENSATION, FRAME_INDEX
+
+VERSION = 1
+
+
+# Gain for each ASTATUS AGAIN code
+GAINS = tuple(1 << (again - 1) if again else 0.5 for again in range(16))
+
+
+class Calibration:
+    """A calibration profile, precomputed for fast application.
+
+    :param responsivity: Counts per step at 1x gain per unit of light for each channel, in CHANNELS order
+    :param dark: Optional dict of dark counts in CHANNELS order, keyed by gain
+    :param crosstalk: Optional len(CHANNELS) square matrix (list of rows) to correct channel crosstalk
+    :param name: Optional name, eg: the serial number of the sensor
+
+    """
+    def __init__(self, responsivity, dark=None, crosstalk=None, name=None):
+        if len(responsivity) != len(CHANNELS):
+            raise ValueError(f"Expected {len(CHANNELS)} responsivity values.")
+        self.responsivity = [float(value) for value in responsivity]
+        self.dark = {float(gain): [float(value) for value in values] for gain, values in (dark or {}).items()}
+        self.crosstalk = [[float(value) for value in row] for row in crosstalk] if crosstalk else None
+        self.name = name
+        self._precompute()
+
+    def _precompute(self):
+        """Fold responsivity and crosstalk into one matrix, and push the dark offsets through it."""
+        n = len(CHANNELS)
+        scale = [1.0 / value if value else 0.0 for value in self.responsivity]
+        if self.crosstalk is None:
+            self.matrix = None
+            self._scale = array('d', scale)
+        else:
+            self.matrix = [[self.crosstalk[row][col] * scale[col] for col in range(n)] for row in range(n)]
+        self._offsets = {gain: self._transform(values) for gain, values in self.dark.items()}
+        self._zero = array('d', [0.0] * n)
+
+    def _transform(self, values):
+        if self.matrix is None:
+            return array('d', map(operator.mul, values, self._scale))
+        return array('d', [sum(m * v for m, v in zip(row, values)) for row in self.matrix])
+
+    def _offset(self, gain):
+        """Get the transformed dark offsets for a gain, from the nearest gain if it wasn't captured."""
+        if not self._offsets:
+            return self._zero
+        if gain not in self._offsets:
+            gain = min(self._offsets, key=lambda dark_gain: abs(math.log(dark_gain / gain)))
+        return self._offsets[gain]
+
+    @classmethod
+    def default(cls):
+        """A profile from the datasheet typical responsivities, the same relative scaling as COMPENSATION_GAIN."""
+        return cls([1.0 / value for value in COMPENSATION], name="default")
+
+    @classmethod
+    def from_dict(cls, profile):
+        if profile.get('version') != VERSION:
+            raise ValueError("Unsupported calibration profile version.")
+        if list(profile.get('channels', CHANNELS)) != list(CHANNELS):
+            raise ValueError("Calibration profile channels don't match.")
+        return cls(profile['responsivity'], profile.get('dark'), profile.get('crosstalk'), profile.get('name'))
+
+    def to_dict(self):
+        return {
+            'version': VERSION,
+            'name': self.name,
+            'channels': list(CHANNELS),
+            'responsivity': self.responsivity,
+            'dark': {str(gain): values for gain, values in self.dark.items()},
+            'crosstalk': self.crosstalk,
+        }
+
+    @classmethod
+    def load(cls, path):
+        """Load a profile from a JSON file."""
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
+
+    def save(self, path):
+        """Save the profile to a JSON file."""
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=4)
+            f.write("\n")
+
+    def apply(self, frame):
+        """Calibrate a single SpectralFrame.
+
+        :param frame: A SpectralFrame
+        :returns: array('d') in CHANNELS order, NaN for channels not read
+
+        """
+        steps = (frame.atime + 1) * (frame.astep + 1)
+        factor = 1.0 / (frame.gain * steps)
+        offset = self._offset(frame.gain)
+        values = self._transform(frame.counts)
+        result = array('d', [(value - dark) * factor for value, dark in zip(values, offset)])
+        for channel, index in enumerate(FRAME_INDEX[frame.cycles]):
+            if index < 0:
+                result[channel] = math.nan
+        return result
+
+    def apply_batch(self, counts, astatus, atime, astep, cycles=3):
+        """Calibrate many frames at once. Requires numpy.
+
+        Takes the same columns a Recording holds, see apply_recording().
+
+        :param counts: (frames, len(CHANNELS)) array of raw counts
+        :param astatus: ASTATUS value of each frame
+        :param atime: ATIME register value of each frame
+        :param astep: ASTEP register value of each frame
+        :param cycles: Auto SMUX cycles the frames were read with
+        :returns: (frames, len(CHANNELS)) float64 array, NaN for channels not read
+
+        """
+        import numpy
+        counts = numpy.asarray(counts, dtype=numpy.float64)
+        again = numpy.asarray(astatus, dtype=numpy.intp) & 0b00001111
+        gain = numpy.asarray(GAINS)[again]
+        steps = (numpy.asarray(atime, dtype=numpy.float64) + 1) * (numpy.asarray(astep, dtype=numpy.float64) + 1)
+
+        if self.matrix is None:
+            values = counts * numpy.asarray(self._scale)
+        else:
+            values = counts @ numpy.asarray(self.matrix).T
+
+        # One row of dark offsets per frame, looked up by gain code
+        offsets = numpy.array([self._offset(gain) for gain in GAINS])
+        values -= offsets[again]
+        values /= (gain * steps)[:, None]
+
+        unread = numpy.asarray(FRAME_INDEX[cycles]) < 0
+        values[:, unread] = numpy.nan
+        return values
+
+    def apply_recording(self, recording, cycles=3):
+        """Calibrate every frame in a Recording. Requires numpy.
+
+        :param recording: An open Recording
+        :param cycles: Auto SMUX cycles the frames were read with
+        :returns: (frames, len(CHANNELS)) float64 array, NaN for channels not read
+
+        """
+        import numpy
+        counts = numpy.stack([recording.numpy(channel) for channel in CHANNELS], axis=1)
+        return self.apply_batch(counts, recording.numpy('astatus'), recording.numpy('atime'), recording.numpy('astep'), cycles)
+
+
+def build_profile(dark_frames, reference_frames, reference=None, crosstalk=None, name=None):
+    """Build a calibration profile from captured frames.
+
+    :param dark_frames: SpectralFrames taken with no light, at every gain that will be used
+    :param reference_frames: SpectralFrames of a reference light source
+    :param reference: Light level of the reference in each channel, in CHANNELS order, by default the
+                      same for every channel and scaled so the most responsive channel is 1.0
+    :param crosstalk: Optional crosstalk correction matrix, passed through to the profile
+    :param name: Optional name for the profile
+
+    """
+    dark_sums = {}
+    for frame in dark_frames:
+        totals, count = dark_sums.get(frame.gain, ([0.0] * len(CHANNELS), 0))
+        dark_sums[frame.gain] = ([total + value for total, value in zip(totals, frame.counts)], count + 1)
+    dark = {gain: [total / count for total in totals] for gain, (totals, count) in dark_sums.items()}
+
+    reference_frames = list(reference_frames)
+    if not reference_frames:
+        raise ValueError("No reference frames.")
+
+    # Mean dark-corrected counts per step at 1x gain
+    level = [0.0] * len(CHANNELS)
+    zero = [0.0] * len(CHANNELS)
+    for frame in reference_frames:
+        steps = (frame.atime + 1) * (frame.astep + 1)
+        offsets = dark.get(frame.gain, zero)
+        for channel, (value, offset) in enumerate(zip(frame.counts, offsets)):
+            level[channel] += (value - offset) / (frame.gain * steps) / len(reference_frames)
+
+    if reference is None:
+        peak = max(level)
+        reference = [peak] * len(CHANNELS)
+    responsivity = [value / ref if ref else 0.0 for value, ref in zip(level, reference)]
+    return Calibration(responsivity, dark, crosstalk, name)
+
+
+def main(args=None):
+    from .recorder import Recording
+
+    parser = argparse.ArgumentParser(description="Build an AS7343 calibration profile from recordings.")
+    parser.add_argument("dark", help="recording of dark frames, at each gain that will be used")
+    parser.add_argument("reference", help="recording of frames of a reference light source")
+    parser.add_argument("output", help="profile JSON file to write")
+    parser.add_argument("--reference-levels", help="JSON list of the reference light level in each channel")
+    parser.add_argument("--name", help="name for the profile, eg: the sensor's serial number")
+    args = parser.parse_args(args)
+
+    reference = None
+    if args.reference_levels:
+        with open(args.reference_levels) as f:
+            reference = json.load(f)
+
+    with Recording(args.dark) as dark, Recording(args.reference) as ref:
+        dark_frames = [dark.frame(n) for n in range(len(dark))]
+        reference_frames = [ref.frame(n) for n in range(len(ref))]
+        profile = build_profile(dark_frames, reference_frames, reference, name=args.name)
+
+    profile.save(args.output)
+    print(f"Wrote {args.output} from {len(dark_frames)} dark and {len(reference_frames)} reference frames")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+"""Colorimetry from calibrated AS7343 frames.
+
+The spectrum is reconstructed by interpolating linearly between the
+centre wavelengths of the visible channels, and weighted by the CIE 1931
+2 degree colour matching functions. Both steps are linear, so they're
+folded into one 3 x len(CHANNELS) matrix, computed once, which turns
+calibrated channel values into CIE XYZ.
+
+Lux is only absolute if the calibration profile gives spectral
+irradiance in W/m^2/nm, otherwise set scale to match a reference meter.
+With 12 or 6 channels (see set_channels) pass the matching cycles, and
+the spectrum is interpolated over only the channels that are read, which
+is coarser than with all 18.
+"""
+import math
+from collections import namedtuple
+
+from . import CHANNELS, FRAME_INDEX
+
+# Centre wavelength in nm of each channel used for reconstruction, from TECHNICAL.md
+CENTRES = {
+    'F1': 405.0,
+    'F2': 425.0,
+    'FZ': 450.0,
+    'F3': 475.0,
+    'F4': 515.5,
+    'F5': 545.0,
+    'FY': 555.0,
+    'FXL': 600.0,
+    'F6': 640.0,
+    'F7': 690.0,
+    'F8': 740.0,
+}
+
+# Wavelength range and step for integrating the colour matching functions
+WAVELENGTH_MIN = 380
+WAVELENGTH_MAX = 780
+WAVELENGTH_STEP = 1
+
+# Maximum luminous efficacy in lm/W
+K_M = 683.0
+
+# Lobes of the CIE 1931 colour matching functions, (weight, centre, width below, width above)
+# Multi-lobe fit from Wyman, Sloan and Shirley, "Simple Analytic Approximations to the CIE XYZ
+# Color Matching Functions", JCGT 2013
+CMF_LOBES = (
+    ((1.056, 599.8, 37.9, 31.0), (0.362, 442.0, 16.0, 26.7), (-0.065, 501.1, 20.4, 26.2)),
+    ((0.821, 568.8, 46.9, 40.5), (0.286, 530.9, 16.3, 31.1)),
+    ((1.217, 437.0, 11.8, 36.0), (0.681, 459.0, 26.0, 13.8)),
+)
+
+# Result of converting one frame
+# X, Y, Z: CIE 1931 tristimulus values
+# lux: illuminance, K_M * Y * scale
+# cct: correlated colour temperature in Kelvin (McCamy's approximation)
+# x, y: CIE 1931 chromaticity
+# u, v: CIE 1976 u'v' chromaticity
+Colour = namedtuple('Colour', ('X', 'Y', 'Z', 'lux', 'cct', 'x', 'y', 'u', 'v'))
+
+
+def cmf(wavelength):
+    """Get the CIE 1931 colour matching functions at a wavelength in nm, as (x, y, z)."""
+    result = []
+    for lobes in CMF_LOBES:
+        total = 0.0
+        for weight, centre, below, above in lobes:
+            t = (wavelength - centre) / (below if wavelength < centre else above)
+            total += weight * math.exp(-0.5 * t * t)
+        result.append(total)
+    return tuple(result)
+
+
+def reconstruction_matrix(centres=CENTRES):
+    """Build the matrix from channel values in CHANNELS order to CIE XYZ.
+
+    Each channel value is taken as the spectral level at its centre
+    wavelength, and held flat beyond the first and last centres.
+
+    :param centres: dict of channel name to centre wavelength in nm
+
+    """
+    channels = sorted(centres, key=centres.get)
+    wavelengths = [centres[channel] for channel in channels]
+    columns = [CHANNELS.index(channel) for channel in channels]
+    matrix = [[0.0] * len(CHANNELS) for _ in range(3)]
+
+    for wavelength in range(WAVELENGTH_MIN, WAVELENGTH_MAX + 1, WAVELENGTH_STEP):
+        # Interpolation weights of the two channels either side of this wavelength
+        if wavelength <= wavelengths[0]:
+            weights = ((columns[0], 1.0),)
+        elif wavelength >= wavelengths[-1]:
+            weights = ((columns[-1], 1.0),)
+        else:
+            upper = next(n for n, centre in enumerate(wavelengths) if centre > wavelength)
+            t = (wavelength - wavelengths[upper - 1]) / (wavelengths[upper] - wavelengths[upper - 1])
+            weights = ((columns[upper - 1], 1.0 - t), (columns[upper], t))
+
+        for row, value in zip(matrix, cmf(wavelength)):
+            for column, weight in weights:
+                row[column] += value * weight * WAVELENGTH_STEP
+
+    return matrix
+
+
+def chromaticity(X, Y, Z):
+    """Get CIE 1931 xy and CIE 1976 u'v' chromaticity from XYZ, as (x, y, u, v).
+
+    Works on floats, or element-wise on numpy arrays.
+
+    """
+    total = X + Y + Z
+    denominator = X + 15.0 * Y + 3.0 * Z
+    return X / total, Y / total, 4.0 * X / denominator, 9.0 * Y / denominator
+
+
+def cct(x, y):
+    """Get the correlated colour temperature in Kelvin from CIE 1931 xy with McCamy's approximation.
+
+    Only meaningful close to the Planckian locus, roughly 2000K to 12500K.
+    Works on floats, or element-wise on numpy arrays.
+
+    """
+    n = (x - 0.3320) / (0.1858 - y)
+    return ((449.0 * n + 3525.0) * n + 6823.3) * n + 5520.33
+
+
+class Colorimetry:
+    """Convert calibrated channel values to XYZ, lux, CCT and chromaticity.
+
+    :param centres: dict of channel name to centre wavelength in nm, used for reconstruction
+    :param scale: Multiplier applied to lux, eg: to match a reference meter
+    :param cycles: Auto SMUX cycles the frames are read with, 3 for 18 channels, 2 for 12 or 1 for 6
+
+    """
+    def __init__(self, centres=CENTRES, scale=1.0, cycles=3):
+        if cycles not in FRAME_INDEX:
+            raise ValueError("Invalid cycles, expected 1, 2 or 3.")
+        centres = {channel: centre for channel, centre in centres.items() if FRAME_INDEX[cycles][CHANNELS.index(channel)] >= 0}
+        if len(centres) < 2:
+            raise ValueError("At least two channels with centres must be read.")
+        self.scale = scale
+        self.cycles = cycles
+        self.matrix = reconstruction_matrix(centres)
+        # Only the channels used, so NaN in unused channels (NIR, VIS) doesn't spread
+        self._columns = [column for column in range(len(CHANNELS)) if self.matrix[1][column]]
+        self._rows = [[row[column] for column in self._columns] for row in self.matrix]
+
+    def xyz(self, values):
+        """Get CIE XYZ from calibrated channel values in CHANNELS order, eg: from Calibration.apply()."""
+        used = [values[column] for column in self._columns]
+        if any(math.isnan(value) for value in used):
+            raise ValueError(f"Missing channel values, were the frames read with {self.cycles} cycles?")
+        return tuple(sum(m * v for m, v in zip(row, used)) for row in self._rows)
+
+    def measure(self, values):
+        """Get a Colour from calibrated channel values in CHANNELS order.
+
+        Chromaticity and CCT are NaN for a frame with no light.
+
+        """
+        X, Y, Z = self.xyz(values)
+        if X + Y + Z <= 0 or X + 15.0 * Y + 3.0 * Z <= 0:
+            x = y = u = v = temperature = math.nan
+        else:
+            x, y, u, v = chromaticity(X, Y, Z)
+            temperature = cct(x, y) if y != 0.1858 else math.nan
+        return Colour(X, Y, Z, K_M * Y * self.scale, temperature, x, y, u, v)
+
+    def measure_batch(self, values):
+        """Convert many frames at once. Requires numpy.
+
+        :param values: (frames, len(CHANNELS)) array of calibrated values, eg: from Calibration.apply_recording()
+        :returns: Colour of numpy arrays, one element per frame
+
+        """
+        import numpy
+        values = numpy.asarray(values, dtype=numpy.float64)[:, self._columns]
+        if numpy.isnan(values).any():
+            raise ValueError(f"Missing channel values, were the frames read with {self.cycles} cycles?")
+        X, Y, Z = numpy.asarray(self._rows) @ values.T
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            x, y, u, v = chromaticity(X, Y, Z)
+            temperature = cct(x, y)
+        return Colour(X, Y, Z, K_M * Y * self.scale, temperature, x, y, u, v)
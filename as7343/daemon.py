@@ -0,0 +1,445 @@
+"""Share AS7343 sensors between processes over a Unix domain socket.
+
+Only one process should drive a sensor. The Daemon owns the sensors,
+streams frames from them, and sends every frame to every connected
+client. DaemonClient offers the same get_data() and stream() as an
+AS7343, so existing code can read from the daemon instead:
+
+    python -m as7343.daemon --socket /tmp/as7343.sock --channels 18
+
+    with DaemonClient("/tmp/as7343.sock") as as7343:
+        for frame in as7343.stream(frame=True):
+            ...
+
+On connect the daemon sends HELLO, then one fixed size FRAME record per
+frame, little-endian. Each client has a bounded queue: if a client falls
+behind, its oldest frames are dropped (and counted in the dropped field
+of its next frame) so a slow client never holds up acquisition.
+"""
+import argparse
+import collections
+import os
+import select
+import socket
+import stat
+import struct
+import threading
+import time
+from array import array
+
+from . import CHANNELS, SpectralFrame, StreamFrame, _frame_data
+from .sensorarray import MuxChannel, SensorArray
+
+DEFAULT_PATH = "/tmp/as7343.sock"
+
+MAGIC = b"AS7343D\x00"
+VERSION = 1
+
+# magic, version, sensor count
+HELLO = struct.Struct("<8sHH")
+
+# sensor, cycles, atime, astatus, astep, dropped, sequence, timestamp, counts in CHANNELS order
+FRAME = struct.Struct(f"<BBBBHIQd{len(CHANNELS)}H")
+
+# Byte offset of the dropped field in FRAME
+DROPPED_OFFSET = 6
+
+# Frames queued for each client before the oldest are dropped
+QUEUE_SIZE = 64
+
+
+def encode_frame(sensor, frame):
+    """Pack a StreamFrame holding a SpectralFrame into a FRAME record.
+
+    :param sensor: Index of the sensor the frame is from
+    :param frame: A StreamFrame holding a SpectralFrame
+
+    """
+    data = frame.data
+    return FRAME.pack(
+        sensor, data.cycles, data.atime, data.astatus, data.astep,
+        frame.dropped, frame.sequence, frame.timestamp, *data.counts)
+
+
+def decode_frame(record):
+    """Unpack a FRAME record, as (sensor, StreamFrame holding a SpectralFrame)."""
+    sensor, cycles, atime, astatus, astep, dropped, sequence, timestamp, *counts = FRAME.unpack(record)
+    data = SpectralFrame(array('H', counts), astatus, atime, astep, timestamp, cycles)
+    return sensor, StreamFrame(sequence, timestamp, dropped, data)
+
+
+class _Client:
+    """One connected client and its queue of FRAME records.
+
+    :param connection: The client's socket
+    :param queue_size: Records to queue before dropping the oldest
+
+    """
+    def __init__(self, connection, queue_size=QUEUE_SIZE):
+        self.connection = connection
+        self.queue = collections.deque(maxlen=queue_size)
+        self.dropped = collections.Counter()
+        self.ready = threading.Condition()
+        self.closed = False
+
+    def put(self, record):
+        """Queue a record without ever blocking on the client."""
+        with self.ready:
+            if len(self.queue) == self.queue.maxlen:
+                # The first byte of a record is its sensor
+                self.dropped[self.queue[0][0]] += 1
+            self.queue.append(record)
+            self.ready.notify()
+
+    def get(self, timeout=None):
+        """Get the next record, with frames dropped for this client added in, or None on timeout."""
+        with self.ready:
+            if not self.queue and not self.ready.wait_for(lambda: self.queue or self.closed, timeout):
+                return None
+            if self.closed:
+                return None
+            record = self.queue.popleft()
+            dropped = self.dropped.pop(record[0], 0)
+        if dropped:
+            record = bytearray(record)
+            total, = struct.unpack_from("<I", record, DROPPED_OFFSET)
+            struct.pack_into("<I", record, DROPPED_OFFSET, min(total + dropped, 0xFFFFFFFF))
+        return record
+
+    def close(self):
+        with self.ready:
+            self.closed = True
+            self.ready.notify()
+        self.connection.close()
+
+
+def _bus(sensor):
+    """Get the bus an AS7343 is on, looking through any multiplexer channel."""
+    i2c_dev = sensor._as7343._i2c
+    if isinstance(i2c_dev, MuxChannel):
+        return i2c_dev._i2c
+    return i2c_dev
+
+
+class Daemon:
+    """Own one or more sensors and publish their frames to clients.
+
+    Every bus is streamed by its own thread, so sensors that share a bus
+    (every AS7343 is at 0x39, so behind a multiplexer) never have their
+    transfers interleaved. Every client is sent frames by its own thread,
+    so acquisition only ever appends to the client queues.
+
+    :param sensors: An AS7343, a list of them, or a SensorArray, frames are tagged with the list or SensorArray index
+    :param path: Path of the Unix domain socket to listen on
+    :param queue_size: Frames queued for each client before the oldest are dropped
+    :param timeout: Time in seconds to wait for each sensor's FIFO
+
+    """
+    def __init__(self, sensors, path=DEFAULT_PATH, queue_size=QUEUE_SIZE, timeout=5.0):
+        self.array = None
+        if isinstance(sensors, SensorArray):
+            self.array = sensors
+            sensors = [sensors[key] for key in sensors]
+        elif not isinstance(sensors, (list, tuple)):
+            sensors = [sensors]
+        self.sensors = list(sensors)
+        self.path = path
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.error = None
+        self._clients = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._threads = []
+        self._server = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    @property
+    def clients(self):
+        """Number of connected clients."""
+        with self._lock:
+            return len(self._clients)
+
+    def _remove_stale_socket(self):
+        """Remove a socket left behind by a daemon that didn't shut down cleanly.
+
+        Raises FileExistsError if a daemon is still listening, or the path isn't a socket.
+
+        """
+        try:
+            mode = os.stat(self.path).st_mode
+        except FileNotFoundError:
+            return
+        if not stat.S_ISSOCK(mode):
+            raise FileExistsError(f"{self.path} exists and is not a socket.")
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(self.path)
+        except ConnectionRefusedError:
+            os.unlink(self.path)
+            return
+        finally:
+            probe.close()
+        raise FileExistsError(f"An AS7343 daemon is already running on {self.path}.")
+
+    def start(self):
+        """Listen for clients and start streaming every sensor."""
+        self._remove_stale_socket()
+        self._server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._server.bind(self.path)
+        self._server.listen()
+        self._stop.clear()
+
+        self._spawn(self._accept, "as7343-accept")
+        if self.array is not None:
+            self._spawn(self._acquire_array, "as7343-array")
+            return
+        buses = {}
+        for index, sensor in enumerate(self.sensors):
+            buses.setdefault(id(_bus(sensor)), []).append(index)
+        for number, indexes in enumerate(buses.values()):
+            self._spawn(self._acquire, f"as7343-bus{number}", indexes)
+
+    def _spawn(self, target, name, *args):
+        thread = threading.Thread(target=target, name=name, args=args, daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def stop(self):
+        """Stop streaming, disconnect every client and remove the socket."""
+        self._stop.set()
+        if self._server is not None:
+            self._server.close()
+            self._server = None
+        for thread in self._threads:
+            if thread is not threading.current_thread():
+                thread.join(self.timeout)
+        self._threads = []
+        with self._lock:
+            clients, self._clients = self._clients, []
+        for client in clients:
+            client.close()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+    def serve_forever(self):
+        """Run until interrupted, or until a sensor fails."""
+        self.start()
+        try:
+            while not self._stop.wait(1.0):
+                pass
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+        if self.error is not None:
+            raise self.error
+
+    def _accept(self):
+        server = self._server
+        # Wake up now and then to notice stop()
+        server.settimeout(0.1)
+        while not self._stop.is_set():
+            try:
+                connection, _ = server.accept()
+            except socket.timeout:
+                continue
+            except OSError:
+                return
+            connection.settimeout(None)
+            try:
+                connection.sendall(HELLO.pack(MAGIC, VERSION, len(self.sensors)))
+            except OSError:
+                # Gone already, eg: another daemon checking this one is running
+                connection.close()
+                continue
+            client = _Client(connection, self.queue_size)
+            with self._lock:
+                self._clients.append(client)
+            self._spawn(self._send, "as7343-client", client)
+
+    def _send(self, client):
+        try:
+            while not self._stop.is_set():
+                record = client.get(0.1)
+                if record is not None:
+                    client.connection.sendall(record)
+        except OSError:
+            pass
+        finally:
+            with self._lock:
+                if client in self._clients:
+                    self._clients.remove(client)
+            client.close()
+
+    def _acquire(self, indexes):
+        """Stream the sensors on one bus, taking turns to drain each FIFO."""
+        sensors = [self.sensors[index] for index in indexes]
+        try:
+            states = [sensor._start_stream(True) for sensor in sensors]
+            while not self._stop.is_set():
+                for index, sensor, state in zip(indexes, sensors, states):
+                    level = sensor._wait_for(
+                        sensor._fifo_ready,
+                        self.timeout,
+                        f"Timeout waiting for sensor {index}.",
+                        sensor._frame_schedule())
+                    for frame in sensor._stream_frames(state, level):
+                        self.publish(index, frame)
+        except Exception as error:
+            self.error = error
+            self._stop.set()
+        finally:
+            for sensor in sensors:
+                sensor.stop_measurement()
+
+    def _acquire_array(self):
+        """Stream a SensorArray, which serialises each bus itself."""
+        indexes = {key: index for index, key in enumerate(self.array)}
+        stream = self.array.stream(timeout=self.timeout, frame=True)
+        try:
+            for frame_set in stream:
+                for key, frame in frame_set.frames.items():
+                    self.publish(indexes[key], frame)
+                if self._stop.is_set():
+                    break
+        except Exception as error:
+            self.error = error
+            self._stop.set()
+        finally:
+            stream.close()
+            self.array.call('stop_measurement')
+
+    def publish(self, sensor, frame):
+        """Send a StreamFrame to every client.
+
+        :param sensor: Index of the sensor the frame is from
+        :param frame: A StreamFrame holding a SpectralFrame
+
+        """
+        record = encode_frame(sensor, frame)
+        with self._lock:
+            clients = list(self._clients)
+        for client in clients:
+            client.put(record)
+
+
+class DaemonClient:
+    """Read frames from a Daemon, with the same get_data() and stream() as an AS7343.
+
+    Configuration belongs to the daemon, so setters are not available.
+
+    :param path: Path of the daemon's Unix domain socket
+    :param sensor: Index of the sensor to read
+
+    """
+    def __init__(self, path=DEFAULT_PATH, sensor=0):
+        self.sensor = sensor
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._socket.connect(path)
+        self._buffer = bytearray()
+
+        self._fill(HELLO.size, 5.0)
+        magic, version, self.sensors = HELLO.unpack_from(self._buffer)
+        del self._buffer[:HELLO.size]
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError("Not an AS7343 daemon.")
+        if not 0 <= sensor < self.sensors:
+            self.close()
+            raise ValueError(f"Invalid sensor, the daemon has {self.sensors}.")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        self._socket.close()
+
+    def _fill(self, size, timeout):
+        """Receive until at least size bytes are buffered."""
+        t_start = time.time()
+        while len(self._buffer) < size:
+            remaining = timeout - (time.time() - t_start)
+            if remaining <= 0 or not select.select([self._socket], [], [], remaining)[0]:
+                raise TimeoutError("Timeout waiting for the AS7343 daemon.")
+            data = self._socket.recv(65536)
+            if not data:
+                raise ConnectionError("AS7343 daemon closed the connection.")
+            self._buffer += data
+
+    def _next_frame(self, timeout):
+        """Get the next StreamFrame for this client's sensor."""
+        t_start = time.time()
+        while True:
+            self._fill(FRAME.size, timeout - (time.time() - t_start))
+            sensor, frame = decode_frame(self._buffer[:FRAME.size])
+            del self._buffer[:FRAME.size]
+            if sensor == self.sensor:
+                return frame
+
+    def _latest_frame(self, timeout):
+        """Get the newest StreamFrame for this sensor, skipping any that are already waiting."""
+        latest = None
+        while select.select([self._socket], [], [], 0)[0]:
+            data = self._socket.recv(65536)
+            if not data:
+                raise ConnectionError("AS7343 daemon closed the connection.")
+            self._buffer += data
+        while len(self._buffer) >= FRAME.size:
+            sensor, frame = decode_frame(self._buffer[:FRAME.size])
+            del self._buffer[:FRAME.size]
+            if sensor == self.sensor:
+                latest = frame
+        return latest or self._next_frame(timeout)
+
+    def get_data(self, timeout=5.0, direct=False, frame=False):
+        """Get the newest frame, see AS7343.get_data().
+
+        :param timeout: Time in seconds to wait for a frame
+        :param direct: Ignored, the daemon reads the sensor
+        :param frame: Return a SpectralFrame instead of a tuple of dicts
+
+        """
+        return _frame_data(self._latest_frame(timeout).data, frame)
+
+    def stream(self, timeout=5.0, frame=False):
+        """Yield every frame as a StreamFrame, see AS7343.stream().
+
+        dropped counts frames lost by the sensor and frames dropped
+        because this client fell behind.
+
+        :param timeout: Time in seconds to wait for each frame
+        :param frame: Yield SpectralFrame data instead of tuples of dicts
+
+        """
+        while True:
+            item = self._next_frame(timeout)
+            yield item._replace(data=_frame_data(item.data, frame))
+
+
+def main(args=None):
+    from . import AS7343
+    from .logger import add_sensor_arguments, configure_sensor
+
+    parser = argparse.ArgumentParser(prog="python -m as7343.daemon", description="Share an AS7343 with local clients.")
+    parser.add_argument("--socket", default=DEFAULT_PATH, help="Unix domain socket path (default: %(default)s)")
+    parser.add_argument("--queue-size", type=int, default=QUEUE_SIZE, help="frames queued per client before dropping (default: %(default)s)")
+    add_sensor_arguments(parser)
+    args = parser.parse_args(args)
+
+    sensor = AS7343()
+    configure_sensor(sensor, args)
+    Daemon(sensor, args.socket, args.queue_size).serve_forever()
+
+
+if __name__ == "__main__":
+    main()
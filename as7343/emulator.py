@@ -0,0 +1,414 @@
+"""Emulate an AS7343 on an I2C bus, for testing and benchmarking without hardware.
+
+Emulator stands in for an SMBus instance:
+
+    from as7343 import AS7343
+    from as7343.emulator import Emulator, LightSource
+
+    bus = Emulator(LightSource(level=0.001))
+    as7343 = AS7343(i2c_dev=bus)
+
+Measurements run in real time from the ENABLE, ATIME, ASTEP and WTIME
+settings, one auto SMUX cycle at a time, filling the DATA registers and
+the FIFO as the sensor would. Each cycle takes its settings as it
+starts. Every transaction and byte is counted.
+"""
+import ctypes
+import math
+import random
+import time
+from collections import Counter
+
+from . import ADC_MAX, CYCLE_CHANNELS, PART_ID, REGISTERS
+from .monitor import PERSISTENCE
+
+# Register addresses by name
+ADDRESS = {register.name: register.address for register in REGISTERS}
+
+# Flag for a read message in a combined transaction (I2C_M_RD)
+I2C_M_RD = 0x0001
+
+# FIFO size in 16-bit entries
+FIFO_SIZE = 128
+
+# Length of one ASTEP/FD_TIME step and one WTIME step, in seconds
+STEP = 2.78e-6
+WTIME_STEP = 2.78e-3
+
+# Values after power on or a soft reset, anything else is zero
+DEFAULTS = {
+    ADDRESS['AUXID']: 0x00,
+    ADDRESS['REVID']: 0x00,
+    ADDRESS['ID']: PART_ID,
+    ADDRESS['CFG1']: 0x09,           # 256x gain
+    ADDRESS['ASTEP']: 999 & 0xff,    # ASTEP 999, little-endian
+    ADDRESS['ASTEP'] + 1: 999 >> 8,
+    ADDRESS['AZ_CONFIG']: 0xff,
+}
+
+# Registers the sensor owns, writes to them are ignored
+READ_ONLY = (
+    ADDRESS['STATUS2'],
+    ADDRESS['STATUS3'],
+    ADDRESS['STATUS4'],
+    ADDRESS['ASTATUS'],
+    ADDRESS['FD_STATUS'],
+    ADDRESS['FIFO_LVL'],
+    ADDRESS['FDATA'],
+    ADDRESS['FDATA'] + 1,
+) + tuple(range(ADDRESS['DATA'], ADDRESS['DATA'] + 36))
+
+# Channel count (and so SMUX cycles) for each CFG20.auto_SMUX value
+AUTO_SMUX_CYCLES = {0b00: 1, 0b01: 1, 0b10: 2, 0b11: 3}
+
+
+class LightSource:
+    """A steady, or flickering, light falling on the emulated sensor.
+
+    Light levels are in counts per integration step at 1x gain, so a level
+    of 1.0 saturates the ADC at 1x, and 0.001 reaches 50% of full scale
+    with 65535 steps at 1024x.
+
+    :param levels: Optional dict of levels by channel name, as in as7343.CHANNELS
+    :param level: Level of any channel not in levels
+    :param flicker: Flicker frequency in Hz, or 0 for steady light
+    :param depth: Flicker modulation depth from 0.0 to 1.0
+
+    """
+    def __init__(self, levels=None, level=0.001, flicker=0, depth=0.0):
+        self.levels = dict(levels or {})
+        self.level = level
+        self.flicker = flicker
+        self.depth = depth
+
+    def __call__(self, channel, t):
+        """Get the level of a channel at time t."""
+        level = self.levels.get(channel, self.level)
+        if self.flicker:
+            level *= 1.0 + self.depth * math.sin(2.0 * math.pi * self.flicker * t)
+        return level
+
+
+class Emulator:
+    """An SMBus compatible AS7343.
+
+    Models the register banks, soft reset, auto SMUX cycle timing, the
+    DATA registers, FIFO filling (and overflow) per cycle, analog and
+    digital saturation, spectral thresholds with persistence, and sleep
+    after interrupt. Flicker detection is not emulated.
+
+    Transactions are counted in transactions, bytes_read and bytes_written
+    (including register address bytes), and in counts, a Counter keyed
+    by ('read' or 'write', register address).
+
+    :param light: A LightSource, or any callable(channel, t) returning a level
+    :param address: I2C address to respond on
+    :param latency: Time in seconds each transaction takes, simulating a real bus
+    :param byte_time: Time in seconds each byte takes, eg: 9 / 400000 for 400kHz
+    :param combined: Offer i2c_rdwr for combined transactions, as smbus2 does
+    :param noise: Standard deviation of noise added to counts
+    :param reset_time: Time in seconds the sensor doesn't respond for after a soft reset
+    :param clock: Monotonic clock, in seconds
+
+    """
+    def __init__(self, light=None, address=0x39, latency=0.0, byte_time=0.0, combined=True,
+                 noise=0.0, reset_time=0.0003, clock=time.monotonic):
+        self.light = light if light is not None else LightSource()
+        self.address = address
+        self.latency = latency
+        self.byte_time = byte_time
+        self.combined = combined
+        self.noise = noise
+        self.reset_time = reset_time
+        self.clock = clock
+        self._random = random.Random(0)
+        self.reset_counters()
+        self._power_on()
+
+    def reset_counters(self):
+        """Zero the transaction and byte counters."""
+        self.transactions = 0
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.bus_time = 0.0
+        self.counts = Counter()
+
+    def _power_on(self):
+        self.regs = bytearray(256)
+        for register, value in DEFAULTS.items():
+            self.regs[register] = value
+        self.fifo = []
+        self.cycles = 0
+        self._running = False
+        self._next_cycle = None
+        self._cycle = 0
+        self._fdata_high = 0
+        self._pointer = 0
+        self._busy_until = 0.0
+        self._persistence = 0
+        self._asleep = False
+        self._settings = None
+
+    # SMBus API
+
+    def read_i2c_block_data(self, i2c_address, register, length):
+        self._transaction(i2c_address, 1, length)
+        self.counts['read', register] += 1
+        return list(self._read(register, length))
+
+    def write_i2c_block_data(self, i2c_address, register, values):
+        self._transaction(i2c_address, 1 + len(values), 0)
+        self.counts['write', register] += 1
+        self._write(register, values)
+
+    def read_byte_data(self, i2c_address, register):
+        return self.read_i2c_block_data(i2c_address, register, 1)[0]
+
+    def write_byte_data(self, i2c_address, register, value):
+        self.write_i2c_block_data(i2c_address, register, [value])
+
+    @property
+    def i2c_rdwr(self):
+        # Only visible with combined=True, so the driver can fall back to block reads
+        if not self.combined:
+            raise AttributeError('i2c_rdwr')
+        return self._i2c_rdwr
+
+    def _i2c_rdwr(self, *msgs):
+        written = sum(msg.len for msg in msgs if not msg.flags & I2C_M_RD)
+        read = sum(msg.len for msg in msgs if msg.flags & I2C_M_RD)
+        self._transaction(msgs[0].addr, written, read)
+        for msg in msgs:
+            if msg.flags & I2C_M_RD:
+                self.counts['read', self._pointer] += 1
+                data = bytes(self._read(self._pointer, msg.len))
+                ctypes.memmove(msg.buf, data, msg.len)
+            else:
+                data = bytes(msg)
+                self._pointer = data[0]
+                if len(data) > 1:
+                    self.counts['write', self._pointer] += 1
+                    self._write(self._pointer, data[1:])
+
+    def _transaction(self, i2c_address, written, read):
+        """Count a transaction, wait out the bus time and catch up on measurements."""
+        if i2c_address != self.address:
+            raise OSError(121, "Remote I/O error")
+        self.transactions += 1
+        self.bytes_written += written
+        self.bytes_read += read
+        delay = self.latency + (written + read) * self.byte_time
+        if delay > 0:
+            self.bus_time += delay
+            time.sleep(delay)
+        now = self.clock()
+        if now < self._busy_until:
+            raise OSError(121, "Remote I/O error")
+        self._advance(now)
+
+    # Register access
+
+    def _check_bank(self, register):
+        # Registers below 0x80 are only reachable with CFG0.REG_BANK set
+        if register < 0x80 and not self.regs[ADDRESS['CFG0']] & 0b00010000:
+            raise OSError(5, f"Register 0x{register:02x} read with bank 0 selected")
+
+    def _read(self, register, length):
+        self._check_bank(register)
+        data = bytearray()
+        for _ in range(length):
+            if register == ADDRESS['FDATA']:
+                word = self.fifo.pop(0) if self.fifo else 0
+                self.regs[ADDRESS['FIFO_LVL']] = len(self.fifo)
+                self._fdata_high = word >> 8
+                data.append(word & 0xff)
+            elif register == ADDRESS['FDATA'] + 1:
+                data.append(self._fdata_high)
+                register = ADDRESS['FDATA'] - 1  # Wrap back around to FDATA
+            else:
+                if register == ADDRESS['ASTATUS']:
+                    # Reading ASTATUS latches the data, and it's no longer new
+                    self.regs[ADDRESS['STATUS2']] &= 0b10111111
+                data.append(self.regs[register])
+            register += 1
+            if register > 0xff:
+                break
+        return data
+
+    def _write(self, register, values):
+        self._check_bank(register)
+        for value in values:
+            if register == ADDRESS['CONTROL']:
+                self._control(value)
+            elif register == ADDRESS['STATUS']:
+                self.regs[register] &= ~value & 0xff  # Write 1 to clear
+                if value & 0b00001000:  # Clearing AINT clears the threshold flags
+                    self.regs[ADDRESS['STATUS3']] = 0
+            elif register not in READ_ONLY:
+                self.regs[register] = value
+            register += 1
+        self._update_running()
+
+    def _control(self, value):
+        if value & 0b00001000:  # SW_RESET
+            self._power_on()
+            self._busy_until = self.clock() + self.reset_time
+            return
+        if value & 0b00000010:  # FIFO_CLR
+            self.fifo = []
+            self.regs[ADDRESS['FIFO_LVL']] = 0
+            self.regs[ADDRESS['STATUS4']] &= 0b01111111
+            self.regs[ADDRESS['STATUS']] &= 0b11111011
+        if value & 0b00000001:  # CLEAR_SAI_ACT
+            self.regs[ADDRESS['STATUS4']] &= 0b11111101
+            if self._asleep:
+                self._asleep = False
+                self._cycle = 0
+                self._next_cycle = self.clock() + self._latch()
+
+    # Measurement
+
+    def _word(self, address):
+        return self.regs[address] | (self.regs[address + 1] << 8)
+
+    def cycle_time(self):
+        """Get the length of one auto SMUX cycle in seconds."""
+        integration = (self.regs[ADDRESS['ATIME']] + 1) * (self._word(ADDRESS['ASTEP']) + 1) * STEP
+        wait = 0.0
+        if self.regs[ADDRESS['ENABLE']] & 0b00001000:  # WEN
+            wait = (self.regs[ADDRESS['WTIME']] + 1) * WTIME_STEP
+            if self.regs[ADDRESS['CFG0']] & 0b00000100:  # WLONG
+                wait *= 16
+        return max(integration, wait)
+
+    def _latch(self):
+        """Take the settings for a cycle as it starts, returning its length."""
+        regs = self.regs
+        steps = (regs[ADDRESS['ATIME']] + 1) * (self._word(ADDRESS['ASTEP']) + 1)
+        again = regs[ADDRESS['CFG1']] & 0b00011111
+        period = self.cycle_time()
+        self._settings = (steps, again, period)
+        return period
+
+    def _update_running(self):
+        enable = self.regs[ADDRESS['ENABLE']]
+        running = enable & 0b00010011 == 0b00010011  # SMUXEN, SP_EN and PON
+        if running and not self._running:
+            self._cycle = 0
+            self._next_cycle = self.clock() + self._latch()
+        self._running = running
+
+    def _advance(self, now):
+        """Run every cycle that would have finished by now."""
+        if not self._running or self._asleep:
+            return
+        period = self._settings[2]
+        # After a long gap only the last few cycles can matter, the FIFO has long overflowed
+        behind = int((now - self._next_cycle) / period) if period > 0 else 0
+        if behind > FIFO_SIZE:
+            skip = behind - FIFO_SIZE
+            self._next_cycle += skip * period
+            self._cycle = (self._cycle + skip) % self._cycles_per_set()
+            self.regs[ADDRESS['STATUS4']] |= 0b10000000
+        while now >= self._next_cycle and not self._asleep:
+            self._measure(self._next_cycle)
+            self._next_cycle += self._latch()
+
+    def _cycles_per_set(self):
+        return AUTO_SMUX_CYCLES[(self.regs[ADDRESS['CFG20']] >> 5) & 0b11]
+
+    def _measure(self, t_end):
+        """Finish one auto SMUX cycle, updating the DATA registers and FIFO."""
+        regs = self.regs
+        cycle = self._cycle
+        steps, again, _ = self._settings
+        gain = 1 << (again - 1) if again else 0.5
+        t = t_end - steps * STEP / 2
+
+        analog = False
+        digital = False
+        counts = []
+        for channel in CYCLE_CHANNELS[cycle]:
+            rate = self.light(channel or 'VIS', t) * gain
+            if rate > 1.0:
+                analog = True
+                rate = 1.0
+            value = rate * steps
+            if self.noise:
+                value += self._random.gauss(0.0, self.noise)
+            if value > ADC_MAX:
+                digital = True
+            counts.append(int(min(max(value, 0), ADC_MAX)))
+
+        astatus = again | (0b10000000 if analog or digital else 0)
+        regs[ADDRESS['ASTATUS']] = astatus
+        data = ADDRESS['DATA'] + cycle * 12
+        for n, value in enumerate(counts):
+            regs[data + n * 2] = value & 0xff
+            regs[data + n * 2 + 1] = value >> 8
+
+        # FIFO_MAP selects which of ASTATUS and the six channels are written
+        fifo_map = regs[ADDRESS['FIFO_MAP']]
+        entries = [astatus] if fifo_map & 0b00000001 else []
+        entries += [value for n, value in enumerate(counts) if fifo_map & (0b10 << n)]
+        for entry in entries:
+            if len(self.fifo) >= FIFO_SIZE:
+                regs[ADDRESS['STATUS4']] |= 0b10000000  # FIFO_OV
+                break
+            self.fifo.append(entry)
+        regs[ADDRESS['FIFO_LVL']] = len(self.fifo)
+
+        status2 = regs[ADDRESS['STATUS2']] & 0b01000000
+        status2 |= 0b00010000 if digital else 0
+        status2 |= 0b00001000 if analog else 0
+        status = self._threshold(counts)
+        if len(self.fifo) >= self._fifo_threshold():
+            status |= 0b00000100  # FINT
+        if analog or digital:
+            status |= 0b10000000  # ASAT
+
+        self.cycles += 1
+        self._cycle += 1
+        if self._cycle >= self._cycles_per_set():
+            self._cycle = 0
+            status2 |= 0b01000000  # AVALID, a full set of channels is ready
+        regs[ADDRESS['STATUS2']] = status2
+        regs[ADDRESS['STATUS']] |= status
+
+        # Sleep after interrupt stops measuring until CLEAR_SAI_ACT
+        if regs[ADDRESS['CFG3']] & 0b00010000 and self._int_asserted():
+            self._asleep = True
+            regs[ADDRESS['STATUS4']] |= 0b00000010  # SAI_ACT
+
+    def _threshold(self, counts):
+        """Compare the CFG12.SP_TH_CH channel against SP_TH, returning the AINT bit for STATUS."""
+        regs = self.regs
+        apers = PERSISTENCE[regs[ADDRESS['PERS']] & 0b00001111]
+        if apers == 0:
+            return 0b00001000  # AINT, with APERS 0 every cycle counts
+        value = counts[regs[ADDRESS['CFG12']] & 0b00000111]
+        low = self._word(ADDRESS['SP_TH'])
+        high = self._word(ADDRESS['SP_TH'] + 2)
+        status3 = (0b00100000 if value > high else 0) | (0b00010000 if value < low else 0)
+        if not status3:
+            self._persistence = 0
+            return 0
+        self._persistence += 1
+        if self._persistence < apers:
+            return 0
+        regs[ADDRESS['STATUS3']] = status3
+        return 0b00001000
+
+    def _fifo_threshold(self):
+        return (1, 4, 8, 16)[self.regs[ADDRESS['CFG8']] >> 6]
+
+    def interrupt(self):
+        """Return True if the INT pin would be asserted (low)."""
+        self._advance(self.clock())
+        return self._int_asserted()
+
+    def _int_asserted(self):
+        status = self.regs[ADDRESS['STATUS']]
+        internab = self.regs[ADDRESS['INTERNAB']]
+        return bool((status & 0b00001000 and internab & 0b00001000) or (status & 0b00000100 and internab & 0b00000100))
+
@@ -0,0 +1,229 @@
+"""Closed-loop auto exposure and auto gain for the AS7343."""
+import math
+
+from . import ADC_MAX, ASTEP_MAX, ATIME_MAX, STEP_US, SpectralFrame, StreamFrame
+
+# Gains supported by CFG1.AGAIN
+GAINS = (0.5, 1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024, 2048)
+
+# Longest integration time in steps, 256 * 65535
+STEPS_MAX = (ATIME_MAX + 1) * (ASTEP_MAX + 1)
+
+
+class AutoExposure:
+    """Pick gain and integration time so the brightest channel sits near a target level.
+
+    Each frame's counts are divided by the gain and integration time it was
+    taken with (both carried by SpectralFrame), which gives the light level
+    independent of the current settings. From that the gain and integration
+    time that put the peak channel at the target fraction of full scale are
+    solved for directly, so a frame in range settles in one step.
+
+    Saturated frames don't say how bright the light is, so the exposure is
+    cut by a fixed factor and the next frame measured again.
+
+    Normally each step changes the exposure by at most max_step, so brief
+    flashes and shadows don't throw the settings off. With fast=True a
+    saturated frame, or one that needs more than max_step to correct, skips
+    the limit and jumps straight to the new exposure.
+
+    Where both are possible a longer integration time is preferred over
+    more gain, since it collects more light rather than amplifying noise.
+
+    :param sensor: An AS7343 instance
+    :param target: Fraction of ADC full scale to put the peak channel at
+    :param tolerance: Leave settings alone while the peak is within this fraction of the target
+    :param min_gain: Lowest gain to use
+    :param max_gain: Highest gain to use
+    :param min_integration_time: Shortest integration time in microseconds
+    :param max_integration_time: Longest integration time in microseconds
+    :param max_step: Largest change in exposure per frame, when not in fast mode
+    :param fast: Allow large jumps for saturated frames and sudden light changes
+    :param saturation_step: Factor to cut exposure by in fast mode when a frame saturates
+
+    """
+    def __init__(self, sensor, target=0.5, tolerance=0.5, min_gain=0.5, max_gain=2048,
+                 min_integration_time=STEP_US, max_integration_time=ADC_MAX * STEP_US,
+                 max_step=4, fast=True, saturation_step=16):
+        if not 0 < target < 1:
+            raise ValueError("Target must be a fraction of full scale between 0 and 1.")
+        self.sensor = sensor
+        self.target = target
+        self.tolerance = tolerance
+        self.gains = [gain for gain in GAINS if min_gain <= gain <= max_gain]
+        if not self.gains:
+            raise ValueError("No gains between min_gain and max_gain.")
+        self.min_steps = max(1, int(round(min_integration_time / STEP_US)))
+        self.max_steps = min(STEPS_MAX, int(max_integration_time / STEP_US))
+        self.max_step = max_step
+        self.fast = fast
+        self.saturation_step = saturation_step
+
+    def measure(self, frame):
+        """Get the peak channel as a fraction of full scale.
+
+        :param frame: A SpectralFrame
+        :returns: fraction, or None if the frame is saturated
+
+        """
+        full_scale = min((frame.atime + 1) * (frame.astep + 1), ADC_MAX)
+        peak = max(frame.counts)
+        if frame.saturated or peak >= full_scale:
+            return None
+        # Anything under one count is treated as one count
+        return max(peak, 1) / full_scale
+
+    def solve(self, frame):
+        """Get the gain and integration time for the next frame.
+
+        :param frame: A SpectralFrame
+        :returns: (gain, integration time in microseconds), or None if no change is needed
+
+        """
+        steps = (frame.atime + 1) * (frame.astep + 1)
+        fraction = self.measure(frame)
+
+        if fraction is None:
+            fraction = self.target * (self.saturation_step if self.fast else self.max_step)
+        elif abs(fraction - self.target) <= self.target * self.tolerance:
+            return None
+        elif not self.fast:
+            fraction = min(max(fraction, self.target / self.max_step), self.target * self.max_step)
+
+        # Light level in counts per integration step at 1x gain
+        level = fraction * min(steps, ADC_MAX) / (frame.gain * steps)
+        gain, integration_time = self._solve(level)
+
+        # Already as close as the gain and integration time limits allow
+        if gain == frame.gain and int(round(integration_time / STEP_US)) == steps:
+            return None
+        return gain, integration_time
+
+    def _solve(self, level):
+        """Find the gain and integration time that put a light level closest to the target.
+
+        Below ADC_MAX steps the full scale shrinks with the integration time,
+        so only gain moves the peak relative to full scale. Beyond it a longer
+        integration time raises the peak too.
+
+        """
+        best = None
+        for gain in self.gains:
+            if level * gain >= self.target:
+                steps = min(self.max_steps, ADC_MAX)
+            else:
+                steps = min(self.max_steps, int(self.target * ADC_MAX / (level * gain)))
+            steps = max(steps, self.min_steps)
+            fraction = level * gain * steps / min(steps, ADC_MAX)
+            error = abs(math.log(fraction / self.target))
+            # Gains are in increasing order, so ties go to the lowest gain
+            if best is None or error < best[0] - 1e-9:
+                best = (error, gain, steps)
+
+        _, gain, steps = best
+        return gain, steps * STEP_US
+
+    def update(self, frame):
+        """Adjust the sensor for the next frame.
+
+        Only for frames read one at a time, see stream() to adjust a stream.
+
+        :param frame: A SpectralFrame, as returned by get_data(frame=True)
+        :returns: True if the settings were changed
+
+        """
+        settings = self.solve(frame)
+        if settings is None:
+            return False
+        gain, integration_time = settings
+
+        with self.sensor.configure():
+            self.sensor.set_gain(gain)
+            self.sensor.set_integration_time(integration_time)
+        return True
+
+    def stream(self, timeout=5.0):
+        """Stream frames from the sensor, adjusting the exposure as they arrive.
+
+        New settings reach the sensor part way through a frame, so frames
+        already in the FIFO are labelled with the old settings, the frame
+        being measured (whose cycles may be split between the two) is
+        skipped and counted in dropped, and the frames after it get the new
+        settings. A frame whose cycles don't all report the expected gain in
+        ASTATUS is skipped too. Only frames taken entirely with the latest
+        settings adjust the exposure.
+
+        :param timeout: Time in seconds to wait for each drain of the FIFO
+        :returns: Yields a StreamFrame holding a SpectralFrame for each frame
+
+        """
+        sensor = self.sensor
+        cycles = sensor._read_cycles
+        state = sensor._start_stream(decode=lambda results, timestamp: results)
+        frame_size = state.frame_size
+        settings = self._settings()
+        # (first FIFO word of the frame the change lands in, of the frame after it, new settings)
+        pending = None
+        # FIFO words drained so far, and the first word of the next frame
+        drained = start = 0
+        skipped = 0
+
+        while True:
+            level = sensor._wait_for(
+                sensor._fifo_ready,
+                timeout,
+                f"Timeout waiting for {frame_size} entries in FIFO.",
+                sensor._frame_schedule())
+
+            frames = sensor._stream_frames(state, level)
+            if not frames:
+                # Overflowed and restarted, so every frame from here has the latest settings
+                if pending is not None:
+                    settings, pending = pending[2], None
+                drained = start = 0
+                continue
+            drained += len(frames) * frame_size
+
+            for item in frames:
+                results = item.data
+                frame_start, start = start, start + frame_size
+                if pending is not None and frame_start >= pending[0]:
+                    if frame_start < pending[1]:
+                        skipped += 1
+                        continue
+                    settings, pending = pending[2], None
+
+                atime, astep, again = settings
+                if any(results[cycle * 7] & 0b00001111 != again for cycle in range(cycles)):
+                    # Changed behind our back, or lost track, so pick up the settings afresh
+                    pending = self._pending(drained, frame_size)
+                    skipped += 1
+                    continue
+
+                data = SpectralFrame.from_results(results, atime, astep, item.timestamp, cycles)
+                if pending is None and self.update(data):
+                    pending = self._pending(drained, frame_size)
+                    state.period = sensor.get_frame_period()
+                yield StreamFrame(item.sequence, item.timestamp, item.dropped + skipped, data)
+                skipped = 0
+
+    def _settings(self):
+        """Get the sensor's (ATIME, ASTEP, AGAIN)."""
+        registers = self.sensor._as7343
+        # Shadowed, so this doesn't touch the bus
+        return registers.read_register('ATIME'), registers.read_register('ASTEP'), registers.read_register('CFG1') & 0b00011111
+
+    def _pending(self, drained, frame_size):
+        """Work out which frames the sensor's current settings apply to, just after they're written.
+
+        Whole frames in the FIFO were taken before the change, the frame
+        being measured straddles it, and the one after is the first taken
+        entirely with the new settings.
+
+        :param drained: FIFO words drained so far
+        :param frame_size: FIFO words per frame
+
+        """
+        level = self.sensor._as7343.get('FIFO_LVL').FIFO_LVL
+        boundary = drained + level - level % frame_size
+        return boundary, boundary + frame_size, self._settings()
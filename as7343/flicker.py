@@ -0,0 +1,269 @@
+"""Flicker detection with the AS7343 flicker detect (FD) channel.
+
+The sensor can report 100Hz and 120Hz flicker by itself (see get_status),
+or write raw FD samples to the FIFO, which can be analysed on the host to
+find flicker at any frequency up to half the sample rate.
+"""
+import cmath
+import math
+import struct
+from array import array
+from collections import namedtuple
+
+from . import STEP_US
+
+# FD_TIME is in units of STEP_US, one raw sample is taken every FD_TIME + 1 steps
+
+# Largest FD_TIME that fits raw samples into 8 bits, two samples per FIFO entry
+FD_TIME_8BIT_MAX = 255
+
+# Largest FD_TIME, split over FD_TIME_1 and FD_TIME_2
+FD_TIME_MAX = 2047
+
+# On-chip flicker verdict from FD_STATUS
+# hz100, hz120: True if flicker was detected, False if not, None if not yet valid
+FlickerStatus = namedtuple('FlickerStatus', ('valid', 'saturated', 'hz100', 'hz120'))
+
+# Result of analysing raw samples
+# frequency: strongest flicker frequency in Hz
+# amplitude: peak amplitude of that frequency in counts
+# depth: amplitude relative to the mean level, 0.0 for steady light up to 1.0
+# percent: percent flicker, 100 * (max - min) / (max + min) of the samples
+Flicker = namedtuple('Flicker', ('frequency', 'amplitude', 'depth', 'percent'))
+
+
+class FlickerDetector:
+    """Drive the AS7343 flicker detect channel.
+
+    Raw sampling uses the FIFO, so spectral measurements are stopped while
+    it's enabled, and restarted (if they were running) by disable().
+
+    :param sensor: An AS7343 instance
+    :param fd_time: Sample time in 2.78us steps minus one, up to 255 for 8-bit samples or 2047
+    :param gain: Flicker detect gain, one of 0.5, 1, 2, 4 ... 2048x
+
+    """
+    def __init__(self, sensor, fd_time=FD_TIME_8BIT_MAX, gain=16):
+        self.sensor = sensor
+        self.raw = False
+        self._restart = False
+        self.configure(fd_time, gain)
+
+    @property
+    def sample_rate(self):
+        """Nominal raw sample rate in Hz."""
+        return 1000000.0 / ((self.fd_time + 1) * STEP_US)
+
+    def configure(self, fd_time=None, gain=None):
+        """Set the flicker detect sample time and gain.
+
+        FD_TIME must not change while flicker detection is running, so it's
+        paused while the new settings are written.
+
+        :param fd_time: Sample time in 2.78us steps minus one
+        :param gain: Flicker detect gain
+
+        """
+        if fd_time is not None:
+            if not 0 <= fd_time <= FD_TIME_MAX:
+                raise ValueError(f"FD_TIME out of range, expected 0 to {FD_TIME_MAX}.")
+            self.fd_time = fd_time
+        if gain is not None:
+            self.gain = gain
+
+        registers = self.sensor._as7343
+        enabled = registers.get('ENABLE').FDEN
+        if enabled:
+            registers.set('ENABLE', FDEN=False)
+        with self.sensor.configure():
+            registers.set('FD_TIME_1', FD_TIME=self.fd_time & 0xff)
+            registers.set('FD_TIME_2', FD_TIME=self.fd_time >> 8, FD_GAIN=self.gain)
+            registers.set('CFG20', FD_FIFO_8b=self.fd_time <= FD_TIME_8BIT_MAX)
+        if enabled:
+            registers.set('ENABLE', FDEN=True)
+
+    def enable(self, raw=False):
+        """Start flicker detection.
+
+        :param raw: Also write raw samples to the FIFO, for read_samples() and stream()
+
+        """
+        sensor = self.sensor
+        registers = sensor._as7343
+        self.raw = raw
+        if raw:
+            # Spectral results would be interleaved with the samples
+            self._restart = sensor.running
+            sensor.stop_measurement()
+            registers.set('ENABLE', SP_EN=False)
+            registers.set('FD_CFG0', FIFO_WRITE_FD=True)
+            sensor.clear_fifo()
+        registers.set('ENABLE', FDEN=True)
+
+    def disable(self):
+        """Stop flicker detection, and restart spectral measurements if raw sampling stopped them."""
+        sensor = self.sensor
+        registers = sensor._as7343
+        registers.set('ENABLE', FDEN=False)
+        if self.raw:
+            registers.set('FD_CFG0', FIFO_WRITE_FD=False)
+            registers.set('ENABLE', SP_EN=True)
+            sensor.clear_fifo()
+            self.raw = False
+            if self._restart:
+                sensor.start_measurement()
+
+    def get_status(self):
+        """Get the on-chip 100Hz and 120Hz flicker verdicts."""
+        status = self.sensor._as7343.get('FD_STATUS')
+        return FlickerStatus(
+            bool(status.FD_VALID),
+            bool(status.FD_SAT),
+            bool(status.FD_100HZ) if status.FD_100HZ_VALID else None,
+            bool(status.FD_120HZ) if status.FD_120HZ_VALID else None)
+
+    def _drain(self, level):
+        """Read level FIFO entries as raw samples."""
+        data = self.sensor._read_block(self.sensor._as7343.registers['FDATA'].address, level * 2, auto_increment=False)
+        if self.fd_time <= FD_TIME_8BIT_MAX:
+            return array('B', data)
+        return array('H', struct.unpack('<{}H'.format(level), data))
+
+    def _ready(self):
+        return self.sensor._as7343.get('FIFO_LVL').FIFO_LVL
+
+    def read_samples(self, count, timeout=5.0):
+        """Read count contiguous raw samples.
+
+        :param count: Number of samples to read
+        :param timeout: Time in seconds to wait for each read of the FIFO
+        :returns: array of samples, 'B' for 8-bit samples otherwise 'H'
+
+        """
+        for samples in self.stream(count, timeout):
+            return samples
+
+    def stream(self, block_size=1024, timeout=5.0):
+        """Yield blocks of contiguous raw samples.
+
+        If the FIFO overflows the partial block is discarded, so every
+        block is free of gaps and can be analysed on its own.
+
+        :param block_size: Number of samples per block
+        :param timeout: Time in seconds to wait for each read of the FIFO
+
+        """
+        sensor = self.sensor
+        if not self.raw:
+            self.enable(raw=True)
+        # Samples raise FINT at FIFO_TH like frames do, so wait on INT if there is one
+        sensor._arm_interrupt(False)
+
+        samples = array('B' if self.fd_time <= FD_TIME_8BIT_MAX else 'H')
+        while True:
+            level = sensor._wait_for(self._ready, timeout, "Timeout waiting for flicker samples.", poll=False)
+            if sensor._as7343.get('STATUS4').FIFO_OV:
+                sensor.clear_fifo()
+                del samples[:]
+                continue
+            samples.extend(self._drain(level))
+            while len(samples) >= block_size:
+                yield samples[:block_size]
+                del samples[:block_size]
+
+    def analyse(self, samples, min_frequency=10.0):
+        """Find the strongest flicker in a block of raw samples, see analyse()."""
+        return analyse(samples, self.sample_rate, min_frequency)
+
+
+def goertzel(samples, frequency, sample_rate):
+    """Get the peak amplitude of one frequency in a block of samples.
+
+    :param samples: Sequence of samples
+    :param frequency: Frequency in Hz
+    :param sample_rate: Sample rate in Hz
+
+    """
+    omega = 2.0 * math.pi * frequency / sample_rate
+    coeff = 2.0 * math.cos(omega)
+    s1 = s2 = 0.0
+    for sample in samples:
+        s1, s2 = sample + coeff * s1 - s2, s1
+    power = s1 * s1 + s2 * s2 - coeff * s1 * s2
+    return 2.0 * math.sqrt(max(power, 0.0)) / len(samples)
+
+
+def spectrum(samples, sample_rate):
+    """Get the Hann windowed amplitude spectrum of a block of samples.
+
+    Uses numpy's FFT when numpy is installed, otherwise a (much slower)
+    DFT in pure Python.
+
+    :param samples: Sequence of samples
+    :param sample_rate: Sample rate in Hz
+    :returns: (frequencies, amplitudes), one of each per bin from DC to half the sample rate
+
+    """
+    n = len(samples)
+    try:
+        import numpy
+    except ImportError:
+        numpy = None
+
+    if numpy is not None:
+        window = numpy.hanning(n)
+        values = numpy.asarray(samples, dtype=numpy.float64)
+        amplitudes = numpy.abs(numpy.fft.rfft((values - values.mean()) * window)) * 2.0 / window.sum()
+        return numpy.fft.rfftfreq(n, 1.0 / sample_rate).tolist(), amplitudes.tolist()
+
+    mean = sum(samples) / n
+    window = [0.5 - 0.5 * math.cos(2.0 * math.pi * i / (n - 1)) for i in range(n)]
+    windowed = [(sample - mean) * w for sample, w in zip(samples, window)]
+    scale = 2.0 / sum(window)
+    frequencies = []
+    amplitudes = []
+    for k in range(n // 2 + 1):
+        step = cmath.exp(-2j * math.pi * k / n)
+        total = 0j
+        twiddle = 1 + 0j
+        for value in windowed:
+            total += value * twiddle
+            twiddle *= step
+        frequencies.append(k * sample_rate / n)
+        amplitudes.append(abs(total) * scale)
+    return frequencies, amplitudes
+
+
+def analyse(samples, sample_rate, min_frequency=10.0):
+    """Find the strongest flicker frequency in a block of raw samples.
+
+    The frequency is interpolated between FFT bins, so it's resolved
+    more finely than sample_rate / len(samples).
+
+    :param samples: Sequence of raw samples, eg: from FlickerDetector.read_samples()
+    :param sample_rate: Sample rate in Hz
+    :param min_frequency: Ignore slow changes in light level below this frequency, in Hz
+
+    """
+    if len(samples) < 4:
+        raise ValueError("Need at least four samples.")
+    mean = sum(samples) / len(samples)
+    highest = max(samples)
+    lowest = min(samples)
+    percent = 100.0 * (highest - lowest) / (highest + lowest) if highest + lowest else 0.0
+
+    frequencies, amplitudes = spectrum(samples, sample_rate)
+    bin_width = frequencies[1]
+    first = max(1, int(math.ceil(min_frequency / bin_width)))
+    if first >= len(amplitudes) - 1:
+        raise ValueError("min_frequency is above the highest frequency in the samples.")
+    peak = max(range(first, len(amplitudes) - 1), key=amplitudes.__getitem__)
+
+    # Fit a parabola through the peak and its neighbours
+    left, centre, right = amplitudes[peak - 1:peak + 2]
+    divisor = left - 2.0 * centre + right
+    offset = 0.5 * (left - right) / divisor if divisor else 0.0
+    amplitude = centre - 0.25 * (left - right) * offset
+
+    depth = min(amplitude / mean, 1.0) if mean else 0.0
+    return Flicker((peak + offset) * bin_width, amplitude, depth, percent)
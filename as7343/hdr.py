@@ -0,0 +1,217 @@
+"""High dynamic range measurements from a bracket of exposures.
+
+HDR cycles the sensor through a bracket of gain and integration time
+settings, one frame each, and merges every bracket into one set of
+values. Each exposure is written while the frame before it is still
+being measured, so the bracket runs back to back with no idle cycles.
+
+Merged values are in counts per integration step at 1x gain: the sum of
+the unsaturated counts over the sum of gain x integration steps, which
+weights every exposure by gain times integration time.
+"""
+import time
+from array import array
+from collections import namedtuple
+
+from . import ADC_MAX, CHANNELS, FRAME_INDEX, SpectralFrame, _FrameSchedule
+
+# In a cycle that reports saturation, channels reading at least this
+# fraction of the brightest channel in the cycle are taken as saturated
+SATURATION_RATIO = 0.5
+
+# (gain, integration time in us) for each exposure, from dim to bright scenes
+DEFAULT_BRACKET = ((256, 50000), (16, 50000), (1, 27800))
+
+# Times in a row the bracket can be started over before giving up
+MAX_RESTARTS = 8
+
+# A merged bracket
+# values: array('d') in CHANNELS order, counts per step at 1x gain, NaN for channels not read
+# saturated: names of channels that saturated in every exposure, their value is a lower bound
+# frames: the SpectralFrame for each exposure, in bracket order
+HDRFrame = namedtuple('HDRFrame', ('timestamp', 'values', 'saturated', 'frames'))
+
+
+def saturated_channels(results, cycles):
+    """Get a saturated flag for each channel in CHANNELS order from FIFO ordered results.
+
+    :param results: One frame of FIFO ordered results
+    :param cycles: Number of auto SMUX cycles in the frame
+
+    """
+    flags = []
+    for index in FRAME_INDEX[cycles]:
+        if index < 0:
+            flags.append(False)
+            continue
+        cycle = index // 7 * 7
+        value = results[index]
+        if value >= ADC_MAX:
+            flags.append(True)
+        elif results[cycle] & 0b10000000:
+            flags.append(value >= SATURATION_RATIO * max(results[cycle + 1:cycle + 7]))
+        else:
+            flags.append(False)
+    return flags
+
+
+def merge(frames, saturation, timestamp=None):
+    """Merge the frames of one bracket.
+
+    :param frames: SpectralFrame for each exposure
+    :param saturation: Saturated flags for each frame, see saturated_channels()
+    :param timestamp: Time of the merged frame, defaults to the last frame's
+
+    """
+    values = array('d')
+    saturated = []
+    read = FRAME_INDEX[frames[0].cycles]
+    for channel, name in enumerate(CHANNELS):
+        if read[channel] < 0:
+            values.append(float('nan'))
+            continue
+        counts = weight = 0
+        for frame, flags in zip(frames, saturation):
+            if not flags[channel]:
+                counts += frame.counts[channel]
+                weight += frame.gain * (frame.atime + 1) * (frame.astep + 1)
+        if weight == 0:
+            # Saturated in every exposure, use the least sensitive one
+            frame = min(frames, key=lambda frame: frame.gain * (frame.atime + 1) * (frame.astep + 1))
+            counts = frame.counts[channel]
+            weight = frame.gain * (frame.atime + 1) * (frame.astep + 1)
+            saturated.append(name)
+        values.append(counts / weight)
+    if timestamp is None:
+        timestamp = frames[-1].timestamp
+    return HDRFrame(timestamp, values, tuple(saturated), list(frames))
+
+
+class HDR:
+    """Measure with a bracket of exposures.
+
+    The sensor's gain and integration time are left at one of the
+    bracket's settings afterwards.
+
+    :param sensor: An AS7343 instance
+    :param bracket: Sequence of (gain, integration time in us) for each exposure
+
+    """
+    def __init__(self, sensor, bracket=DEFAULT_BRACKET):
+        if len(bracket) < 1:
+            raise ValueError("Bracket must have at least one exposure.")
+        self.sensor = sensor
+        self.bracket = tuple(bracket)
+        self.restarts = 0
+
+    def _write(self, index):
+        """Write the settings for an exposure, returning its (ATIME, ASTEP, AGAIN, frame period)."""
+        sensor = self.sensor
+        gain, integration_time = self.bracket[index % len(self.bracket)]
+        with sensor.configure():
+            sensor.set_gain(gain)
+            sensor.set_integration_time(integration_time)
+        values = sensor._as7343.values
+        return values['ATIME'], values['ASTEP'], values['CFG1'] & 0b00011111, sensor.get_frame_period()
+
+    def _wait(self, words, timeout, t_start, period, poll=False):
+        """Wait until the FIFO holds at least words entries, due period seconds after t_start, returning the level."""
+        registers = self.sensor._as7343
+
+        def ready():
+            level = registers.get('FIFO_LVL').FIFO_LVL
+            return level if level >= words else 0
+
+        return self.sensor._wait_for(
+            ready,
+            timeout,
+            f"Timeout waiting for {words} entries in FIFO.",
+            _FrameSchedule(t_start, period, words),
+            poll)
+
+    def _start(self, timeout):
+        """Start measuring from the first exposure, with the second already queued."""
+        sensor = self.sensor
+        cycles = sensor._read_cycles
+        sensor.stop_measurement()
+        sensor.clear_fifo()
+        settings = [self._write(0)]
+        sensor._arm_interrupt(False)
+        t_start = time.time()
+        sensor.start_measurement()
+        if cycles > 1:
+            # Settings are picked up as each cycle starts, so hold the second
+            # exposure back until the first frame is on its last cycle
+            self._wait((cycles - 1) * 7, timeout, t_start, settings[0][3] * (cycles - 1) / cycles, poll=True)
+        settings.append(self._write(1))
+        return settings
+
+    def get_data(self, timeout=5.0):
+        """Measure one bracket and return it merged, as an HDRFrame."""
+        stream = self.stream(timeout)
+        try:
+            return next(stream)
+        finally:
+            stream.close()
+
+    def stream(self, timeout=5.0):
+        """Yield an HDRFrame for every bracket.
+
+        Settings are written one frame ahead. The sensor picks them up as
+        each auto SMUX cycle starts, so the exposure after next is written
+        once a frame is in the FIFO and the next one is on its last cycle,
+        and only the whole frame is drained. If a frame turns up with the
+        wrong gain, or frames pile up because they're not read quickly
+        enough, the bracket is started over, up to MAX_RESTARTS times in a
+        row before RuntimeError is raised.
+
+        :param timeout: Time in seconds to wait for each frame
+
+        """
+        sensor = self.sensor
+        count = len(self.bracket)
+        cycles = sensor._read_cycles
+        frame_size = cycles * 7
+        # FIFO entries of the next frame before its last cycle
+        ahead = (cycles - 1) * 7
+        settings = self._start(timeout)
+        t_start = time.time()
+        frames = []
+        saturation = []
+        restarts = 0
+
+        while True:
+            index = len(frames)
+            atime, astep, again, period = settings[0]
+            # Rest of this frame, then the next one up to its last cycle
+            next_period = settings[1][3]
+            level = self._wait(frame_size + ahead, timeout, t_start, (period + next_period * (cycles - 1)) / cycles)
+            t_start = time.time()
+
+            # The next frame is on its last cycle, queue the one after it
+            settings = settings[1:] + [self._write(index + 2)]
+
+            results = sensor.drain_fifo(frame_size)
+            # Every cycle should report this exposure's gain in ASTATUS
+            wrong_gain = any(results[cycle * 7] & 0b00001111 != again for cycle in range(cycles))
+            if wrong_gain or level >= frame_size * 2:
+                # Lost track of which exposure is which
+                self.restarts += 1
+                restarts += 1
+                if restarts > MAX_RESTARTS:
+                    raise RuntimeError(f"HDR bracket restarted {restarts} times in a row, are frames read quickly enough?")
+                settings = self._start(timeout)
+                t_start = time.time()
+                frames = []
+                saturation = []
+                continue
+            restarts = 0
+
+            # Finished before the next frame's cycles so far
+            timestamp = t_start - next_period * (cycles - 1) / cycles
+            frames.append(SpectralFrame.from_results(results, atime, astep, timestamp, cycles))
+            saturation.append(saturated_channels(results, cycles))
+            if len(frames) == count:
+                yield merge(frames, saturation)
+                frames = []
+                saturation = []
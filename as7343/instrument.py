@@ -0,0 +1,258 @@
+"""Opt-in timing and bus instrumentation for the AS7343.
+
+Start it with AS7343.start_instrumentation(). Until then nothing here
+is involved in reading the sensor at all: instrumenting swaps wrappers
+in over the instance's hot path methods and its bus, and stopping
+removes them again.
+"""
+import bisect
+import time
+from collections import namedtuple
+
+# Histogram bucket upper bounds in seconds, 10us doubling up to ~10s
+BUCKETS = tuple(0.00001 * (2 ** n) for n in range(21))
+
+# Phases of reading a frame
+PHASES = ('wait', 'drain', 'decode')
+
+# Timings and bus use for one frame, passed to callbacks
+# wait: time waiting for the sensor (polling or on INT)
+# drain: time reading the FIFO or DATA registers
+# decode: time decoding the results
+# transactions, bytes: I2C use since the previous frame, including polls
+FrameStats = namedtuple('FrameStats', ('timestamp', 'wait', 'drain', 'decode', 'transactions', 'bytes'))
+
+
+class Histogram:
+    """Count observations into fixed buckets.
+
+    :param buckets: Increasing bucket upper bounds, a final +Inf bucket is added
+
+    """
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q):
+        """Estimate a quantile as the upper bound of the bucket it falls in."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        total = 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            if total >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def as_dict(self):
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'mean': self.sum / self.count if self.count else 0.0,
+            'p50': self.quantile(0.5),
+            'p99': self.quantile(0.99),
+            'max': self.max,
+        }
+
+
+class _CountingBus:
+    """Count transactions and bytes on the way through to an SMBus instance."""
+    def __init__(self, i2c_dev):
+        self.i2c_dev = i2c_dev
+        self.transactions = 0
+        self.bytes_read = 0
+        self.bytes_written = 0
+
+    def read_i2c_block_data(self, i2c_address, register, length):
+        self.transactions += 1
+        self.bytes_written += 1
+        self.bytes_read += length
+        return self.i2c_dev.read_i2c_block_data(i2c_address, register, length)
+
+    def write_i2c_block_data(self, i2c_address, register, values):
+        self.transactions += 1
+        self.bytes_written += 1 + len(values)
+        return self.i2c_dev.write_i2c_block_data(i2c_address, register, values)
+
+    def __getattr__(self, name):
+        attr = getattr(self.i2c_dev, name)
+        if name != 'i2c_rdwr':
+            return attr
+
+        def i2c_rdwr(*msgs):
+            self.transactions += 1
+            for msg in msgs:
+                if msg.flags & 0x0001:  # I2C_M_RD
+                    self.bytes_read += msg.len
+                else:
+                    self.bytes_written += msg.len
+            return attr(*msgs)
+
+        return i2c_rdwr
+
+
+class Instrumentation:
+    """Record per-frame phase timings, bus use, timeouts and FIFO overflows.
+
+    :param sensor: The AS7343 to instrument
+    :param callback: Optional callable(FrameStats), called after every frame
+
+    """
+    # AS7343 methods wrapped while instrumenting
+    WRAPPED = ('_wait_for', 'drain_fifo', '_read_data_registers', '_decode', '_decode_frame', '_stream_frames')
+
+    def __init__(self, sensor, callback=None):
+        self.sensor = sensor
+        self.callbacks = [callback] if callback is not None else []
+        self.phases = {phase: Histogram() for phase in PHASES}
+        self.frame_time = Histogram()
+        self.frames = 0
+        self.timeouts = 0
+        self.overflows = 0
+        self._pending = {phase: 0.0 for phase in PHASES}
+        self._last_transactions = 0
+        self._last_bytes = 0
+        self._attach()
+
+    def _attach(self):
+        sensor = self.sensor
+        self.bus = _CountingBus(sensor._as7343._i2c)
+        sensor._as7343._i2c = self.bus
+        for name in self.WRAPPED:
+            setattr(sensor, name, getattr(self, name))
+
+    def close(self):
+        """Stop instrumenting, removing the wrappers from the sensor."""
+        sensor = self.sensor
+        for name in self.WRAPPED:
+            sensor.__dict__.pop(name, None)
+        sensor._as7343._i2c = self.bus.i2c_dev
+
+    # Wrappers, these call the AS7343 class methods directly
+
+    def _timed(self, phase, method, *args):
+        t_start = time.perf_counter()
+        try:
+            return method(self.sensor, *args)
+        finally:
+            self._pending[phase] += time.perf_counter() - t_start
+
+    def _wait_for(self, ready, timeout, message, schedule=None, poll=False):
+        try:
+            return self._timed('wait', type(self.sensor)._wait_for, ready, timeout, message, schedule, poll)
+        except TimeoutError:
+            self.timeouts += 1
+            raise
+
+    def drain_fifo(self, level):
+        return self._timed('drain', type(self.sensor).drain_fifo, level)
+
+    def _read_data_registers(self):
+        return self._timed('drain', type(self.sensor)._read_data_registers)
+
+    def _decode(self, results, timestamp=None):
+        result = self._timed('decode', type(self.sensor)._decode, results, timestamp)
+        self._frame()
+        return result
+
+    def _decode_frame(self, results, timestamp=None):
+        result = self._timed('decode', type(self.sensor)._decode_frame, results, timestamp)
+        self._frame()
+        return result
+
+    def _stream_frames(self, state, level):
+        dropped = state.dropped
+        frames = type(self.sensor)._stream_frames(self.sensor, state, level)
+        if state.dropped > dropped:
+            self.overflows += 1
+        return frames
+
+    def _frame(self):
+        """Close off the timings for a frame."""
+        pending = self._pending
+        for phase in PHASES:
+            self.phases[phase].observe(pending[phase])
+        self.frame_time.observe(pending['wait'] + pending['drain'] + pending['decode'])
+        self.frames += 1
+
+        bus = self.bus
+        total_bytes = bus.bytes_read + bus.bytes_written
+        if self.callbacks:
+            stats = FrameStats(
+                time.time(), pending['wait'], pending['drain'], pending['decode'],
+                bus.transactions - self._last_transactions, total_bytes - self._last_bytes)
+            for callback in self.callbacks:
+                callback(stats)
+        self._last_transactions = bus.transactions
+        self._last_bytes = total_bytes
+        self._pending = {phase: 0.0 for phase in PHASES}
+
+    def stats(self):
+        """Get everything recorded so far as a dict."""
+        bus = self.bus
+        return {
+            'frames': self.frames,
+            'timeouts': self.timeouts,
+            'overflows': self.overflows,
+            'transactions': bus.transactions,
+            'bytes_read': bus.bytes_read,
+            'bytes_written': bus.bytes_written,
+            'frame': self.frame_time.as_dict(),
+            'phases': {phase: histogram.as_dict() for phase, histogram in self.phases.items()},
+        }
+
+    def prometheus(self, prefix="as7343", labels=None):
+        """Render the recorded stats in the Prometheus text exposition format.
+
+        :param prefix: Prefix for metric names
+        :param labels: Optional dict of labels to add to every metric, eg: {'sensor': 'bus1'}
+
+        """
+        labels = labels or {}
+
+        def format_labels(**extra):
+            merged = dict(labels, **extra)
+            if not merged:
+                return ""
+            return "{" + ",".join(f'{key}="{value}"' for key, value in merged.items()) + "}"
+
+        bus = self.bus
+        lines = []
+        for name, kind, help_text, samples in (
+            ('frames_total', 'counter', 'Frames read.', [({}, self.frames)]),
+            ('timeouts_total', 'counter', 'Timeouts waiting for data.', [({}, self.timeouts)]),
+            ('fifo_overflows_total', 'counter', 'FIFO overflows while streaming.', [({}, self.overflows)]),
+            ('i2c_transactions_total', 'counter', 'I2C transactions.', [({}, bus.transactions)]),
+            ('i2c_bytes_total', 'counter', 'I2C bytes transferred, including register addresses.', [
+                ({'direction': 'read'}, bus.bytes_read),
+                ({'direction': 'write'}, bus.bytes_written),
+            ]),
+        ):
+            lines.append(f"# HELP {prefix}_{name} {help_text}")
+            lines.append(f"# TYPE {prefix}_{name} {kind}")
+            for extra, value in samples:
+                lines.append(f"{prefix}_{name}{format_labels(**extra)} {value}")
+
+        name = f"{prefix}_phase_seconds"
+        lines.append(f"# HELP {name} Time spent in each phase of reading a frame.")
+        lines.append(f"# TYPE {name} histogram")
+        for phase, histogram in self.phases.items():
+            total = 0
+            for bound, count in zip(histogram.buckets + (float('inf'),), histogram.counts):
+                total += count
+                le = "+Inf" if bound == float('inf') else repr(bound)
+                lines.append(f"{name}_bucket{format_labels(phase=phase, le=le)} {total}")
+            lines.append(f"{name}_sum{format_labels(phase=phase)} {histogram.sum}")
+            lines.append(f"{name}_count{format_labels(phase=phase)} {histogram.count}")
+        return "\n".join(lines) + "\n"
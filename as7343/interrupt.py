@@ -0,0 +1,67 @@
+"""Interrupt sources for the AS7343 INT pin."""
+import threading
+
+
+class Interrupt:
+    """Base class for something that can wait for the AS7343 INT pin."""
+    def wait(self, timeout):
+        """Wait for an interrupt.
+
+        :param timeout: Time in seconds to wait
+        :returns: True if an interrupt occurred, False on timeout
+
+        """
+        raise NotImplementedError
+
+    def close(self):
+        """Release any resources held by the interrupt source."""
+        pass
+
+
+class GPIOInterrupt(Interrupt):
+    """Wait for a falling edge on a GPIO pin wired to INT.
+
+    Requires the gpiod (v2) Python bindings.
+
+    :param pin: GPIO line offset INT is connected to
+    :param chip: Path to the GPIO chip device
+
+    """
+    def __init__(self, pin, chip="/dev/gpiochip0"):
+        import gpiod
+        from gpiod.line import Bias, Edge
+
+        # INT is open-drain and active low
+        self._request = gpiod.request_lines(chip, consumer="AS7343", config={
+            pin: gpiod.LineSettings(edge_detection=Edge.FALLING, bias=Bias.PULL_UP)
+        })
+
+    def wait(self, timeout):
+        if self._request.wait_edge_events(timeout):
+            self._request.read_edge_events()
+            return True
+        return False
+
+    def close(self):
+        self._request.release()
+
+
+class FakeInterrupt(Interrupt):
+    """Software interrupt source for testing without hardware.
+
+    Call trigger() from another thread to wake a waiting driver.
+
+    """
+    def __init__(self):
+        self._event = threading.Event()
+        self.waits = 0
+
+    def trigger(self):
+        """Fire the interrupt."""
+        self._event.set()
+
+    def wait(self, timeout):
+        self.waits += 1
+        fired = self._event.wait(timeout)
+        self._event.clear()
+        return fired
@@ -0,0 +1,316 @@
+"""Log a stream of AS7343 frames to CSV, NDJSON or recording files.
+
+Writes are buffered, so the logger keeps up with the sensor at high
+frame rates, and files can be rotated by size and/or age. Run it with:
+
+    python -m as7343 --format csv --output spectrum.csv --rotate-size 10
+
+Text formats hold one frame per row/line with raw counts in CHANNELS
+order; the rec format is a Recording (see as7343.recorder).
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from array import array
+
+from . import CHANNELS
+from .recorder import COLUMNS, Recorder
+
+FORMATS = ('csv', 'ndjson', 'rec')
+
+# Size of the write buffer for text formats, in bytes
+BUFFER_SIZE = 64 * 1024
+
+# Bytes per frame in a recording
+RECORD_SIZE = sum(array(typecode).itemsize for _, typecode in COLUMNS)
+
+# Frames in an unrotated recording before it rolls over to a new file
+RECORD_CAPACITY = 1000000
+
+FIELDS = ('timestamp', 'sequence', 'dropped', 'gain', 'atime', 'astep', 'saturated') + CHANNELS
+
+
+class TextWriter:
+    """Write frames as CSV or NDJSON text.
+
+    :param fileobj: A text file, opened with a large buffer
+    :param format: One of 'csv' or 'ndjson'
+
+    """
+    def __init__(self, fileobj, format='csv'):
+        self.fileobj = fileobj
+        self.format = format
+        self.frames = 0
+        self.size = 0
+        if format == 'csv':
+            self._write(",".join(FIELDS) + "\n")
+
+    def _write(self, text):
+        self.fileobj.write(text)
+        self.size += len(text)
+
+    def write(self, frame):
+        """Write a frame.
+
+        :param frame: A StreamFrame holding a SpectralFrame
+
+        """
+        data = frame.data
+        if self.format == 'csv':
+            line = f"{frame.timestamp:.6f},{frame.sequence},{frame.dropped},{data.gain},{data.atime},{data.astep},{int(data.saturated)},"
+            line += ",".join(map(str, data.counts)) + "\n"
+        else:
+            record = {
+                'timestamp': round(frame.timestamp, 6),
+                'sequence': frame.sequence,
+                'dropped': frame.dropped,
+                'gain': data.gain,
+                'atime': data.atime,
+                'astep': data.astep,
+                'saturated': data.saturated,
+            }
+            record.update(zip(CHANNELS, data.counts))
+            line = json.dumps(record, separators=(',', ':')) + "\n"
+        self._write(line)
+        self.frames += 1
+
+    def close(self):
+        if self.fileobj is sys.stdout:
+            self.fileobj.flush()
+        else:
+            self.fileobj.close()
+
+
+class RecordWriter:
+    """Write frames to a Recording.
+
+    :param path: Recording file to create
+    :param capacity: Maximum number of frames in the file
+
+    """
+    def __init__(self, path, capacity):
+        self.recorder = Recorder(path, capacity)
+        self.capacity = capacity
+
+    @property
+    def frames(self):
+        return len(self.recorder)
+
+    @property
+    def size(self):
+        return self.frames * RECORD_SIZE
+
+    def write(self, frame):
+        self.recorder.append(frame)
+
+    def close(self):
+        self.recorder.close()
+
+
+def _free_index(stem, ext):
+    """Get the number after the highest numbered file for stem and ext, eg: 3 if spectrum-0002.csv exists."""
+    directory, name = os.path.split(stem)
+    pattern = re.compile(re.escape(name) + r"-(\d{4,})" + re.escape(ext) + "$")
+    highest = 0
+    for entry in os.listdir(directory or "."):
+        match = pattern.match(entry)
+        if match:
+            highest = max(highest, int(match.group(1)))
+    return highest + 1
+
+
+class RotatingLog:
+    """Write frames to a series of files, starting a new one by size or age.
+
+    Without rotation frames go to path itself, replacing any file that is
+    there, otherwise to numbered files alongside it, eg: spectrum-0001.csv,
+    spectrum-0002.csv ... numbered on from any left by an earlier run, so
+    they are never overwritten. An unrotated recording that fills up rolls
+    over to numbered files in the same way.
+
+    :param path: Output file, or "-" for stdout (text formats only)
+    :param format: One of FORMATS
+    :param max_bytes: Start a new file once one reaches this size, or None
+    :param max_seconds: Start a new file once one is this old, or None
+    :param buffer_size: Write buffer size in bytes, for text formats
+
+    """
+    def __init__(self, path, format='csv', max_bytes=None, max_seconds=None, buffer_size=BUFFER_SIZE):
+        if format not in FORMATS:
+            raise ValueError(f"Invalid format, expected one of {', '.join(FORMATS)}.")
+        if path == "-" and (format == 'rec' or max_bytes or max_seconds):
+            raise ValueError("Only unrotated text formats can be written to stdout.")
+        self.path = path
+        self.format = format
+        self.max_bytes = max_bytes
+        self.max_seconds = max_seconds
+        self.buffer_size = buffer_size
+        self.paths = []
+        self._index = None
+        self._writer = None
+        self._t_opened = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _next_path(self):
+        if not (self.paths or self.max_bytes or self.max_seconds):
+            return self.path
+        stem, ext = os.path.splitext(self.path)
+        if self._index is None:
+            self._index = _free_index(stem, ext)
+        path = f"{stem}-{self._index:04d}{ext}"
+        self._index += 1
+        return path
+
+    def _open(self, t_now):
+        path = self._next_path()
+        if self.format == 'rec':
+            # Recordings are preallocated, so size them to the rotation size
+            capacity = max(1, self.max_bytes // RECORD_SIZE) if self.max_bytes else RECORD_CAPACITY
+            if os.path.exists(path):
+                # Recorder appends to an existing recording, start afresh like the text formats
+                os.remove(path)
+            self._writer = RecordWriter(path, capacity)
+        elif path == "-":
+            self._writer = TextWriter(sys.stdout, self.format)
+        else:
+            self._writer = TextWriter(open(path, "w", buffering=self.buffer_size, newline=""), self.format)
+        self.paths.append(path)
+        self._t_opened = t_now
+
+    def _due(self, t_now):
+        writer = self._writer
+        if writer is None:
+            return True
+        if self.max_bytes and writer.size >= self.max_bytes:
+            return True
+        if self.max_seconds and t_now - self._t_opened >= self.max_seconds:
+            return True
+        return isinstance(writer, RecordWriter) and writer.frames >= writer.capacity
+
+    def write(self, frame):
+        """Write a StreamFrame, rotating first if the current file is due."""
+        t_now = frame.timestamp
+        if self._due(t_now):
+            self.close()
+            self._open(t_now)
+        self._writer.write(frame)
+
+    def close(self):
+        """Flush and close the current file."""
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+
+class Summary:
+    """Count frames, drops and saturation for a frames per second summary."""
+    def __init__(self, t_start=None):
+        self.t_start = time.time() if t_start is None else t_start
+        self.frames = 0
+        self.dropped = 0
+        self.saturated = 0
+        self._t_last = self.t_start
+        self._frames_last = 0
+
+    def update(self, frame):
+        self.frames += 1
+        self.dropped += frame.dropped
+        self.saturated += frame.data.saturated
+
+    def report(self, t_now=None, total=False):
+        """Get a one line summary, since the last report or, with total, since the start."""
+        t_now = time.time() if t_now is None else t_now
+        t_since, frames_since = (self.t_start, 0) if total else (self._t_last, self._frames_last)
+        elapsed = max(t_now - t_since, 1e-9)
+        fps = (self.frames - frames_since) / elapsed
+        self._t_last = t_now
+        self._frames_last = self.frames
+        return f"{self.frames} frames in {t_now - self.t_start:.1f}s, {fps:.1f} fps, {self.dropped} dropped, {self.saturated} saturated"
+
+
+def add_sensor_arguments(parser):
+    """Add the sensor settings options to an ArgumentParser, see configure_sensor()."""
+    parser.add_argument("--gain", type=float, default=1024, help="gain multiplier, 0.5 to 2048 (default: %(default)s)")
+    parser.add_argument("--integration-time", type=float, default=27800, help="integration time in us (default: %(default)s)")
+    parser.add_argument("--measurement-time", type=float, default=500, help="time between measurements in ms (default: %(default)s)")
+    parser.add_argument("--channels", type=int, choices=(6, 12, 18), default=18, help="channel count (default: %(default)s)")
+    parser.add_argument("--led", action="store_true", help="turn the illumination LED on")
+    parser.add_argument("--led-current", type=int, default=4, help="illumination LED current in mA (default: %(default)s)")
+
+
+def configure_sensor(sensor, args):
+    """Apply the sensor settings options to an AS7343."""
+    with sensor.configure():
+        sensor.set_gain(args.gain)
+        sensor.set_integration_time(args.integration_time)
+        sensor.set_measurement_time(args.measurement_time)
+        sensor.set_channels(args.channels)
+        sensor.set_illumination_led_current(args.led_current)
+        sensor.set_illumination_led(args.led)
+
+
+def parse_args(args=None):
+    parser = argparse.ArgumentParser(prog="python -m as7343", description="Log AS7343 spectral frames.")
+    add_sensor_arguments(parser)
+    parser.add_argument("--format", choices=FORMATS, default="csv", help="output format (default: %(default)s)")
+    parser.add_argument("--output", default="-", help="output file, or - for stdout (default: %(default)s)")
+    parser.add_argument("--rotate-size", type=float, help="start a new file every this many MB")
+    parser.add_argument("--rotate-time", type=float, help="start a new file every this many seconds")
+    parser.add_argument("--buffer-size", type=int, default=BUFFER_SIZE, help="write buffer in bytes (default: %(default)s)")
+    parser.add_argument("--frames", type=int, help="stop after this many frames")
+    parser.add_argument("--duration", type=float, help="stop after this many seconds")
+    parser.add_argument("--summary-interval", type=float, default=10.0, help="seconds between summaries on stderr, 0 for none (default: %(default)s)")
+    return parser.parse_args(args)
+
+
+def main(args=None, sensor=None):
+    """Run the logger.
+
+    :param args: Command line arguments, by default from sys.argv
+    :param sensor: AS7343 instance to use, by default one on the default i2c bus
+
+    """
+    args = parse_args(args)
+    if sensor is None:
+        from . import AS7343
+        sensor = AS7343()
+
+    configure_sensor(sensor, args)
+
+    max_bytes = int(args.rotate_size * 1024 * 1024) if args.rotate_size else None
+    summary = Summary()
+    t_report = summary.t_start
+
+    with RotatingLog(args.output, args.format, max_bytes, args.rotate_time, args.buffer_size) as log:
+        try:
+            for frame in sensor.stream(frame=True):
+                log.write(frame)
+                summary.update(frame)
+                t_now = time.time()
+                if args.summary_interval and t_now - t_report >= args.summary_interval:
+                    print(summary.report(t_now), file=sys.stderr)
+                    t_report = t_now
+                if args.frames is not None and summary.frames >= args.frames:
+                    break
+                if args.duration is not None and t_now - summary.t_start >= args.duration:
+                    break
+        except KeyboardInterrupt:
+            pass
+        finally:
+            sensor.stop_measurement()
+            sensor.set_illumination_led(False)
+
+    print(summary.report(total=True), file=sys.stderr)
+    return summary
+
+
+if __name__ == "__main__":
+    main()
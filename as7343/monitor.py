@@ -0,0 +1,233 @@
+"""Watch for light level changes with the AS7343 spectral thresholds.
+
+The sensor compares one channel against a low/high window after every
+measurement, and only raises a spectral interrupt once the channel has
+been outside the window for a number of measurements in a row. With
+sleep after interrupt it then stops measuring until the host has dealt
+with the crossing, and in between the host does nothing but wait on INT
+(or an occasional STATUS poll without an interrupt pin).
+"""
+import struct
+import time
+from collections import namedtuple
+
+from . import ADC_MAX, CYCLE_CHANNELS, POLL_INTERVAL
+
+# Channels that can be watched, the ADC channels of the first auto SMUX cycle
+THRESHOLD_CHANNELS = tuple(channel for channel in CYCLE_CHANNELS[0] if channel is not None)
+
+# Consecutive measurements outside the window for each PERS.APERS value
+PERSISTENCE = (0, 1, 2, 3) + tuple(5 * n for n in range(1, 13))
+
+# Longest WTIME without CFG0.WLONG, in ms
+WTIME_MAX = 711.68
+
+# A threshold crossing
+# above, below: which side of the window the channel crossed
+# value: raw counts of the channel when the crossing was read
+# low, high: the window that was crossed
+Crossing = namedtuple('Crossing', ('timestamp', 'channel', 'value', 'gain', 'above', 'below', 'low', 'high'))
+
+# Registers changed by monitoring, restored by stop()
+SAVED_REGISTERS = ('CFG0', 'CFG3', 'CFG8', 'CFG12', 'CFG20', 'INTERNAB', 'PERS', 'WTIME')
+
+
+def persistence_code(count):
+    """Get the PERS.APERS value for the smallest persistence of at least count measurements."""
+    for code, cycles in enumerate(PERSISTENCE):
+        if cycles >= count:
+            return code
+    raise ValueError(f"Persistence out of range, expected up to {PERSISTENCE[-1]}.")
+
+
+class ThresholdMonitor:
+    """Wake only when a channel leaves a window of light levels.
+
+    Monitoring runs the sensor in 6 channel mode, so the watched channel
+    is measured every cycle. The sensor's previous settings are restored by stop().
+
+    :param sensor: An AS7343 instance, with an interrupt source set to wait on INT rather than polling
+    :param channel: Channel to watch, one of THRESHOLD_CHANNELS
+    :param low: Low threshold in raw counts
+    :param high: High threshold in raw counts
+    :param persistence: Measurements in a row outside the window before a crossing, up to 60
+    :param interval: Time between measurements in ms, up to 16x WTIME_MAX, or None to leave it as set
+    :param sleep_after_interrupt: Stop measuring after a crossing until it has been read
+    :param low_power: Let the sensor idle in low power mode between measurements
+
+    """
+    def __init__(self, sensor, channel='VIS', low=0, high=ADC_MAX, persistence=1, interval=None,
+                 sleep_after_interrupt=True, low_power=True):
+        if channel not in THRESHOLD_CHANNELS:
+            raise ValueError(f"Invalid channel, expected one of {', '.join(THRESHOLD_CHANNELS)}.")
+        if interval is not None and interval > WTIME_MAX * 16:
+            raise ValueError("Interval out of range.")
+        self.sensor = sensor
+        self.channel = channel
+        self.low = low
+        self.high = high
+        self.persistence = persistence_code(persistence)
+        self.interval = interval
+        self.sleep_after_interrupt = sleep_after_interrupt
+        self.low_power = low_power
+        self.active = False
+        self._saved = None
+        self._restart = False
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def start(self):
+        """Configure the thresholds and start measuring."""
+        sensor = self.sensor
+        registers = sensor._as7343
+        self._restart = sensor.running
+        sensor.stop_measurement()
+
+        self._saved = {name: registers.read_register(name) for name in SAVED_REGISTERS}
+        self._channel_count = sensor._channel_count
+
+        with sensor.configure():
+            sensor.set_channels(6)
+            registers.set('CFG12', SP_TH_CH=THRESHOLD_CHANNELS.index(self.channel))
+            registers.set('PERS', APERS=self.persistence)
+            registers.set('CFG3', SAI=self.sleep_after_interrupt)
+            registers.set('INTERNAB', SP_IEN=True, FIEN=False)
+            if self.interval is not None:
+                wlong = self.interval > WTIME_MAX
+                registers.set('CFG0', LOW_POWER=self.low_power, WLONG=wlong)
+                registers.set('WTIME', WTIME=self.interval / 16 if wlong else self.interval)
+            else:
+                registers.set('CFG0', LOW_POWER=self.low_power)
+        self.set_window(self.low, self.high)
+
+        # The read modes arm their own interrupt next time they're used
+        sensor._interrupt_direct = None
+        self._clear()
+        self.active = True
+        sensor.start_measurement()
+
+    def stop(self):
+        """Stop monitoring and put the sensor's settings back."""
+        if not self.active:
+            return
+        sensor = self.sensor
+        registers = sensor._as7343
+        sensor.stop_measurement()
+        with sensor.configure():
+            for name, value in self._saved.items():
+                registers.values[name] = value
+                registers.write_register(name)
+        sensor._channel_count = self._channel_count
+        sensor._read_cycles = self._channel_count // 6
+        sensor._interrupt_direct = None
+        self._clear()
+        sensor.clear_fifo()
+        self.active = False
+        if self._restart:
+            sensor.start_measurement()
+
+    def set_window(self, low, high):
+        """Set the window, in raw counts, the channel must stay inside.
+
+        :param low: Low threshold, crossings are reported below it
+        :param high: High threshold, crossings are reported above it
+
+        """
+        low = int(max(0, min(low, ADC_MAX)))
+        high = int(max(0, min(high, ADC_MAX)))
+        if low > high:
+            raise ValueError("Low threshold must not be above the high threshold.")
+        self.low = low
+        self.high = high
+        self.sensor._as7343.set('SP_TH', SP_TH_L=low, SP_TH_H=high)
+
+    def _clear(self):
+        """Clear the spectral interrupt and wake the sensor if it's sleeping after it."""
+        registers = self.sensor._as7343
+        # STATUS bits are cleared by writing 1, so skip the read-modify-write
+        registers.values['STATUS'] = 0b00001000
+        registers.write_register('STATUS')
+        if self.sleep_after_interrupt:
+            registers.values['CONTROL'] = 0b00000001  # CLEAR_SAI_ACT
+            registers.write_register('CONTROL')
+
+    def _crossed(self):
+        return self.sensor._as7343.get('STATUS').AINT
+
+    def wait(self, timeout=None):
+        """Wait for the channel to cross the window.
+
+        :param timeout: Time in seconds to wait, or None to wait forever
+        :returns: A Crossing, or None on timeout
+
+        """
+        sensor = self.sensor
+        interrupt = sensor._interrupt
+        # Without INT there's no point polling faster than the sensor measures
+        poll_interval = max(POLL_INTERVAL, sensor.get_frame_period())
+        t_start = time.time()
+        while not self._crossed():
+            remaining = None if timeout is None else timeout - (time.time() - t_start)
+            if remaining is not None and remaining <= 0:
+                return None
+            if interrupt is not None:
+                interrupt.wait(poll_interval * 10 if remaining is None else min(remaining, poll_interval * 10))
+            else:
+                time.sleep(poll_interval if remaining is None else min(remaining, poll_interval))
+        return self._read_crossing()
+
+    def _read_crossing(self):
+        registers = self.sensor._as7343
+        status3 = registers.get('STATUS3')
+        # ASTATUS latches DATA, read it along with the data up to the watched channel
+        index = THRESHOLD_CHANNELS.index(self.channel)
+        data = self.sensor._read_block(registers.registers['ASTATUS'].address, 1 + (index + 1) * 2)
+        again = data[0] & 0b00001111
+        value, = struct.unpack_from('<H', data, 1 + index * 2)
+        return Crossing(
+            time.time(), self.channel, value, 1 << (again - 1) if again else 0.5,
+            bool(status3.INT_SP_H), bool(status3.INT_SP_L), self.low, self.high)
+
+    def events(self, timeout=None):
+        """Yield crossings as they happen, leaving the window as it is.
+
+        :param timeout: Time in seconds to wait for each crossing, or None to wait forever
+
+        """
+        while True:
+            crossing = self.wait(timeout)
+            if crossing is None:
+                return
+            self._clear()
+            yield crossing
+
+    def run(self, callback, margin=None, timeout=None):
+        """Call callback(crossing) for every crossing, re-arming the window after each one.
+
+        The callback can return a new (low, high) window, or False to stop.
+        Otherwise, with margin set, the window is re-centred on the new
+        level, eg: margin=0.1 watches for the next change of 10% either way.
+
+        :param callback: Callable taking a Crossing
+        :param margin: Fraction of the new level to re-centre the window by, or None to keep it
+        :param timeout: Stop after this many seconds without a crossing, or None to run forever
+
+        """
+        with self:
+            while True:
+                crossing = self.wait(timeout)
+                if crossing is None:
+                    return
+                result = callback(crossing)
+                if result is False:
+                    return
+                if result is not None:
+                    self.set_window(*result)
+                elif margin is not None:
+                    self.set_window(crossing.value * (1.0 - margin), crossing.value * (1.0 + margin) + 1)
+                self._clear()
@@ -0,0 +1,109 @@
+"""Named measurement profiles, compiled to register values once.
+
+Switching between setups with set_gain(), set_integration_time() and
+friends costs a read-modify-write per setting. A Profile works out the
+register bits for all of its settings up front, so applying it only
+merges them into the shadow registers and writes whatever changed in as
+few block writes as possible:
+
+    bright = Profile("bright", gain=4, integration_time=10000)
+    dim = Profile("dim", gain=512, integration_time=100000)
+
+    bright.apply(as7343)
+"""
+from . import FIFO_THRESHOLD, REGISTERS, solve_integration_time
+
+_REGISTERS = {register.name: register for register in REGISTERS}
+
+
+def _bits(register, raw=False, **fields):
+    """Get (mask, bits) for fields of a register, encoding values with the field adapters unless raw."""
+    register = _REGISTERS[register]
+    mask = bits = 0
+    for name, value in fields.items():
+        field = register.fields[name]
+        if field.adapter is not None and not raw:
+            value = field.adapter._encode(value)
+        shift = (field.mask & -field.mask).bit_length() - 1
+        mask |= field.mask
+        bits |= (value << shift) & field.mask
+    return mask, bits
+
+
+class Profile:
+    """A named set of measurement settings.
+
+    :param name: Name of the profile, eg: "bright"
+    :param gain: Gain multiplier, one of 0.5, 1, 2, 4 ... 2048x
+    :param integration_time: Integration time in microseconds
+    :param measurement_time: Measurement (wait) time in milliseconds
+    :param channels: Channel count, one of 6, 12 or 18
+    :param led: True to turn the illumination LED on
+    :param led_current: Illumination LED current in milliamps
+
+    """
+    def __init__(self, name, gain=1024, integration_time=27800, measurement_time=500, channels=6, led=False, led_current=4):
+        if channels not in (6, 12, 18):
+            raise ValueError("Invalid channel count. Expected 6, 12 or 18.")
+        if led_current > 16:  # Same limit as set_illumination_led_current()
+            raise RuntimeError("Please don't melt the lEDs...")
+        self.name = name
+        self.gain = gain
+        self.integration_time = integration_time
+        self.measurement_time = measurement_time
+        self.channels = channels
+        self.led = led
+        self.led_current = led_current
+        self.atime, self.astep = solve_integration_time(integration_time)
+
+        # (mask, bits) for each register the profile sets
+        self.registers = {
+            'CFG1': _bits('CFG1', AGAIN=gain),
+            'ATIME': _bits('ATIME', ATIME=self.atime),
+            'ASTEP': _bits('ASTEP', raw=True, ASTEP=self.astep),
+            'WTIME': _bits('WTIME', WTIME=measurement_time),
+            'CFG20': _bits('CFG20', auto_SMUX=channels),
+            'CFG8': _bits('CFG8', FIFO_TH=FIFO_THRESHOLD[channels]),
+            'LED': _bits('LED', LED_ACT=led, LED_DRIVE=led_current),
+        }
+
+    def __repr__(self):
+        return f"Profile({self.name!r})"
+
+    def apply(self, sensor):
+        """Apply the profile to a sensor.
+
+        Only registers that change are written. Measurements are stopped
+        and restarted, with the FIFO cleared, only if the channel count
+        changes, otherwise new settings take effect from the next cycle.
+
+        :param sensor: An AS7343 instance
+        :returns: True if anything changed
+
+        """
+        registers = sensor._as7343
+        changed = {}
+        for name, (mask, bits) in self.registers.items():
+            # Shadowed, so this doesn't touch the bus
+            current = registers.read_register(name)
+            value = (current & ~mask) | bits
+            if value != current:
+                changed[name] = value
+        if not changed:
+            return False
+
+        restart = sensor.running and 'CFG20' in changed
+        if restart:
+            sensor.stop_measurement()
+
+        with sensor.configure():
+            for name, value in changed.items():
+                registers.values[name] = value
+                registers.write_register(name)
+        sensor._channel_count = self.channels
+        sensor._read_cycles = self.channels // 6
+
+        if restart:
+            sensor.clear_fifo()
+            sensor.start_measurement()
+        return True
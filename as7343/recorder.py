@@ -0,0 +1,305 @@
+"""Record AS7343 frames to a memory-mapped columnar file and play them back.
+
+The file is a fixed size, preallocated when it is created:
+
+    header   64 bytes, see HEADER
+    columns  one after the other, each `capacity` entries long:
+             timestamp (float64), one uint16 column per channel in
+             CHANNELS order, astep (uint16), astatus (uint8), atime (uint8)
+
+Columns are stored in native (little-endian on a Pi) byte order so they
+can be used in place, without any parsing or copying. Gain and saturation
+are kept in the ASTATUS column.
+"""
+import bisect
+import mmap
+import os
+import struct
+import time
+from array import array
+
+from . import CHANNELS, SpectralFrame, StreamFrame, decode_results
+
+MAGIC = b"AS7343R\x00"
+VERSION = 1
+
+# magic, version, channel count, (reserved), capacity, count
+HEADER = struct.Struct("<8sHHIQQ")
+HEADER_SIZE = 64
+
+# Byte offset of the frame count in the header
+COUNT_OFFSET = 24
+
+# Column names and array typecodes, in file order (widest first to keep alignment)
+COLUMNS = (('timestamp', 'd'),) + tuple((channel, 'H') for channel in CHANNELS) + (
+    ('astep', 'H'),
+    ('astatus', 'B'),
+    ('atime', 'B'),
+)
+
+
+def _layout(capacity):
+    """Get the byte offset of each column and the total file size."""
+    offsets = {}
+    offset = HEADER_SIZE
+    for name, typecode in COLUMNS:
+        offsets[name] = offset
+        offset += array(typecode).itemsize * capacity
+    return offsets, offset
+
+
+class _Columns:
+    """Shared memory-mapped column access for Recorder and Recording."""
+    def _map(self, fileobj, access):
+        self._mmap = mmap.mmap(fileobj.fileno(), 0, access=access)
+        magic, version, channels, _, capacity, _ = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC or version != VERSION:
+            self._mmap.close()
+            raise ValueError("Not an AS7343 recording.")
+        if channels != len(CHANNELS):
+            self._mmap.close()
+            raise ValueError(f"Recording has {channels} channels, expected {len(CHANNELS)}.")
+
+        self.capacity = capacity
+        offsets, size = _layout(capacity)
+        view = memoryview(self._mmap)
+        self._columns = {}
+        for name, typecode in COLUMNS:
+            length = array(typecode).itemsize * capacity
+            self._columns[name] = view[offsets[name]:offsets[name] + length].cast(typecode)
+        self._count = view[COUNT_OFFSET:COUNT_OFFSET + 8].cast('Q')
+
+    def __len__(self):
+        return self._count[0]
+
+    def _release(self):
+        for column in self._columns.values():
+            column.release()
+        self._columns = {}
+        self._count.release()
+        self._mmap.close()
+
+
+class Recorder(_Columns):
+    """Append frames to a preallocated memory-mapped recording.
+
+    :param path: File to create, an existing recording is appended to
+    :param capacity: Maximum number of frames, used when creating the file
+
+    """
+    def __init__(self, path, capacity=1000000):
+        if not os.path.exists(path):
+            _, size = _layout(capacity)
+            with open(path, "wb") as f:
+                f.truncate(size)
+                f.write(HEADER.pack(MAGIC, VERSION, len(CHANNELS), 0, capacity, 0))
+
+        self._file = open(path, "r+b")
+        try:
+            self._map(self._file, mmap.ACCESS_WRITE)
+        except ValueError:
+            self._file.close()
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def append(self, frame):
+        """Append a frame.
+
+        :param frame: A SpectralFrame, or a StreamFrame holding one
+
+        """
+        if isinstance(frame, StreamFrame):
+            frame = frame.data
+        index = self._count[0]
+        if index >= self.capacity:
+            raise IndexError("Recording is full.")
+
+        columns = self._columns
+        columns['timestamp'][index] = frame.timestamp
+        for channel, value in zip(CHANNELS, frame.counts):
+            columns[channel][index] = value
+        columns['astep'][index] = frame.astep
+        columns['astatus'][index] = frame.astatus
+        columns['atime'][index] = frame.atime
+
+        # Publish the frame only once it has been written
+        self._count[0] = index + 1
+
+    def flush(self):
+        """Flush written frames to disk."""
+        self._mmap.flush()
+
+    def close(self):
+        """Flush and close the recording."""
+        self.flush()
+        self._release()
+        self._file.close()
+
+
+class Recording(_Columns):
+    """Read a recording without copying it into memory.
+
+    Columns are memoryviews straight onto the file, trimmed to the
+    number of frames written so far.
+
+    :param path: Recording file to open
+
+    """
+    def __init__(self, path):
+        self._file = open(path, "rb")
+        try:
+            self._map(self._file, mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """Close the recording."""
+        self._release()
+        self._file.close()
+
+    def column(self, name):
+        """Get a zero-copy memoryview of a column.
+
+        :param name: A channel from CHANNELS, or one of timestamp, astep, astatus, atime
+
+        """
+        return self._columns[name][:len(self)]
+
+    def channel(self, channel):
+        """Get a zero-copy memoryview of the raw counts for one channel."""
+        return self.column(channel)
+
+    @property
+    def timestamps(self):
+        return self.column('timestamp')
+
+    def numpy(self, name):
+        """Get a zero-copy NumPy view of a column. Requires numpy."""
+        import numpy
+        return numpy.frombuffer(self.column(name), dtype=numpy.dtype(self._columns[name].format))
+
+    def time_slice(self, t_start=None, t_end=None):
+        """Get the slice of frames recorded from t_start up to (not including) t_end.
+
+        Timestamps must be increasing, as they are when recording a stream.
+
+        :param t_start: Start time, or None for the first frame
+        :param t_end: End time, or None for the last frame
+
+        """
+        timestamps = self.timestamps
+        start = 0 if t_start is None else bisect.bisect_left(timestamps, t_start)
+        stop = len(timestamps) if t_end is None else bisect.bisect_left(timestamps, t_end)
+        return slice(start, stop)
+
+    def frame(self, index, cycles=3):
+        """Get a single frame as a SpectralFrame.
+
+        :param index: Frame number
+        :param cycles: Auto SMUX cycles to report for the frame
+
+        """
+        columns = self._columns
+        if not 0 <= index < len(self):
+            raise IndexError("Frame index out of range.")
+        counts = array('H', [columns[channel][index] for channel in CHANNELS])
+        return SpectralFrame(
+            counts,
+            columns['astatus'][index],
+            columns['atime'][index],
+            columns['astep'][index],
+            columns['timestamp'][index],
+            cycles)
+
+
+class ReplaySource:
+    """Play back a recording through the same API as a live AS7343.
+
+    Configuration methods are accepted and ignored.
+
+    :param recording: A Recording, or the path to one
+    :param channels: Channel count (6, 12 or 18) to decode frames as
+    :param realtime: Wait between frames to match the recorded timing
+
+    """
+    # AS7343 methods that have no effect on a replay
+    IGNORED = (
+        'set_gain',
+        'set_integration_time',
+        'set_measurement_time',
+        'set_illumination_led',
+        'set_illumination_led_current',
+        'start_measurement',
+        'stop_measurement',
+        'clear_fifo',
+    )
+
+    def __init__(self, recording, channels=18, realtime=False):
+        if not isinstance(recording, Recording):
+            recording = Recording(recording)
+        self.recording = recording
+        self.realtime = realtime
+        self.position = 0
+        self._t_offset = None
+        self.set_channels(channels)
+
+    def __getattr__(self, name):
+        if name in self.IGNORED:
+            return lambda *args, **kwargs: None
+        raise AttributeError(name)
+
+    def set_channels(self, channel_count):
+        if channel_count not in (6, 12, 18):
+            raise ValueError("Invalid channel count. Expected 6, 12 or 18.")
+        self._read_cycles = int(channel_count / 6)
+
+    def get_frame_period(self):
+        """Get the mean time between recorded frames, in seconds."""
+        timestamps = self.recording.timestamps
+        if len(timestamps) < 2:
+            return 0.0
+        return (timestamps[-1] - timestamps[0]) / (len(timestamps) - 1)
+
+    def _next_frame(self):
+        if self.position >= len(self.recording):
+            raise EOFError("End of recording.")
+        frame = self.recording.frame(self.position, self._read_cycles)
+        self.position += 1
+
+        if self.realtime:
+            if self._t_offset is None:
+                self._t_offset = time.time() - frame.timestamp
+            delay = frame.timestamp + self._t_offset - time.time()
+            if delay > 0:
+                time.sleep(delay)
+        return frame
+
+    def read_fifo(self, timeout=5.0):
+        yield from self._next_frame().to_results()
+
+    def get_data(self, timeout=5.0, direct=False, frame=False):
+        """Get the next recorded frame, see AS7343.get_data()."""
+        spectral_frame = self._next_frame()
+        if frame:
+            return spectral_frame
+        return decode_results(spectral_frame.to_results(), self._read_cycles)
+
+    def stream(self, timeout=5.0, frame=False):
+        """Yield the remaining recorded frames as StreamFrames."""
+        while self.position < len(self.recording):
+            sequence = self.position
+            spectral_frame = self._next_frame()
+            data = spectral_frame if frame else decode_results(spectral_frame.to_results(), self._read_cycles)
+            yield StreamFrame(sequence, spectral_frame.timestamp, 0, data)
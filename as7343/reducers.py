@@ -0,0 +1,264 @@
+"""Streaming statistics over AS7343 frames, in bounded memory.
+
+Reducers take one frame at a time and keep only what they need: a
+running mean and variance (Welford), an exponential moving average, or
+the median, minimum and maximum over a fixed window of frames held in a
+ring buffer. A Stage feeds frames from a stream through any number of
+reducers, drops saturated frames, and yields results every N frames:
+
+    stage = Stage({'mean': Mean(), 'median': RollingWindow(9)}, decimate=10)
+    for result in stage.run(as7343.stream(frame=True)):
+        print(result.values['median'])
+
+Every reducer works per channel, in CHANNELS order, with zero for any
+channel not read in 6 or 12 channel modes, the same as SpectralFrame.
+"""
+import bisect
+import math
+from array import array
+from collections import namedtuple
+
+from . import ADC_MAX, CHANNELS, StreamFrame
+
+# RollingWindow property for each statistic it can give as its value
+STATISTICS = {'median': 'median', 'min': 'minimum', 'max': 'maximum'}
+
+# Output of a Stage
+# timestamp: time of the last frame in this output
+# count: frames used since the last output
+# rejected: saturated frames dropped since the last output
+# values: dict of reducer name to array('d') of values in CHANNELS order
+Reduced = namedtuple('Reduced', ('timestamp', 'count', 'rejected', 'values'))
+
+
+def frame_values(frame, normalise=False):
+    """Get the counts of a SpectralFrame as an array('d').
+
+    :param frame: A SpectralFrame
+    :param normalise: Divide by gain and integration steps, for counts per step at 1x gain
+
+    """
+    values = array('d', frame.counts)
+    if normalise:
+        factor = 1.0 / (frame.gain * (frame.atime + 1) * (frame.astep + 1))
+        values = array('d', [value * factor for value in values])
+    return values
+
+
+def is_saturated(frame):
+    """Check a SpectralFrame for analog or digital saturation.
+
+    ASTATUS reports analog saturation from any cycle, and a channel at
+    ADC full scale, or at the full scale of its integration time, has
+    saturated digitally.
+
+    """
+    if frame.saturated:
+        return True
+    full_scale = min((frame.atime + 1) * (frame.astep + 1), ADC_MAX)
+    return max(frame.counts) >= full_scale
+
+
+class Mean:
+    """Running mean and variance of each channel, with Welford's algorithm."""
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+        self._mean = array('d', [0.0] * len(CHANNELS))
+        self._m2 = array('d', [0.0] * len(CHANNELS))
+
+    def update(self, values):
+        self.count += 1
+        mean = self._mean
+        m2 = self._m2
+        for channel, value in enumerate(values):
+            delta = value - mean[channel]
+            mean[channel] += delta / self.count
+            m2[channel] += delta * (value - mean[channel])
+
+    @property
+    def value(self):
+        """Mean of each channel, NaN before the first frame."""
+        if self.count == 0:
+            return array('d', [math.nan] * len(CHANNELS))
+        return array('d', self._mean)
+
+    @property
+    def variance(self):
+        """Sample variance of each channel, NaN before the second frame."""
+        if self.count < 2:
+            return array('d', [math.nan] * len(CHANNELS))
+        return array('d', [m2 / (self.count - 1) for m2 in self._m2])
+
+    @property
+    def std(self):
+        """Sample standard deviation of each channel."""
+        return array('d', map(math.sqrt, self.variance))
+
+
+class EMA:
+    """Exponential moving average of each channel.
+
+    :param alpha: Weight of each new frame, between 0 and 1, smaller is smoother
+
+    """
+    def __init__(self, alpha=0.1):
+        if not 0 < alpha <= 1:
+            raise ValueError("Alpha must be between 0 and 1.")
+        self.alpha = alpha
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+        self._value = array('d', [0.0] * len(CHANNELS))
+
+    def update(self, values):
+        if self.count == 0:
+            # Start from the first frame rather than pulling up from zero
+            self._value = array('d', values)
+        else:
+            alpha = self.alpha
+            ema = self._value
+            for channel, value in enumerate(values):
+                ema[channel] += alpha * (value - ema[channel])
+        self.count += 1
+
+    @property
+    def value(self):
+        """Average of each channel, NaN before the first frame."""
+        if self.count == 0:
+            return array('d', [math.nan] * len(CHANNELS))
+        return array('d', self._value)
+
+
+class RollingWindow:
+    """Median, minimum and maximum of each channel over the last few frames.
+
+    The window is a ring buffer of frames, with a sorted copy of each
+    channel's values kept up to date as frames come and go.
+
+    :param window: Number of frames in the window
+    :param statistic: Statistic given by value, one of 'median', 'min' or 'max'
+
+    """
+    def __init__(self, window=5, statistic='median'):
+        if window < 1:
+            raise ValueError("Window must be at least one frame.")
+        if statistic not in STATISTICS:
+            raise ValueError("Invalid statistic, expected median, min or max.")
+        self.window = window
+        self.statistic = statistic
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+        self._ring = array('d', [0.0] * (self.window * len(CHANNELS)))
+        self._sorted = [[] for _ in CHANNELS]
+
+    def update(self, values):
+        channels = len(CHANNELS)
+        offset = (self.count % self.window) * channels
+        full = self.count >= self.window
+        for channel, value in enumerate(values):
+            ordered = self._sorted[channel]
+            if full:
+                # Drop the value this one replaces in the ring
+                del ordered[bisect.bisect_left(ordered, self._ring[offset + channel])]
+            bisect.insort(ordered, value)
+            self._ring[offset + channel] = value
+        self.count += 1
+
+    def _pick(self, pick):
+        if self.count == 0:
+            return array('d', [math.nan] * len(CHANNELS))
+        return array('d', map(pick, self._sorted))
+
+    @property
+    def median(self):
+        def median(ordered):
+            middle = len(ordered) // 2
+            if len(ordered) % 2:
+                return ordered[middle]
+            return (ordered[middle - 1] + ordered[middle]) / 2.0
+        return self._pick(median)
+
+    @property
+    def minimum(self):
+        return self._pick(lambda ordered: ordered[0])
+
+    @property
+    def maximum(self):
+        return self._pick(lambda ordered: ordered[-1])
+
+    @property
+    def value(self):
+        """The chosen statistic of each channel, NaN before the first frame."""
+        return getattr(self, STATISTICS[self.statistic])
+
+
+class Stage:
+    """Feed frames through reducers and give results at a steady rate.
+
+    Results are given every decimate frames, counting saturated frames
+    that were dropped, so the output rate follows the frame rate. With
+    reset=True every reducer starts over after each result, so Mean()
+    gives the average of each block of decimate frames (oversampling).
+
+    :param reducers: dict of name to reducer, eg: {'mean': Mean()}
+    :param decimate: Give a result every this many frames
+    :param reset: Reset the reducers after each result
+    :param reject_saturated: Drop frames that saturated, see is_saturated()
+    :param normalise: Reduce counts per step at 1x gain instead of raw counts, for streams where gain or integration time changes
+
+    """
+    def __init__(self, reducers, decimate=1, reset=False, reject_saturated=True, normalise=False):
+        if decimate < 1:
+            raise ValueError("Decimate must be at least one frame.")
+        self.reducers = dict(reducers)
+        self.decimate = decimate
+        self.reset = reset
+        self.reject_saturated = reject_saturated
+        self.normalise = normalise
+        self._frames = 0
+        self._count = 0
+        self._rejected = 0
+
+    def update(self, frame):
+        """Add one frame.
+
+        :param frame: A SpectralFrame, or a StreamFrame holding one
+        :returns: A Reduced result every decimate frames, otherwise None
+
+        """
+        if isinstance(frame, StreamFrame):
+            frame = frame.data
+
+        if self.reject_saturated and is_saturated(frame):
+            self._rejected += 1
+        else:
+            values = frame_values(frame, self.normalise)
+            for reducer in self.reducers.values():
+                reducer.update(values)
+            self._count += 1
+
+        self._frames += 1
+        if self._frames < self.decimate:
+            return None
+
+        result = Reduced(
+            frame.timestamp, self._count, self._rejected,
+            {name: reducer.value for name, reducer in self.reducers.items()})
+        self._frames = self._count = self._rejected = 0
+        if self.reset:
+            for reducer in self.reducers.values():
+                reducer.reset()
+        return result
+
+    def run(self, frames):
+        """Yield Reduced results from an iterable of frames, eg: AS7343.stream(frame=True)."""
+        for frame in frames:
+            result = self.update(frame)
+            if result is not None:
+                yield result
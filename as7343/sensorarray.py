@@ -0,0 +1,263 @@
+"""Drive many AS7343 sensors across I2C buses and TCA9548A multiplexers."""
+import queue
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from . import AS7343
+
+# Default address of a TCA9548A style I2C multiplexer
+TCA9548A_ADDRESS = 0x70
+
+# A set of frames from every sensor in a SensorArray
+# timestamp: mean host time of the frames in the set
+# frames: dict of frames keyed by (bus, channel)
+FrameSet = namedtuple('FrameSet', ('timestamp', 'frames'))
+
+
+class TCA9548A:
+    """Select channels on a TCA9548A I2C multiplexer.
+
+    :param i2c_dev: SMBus instance the multiplexer is attached to
+    :param address: I2C address of the multiplexer
+
+    """
+    def __init__(self, i2c_dev, address=TCA9548A_ADDRESS):
+        self._i2c = i2c_dev
+        self._address = address
+        self._channel = None
+
+    def select(self, channel):
+        """Select a single channel, or None to disconnect all channels."""
+        if channel == self._channel:
+            return
+        self._i2c.write_byte(self._address, 0 if channel is None else 1 << channel)
+        self._channel = channel
+
+
+class MuxChannel:
+    """SMBus-like view of one multiplexer channel.
+
+    Selects the channel (only if it isn't already) before every transfer.
+
+    :param i2c_dev: SMBus instance the multiplexer is attached to
+    :param mux: TCA9548A instance
+    :param channel: Channel number, or None for devices on the main bus
+
+    """
+    def __init__(self, i2c_dev, mux, channel):
+        self._i2c = i2c_dev
+        self._mux = mux
+        self._channel = channel
+
+    def read_i2c_block_data(self, i2c_address, register, length):
+        self._mux.select(self._channel)
+        return self._i2c.read_i2c_block_data(i2c_address, register, length)
+
+    def write_i2c_block_data(self, i2c_address, register, values):
+        self._mux.select(self._channel)
+        return self._i2c.write_i2c_block_data(i2c_address, register, values)
+
+    def __getattr__(self, name):
+        # Only offer combined transactions if the underlying bus does
+        if name == 'i2c_rdwr':
+            i2c_rdwr = getattr(self._i2c, 'i2c_rdwr')
+
+            def call(*msgs):
+                self._mux.select(self._channel)
+                return i2c_rdwr(*msgs)
+
+            return call
+        raise AttributeError(name)
+
+
+class SensorArray:
+    """Own and read many AS7343 sensors at once.
+
+    Sensors are keyed by (bus, channel), where channel is a multiplexer
+    channel or None for a sensor wired directly to the bus. Every bus
+    gets its own worker thread so buses are read in parallel, while all
+    traffic on one bus (including multiplexer switching) is serialised.
+
+    :param sensors: Iterable of (bus, channel) keys
+    :param buses: Optional dict of SMBus instances by bus number, others are opened with smbus2
+    :param mux_address: I2C address of the multiplexer on buses that use channels
+    :param kwargs: Arguments passed on to every AS7343()
+
+    """
+    def __init__(self, sensors, buses=None, mux_address=TCA9548A_ADDRESS, **kwargs):
+        self._i2c = dict(buses or {})
+        self._keys = list(sensors)
+        self._buses = {}
+        for key in self._keys:
+            self._buses.setdefault(key[0], []).append(key)
+
+        self._executors = {
+            bus: ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"as7343-bus{bus}") for bus in self._buses
+        }
+
+        def create(bus, keys):
+            if bus not in self._i2c:
+                import smbus2
+                self._i2c[bus] = smbus2.SMBus(bus)
+            i2c_dev = self._i2c[bus]
+
+            # With a multiplexer present even directly attached sensors
+            # must deselect all channels, since every AS7343 is at 0x39
+            mux = None
+            if any(channel is not None for _, channel in keys):
+                mux = TCA9548A(i2c_dev, mux_address)
+
+            sensors = {}
+            for key in keys:
+                sensors[key] = AS7343(i2c_dev=i2c_dev if mux is None else MuxChannel(i2c_dev, mux, key[1]), **kwargs)
+            return sensors
+
+        self.sensors = self._map(create)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __iter__(self):
+        return iter(self._keys)
+
+    def __getitem__(self, key):
+        return self.sensors[key]
+
+    def _map(self, func):
+        """Run func(bus, keys) on every bus worker and merge the dict results."""
+        futures = [self._executors[bus].submit(func, bus, keys) for bus, keys in self._buses.items()]
+        results = {}
+        for future in futures:
+            results.update(future.result())
+        return results
+
+    def call(self, method, *args, **kwargs):
+        """Call an AS7343 method on every sensor, buses in parallel.
+
+        :param method: Name of the method, eg: "set_gain"
+        :returns: dict of results keyed by (bus, channel)
+
+        """
+        def run(bus, keys):
+            return {key: getattr(self.sensors[key], method)(*args, **kwargs) for key in keys}
+
+        return self._map(run)
+
+    def close(self):
+        """Stop the bus workers."""
+        for executor in self._executors.values():
+            executor.shutdown(wait=False)
+
+    def _stagger(self, keys, start):
+        """Call start(key) for each sensor, spread evenly over one frame period.
+
+        Spreading the starts keeps the FIFO drains of sensors that share
+        a bus from landing on top of each other.
+
+        """
+        period = max(self.sensors[key].get_frame_period() for key in keys)
+        t_start = time.time()
+        results = {}
+        for n, key in enumerate(keys):
+            delay = t_start + n * period / len(keys) - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            results[key] = start(key)
+        return results
+
+    def start(self, stagger=True):
+        """Start measuring on every sensor.
+
+        :param stagger: Offset the start of sensors that share a bus
+
+        """
+        def run(bus, keys):
+            if stagger:
+                return self._stagger(keys, lambda key: self.sensors[key].start_measurement())
+            return {key: self.sensors[key].start_measurement() for key in keys}
+
+        self._map(run)
+
+    def get_data(self, timeout=5.0, direct=False, frame=False):
+        """Read one frame from every sensor, buses in parallel.
+
+        :param timeout: Time in seconds to wait for each sensor
+        :param direct: Read the DATA registers instead of the FIFO
+        :param frame: Read SpectralFrames instead of tuples of dicts
+        :returns: FrameSet of get_data() results
+
+        """
+        def run(bus, keys):
+            return {key: (self.sensors[key].get_data(timeout=timeout, direct=direct, frame=frame), time.time()) for key in keys}
+
+        results = self._map(run)
+        timestamp = sum(t for _, t in results.values()) / len(results)
+        return FrameSet(timestamp, {key: data for key, (data, _) in results.items()})
+
+    def stream(self, timeout=5.0, stagger=True, frame=False):
+        """Yield time-aligned FrameSets of StreamFrames from every sensor.
+
+        Frames are grouped by sequence number. If a sensor dropped the
+        frame for a sequence the set is yielded without it once every
+        sensor has moved past that sequence. Closing the generator stops
+        the bus workers and waits for them to finish.
+
+        :param timeout: Time in seconds to wait for each sensor
+        :param stagger: Offset the start of sensors that share a bus
+        :param frame: Stream SpectralFrames instead of tuples of dicts
+
+        """
+        frames = queue.Queue()
+        stop = threading.Event()
+
+        def run(bus, keys):
+            try:
+                if stagger:
+                    states = self._stagger(keys, lambda key: self.sensors[key]._start_stream(frame))
+                else:
+                    states = {key: self.sensors[key]._start_stream(frame) for key in keys}
+
+                while not stop.is_set():
+                    for key in keys:
+                        sensor = self.sensors[key]
+
+                        # Give up the wait as soon as the consumer goes away
+                        def ready(sensor=sensor):
+                            return -1 if stop.is_set() else sensor._fifo_ready()
+
+                        level = sensor._wait_for(ready, timeout, f"Timeout waiting for sensor {key}.")
+                        if level < 0:
+                            return
+                        for item in sensor._stream_frames(states[key], level):
+                            frames.put((key, item))
+            except Exception as error:
+                frames.put((None, error))
+
+        workers = [self._executors[bus].submit(run, bus, keys) for bus, keys in self._buses.items()]
+
+        pending = {}
+        latest = {key: -1 for key in self._keys}
+
+        try:
+            while True:
+                key, item = frames.get()
+                if key is None:
+                    raise item
+
+                pending.setdefault(item.sequence, {})[key] = item
+                latest[key] = item.sequence
+                oldest = min(latest.values())
+
+                for sequence in sorted(pending):
+                    frame_set = pending[sequence]
+                    if len(frame_set) < len(self._keys) and sequence > oldest:
+                        break
+                    del pending[sequence]
+                    timestamp = sum(item.timestamp for item in frame_set.values()) / len(frame_set)
+                    yield FrameSet(timestamp, frame_set)
+        finally:
+            stop.set()
+            for worker in workers:
+                worker.result()
@@ -0,0 +1,276 @@
+"""Publish the latest AS7343 frame through shared memory.
+
+A publisher writes each frame into a small fixed layout block of
+multiprocessing.shared_memory, and readers in other processes pick up
+the newest frame straight from the block, with no sockets, copies of
+the block or system calls:
+
+    header   32 bytes: magic, version, channel count, publisher PID,
+             seqlock counter (uint64 at SEQ_OFFSET)
+    frame    FRAME at FRAME_OFFSET, see below
+
+The frame is guarded by a seqlock: the publisher makes the counter odd,
+writes the frame, then makes it even again. A reader notes the counter,
+unpacks the frame and checks the counter didn't move, retrying if it
+did, so readers never block the publisher. Requires Python 3.8 or later.
+"""
+import os
+import struct
+import time
+from array import array
+
+from . import CHANNELS, POLL_INTERVAL, SpectralFrame, StreamFrame, _frame_data
+
+DEFAULT_NAME = "as7343"
+
+MAGIC = b"AS7343S\x00"
+VERSION = 1
+
+# magic, version, channel count, publisher PID, seqlock counter
+HEADER = struct.Struct("<8sHHIQ")
+HEADER_SIZE = 32
+PID_OFFSET = 12
+SEQ_OFFSET = 16
+
+# sequence, timestamp, dropped, astep, atime, astatus, cycles, counts in CHANNELS order
+FRAME = struct.Struct(f"<QdIHBBB{len(CHANNELS)}H")
+FRAME_OFFSET = HEADER_SIZE
+
+SIZE = FRAME_OFFSET + FRAME.size
+
+# Time in seconds a reader retries a frame torn by a write before giving up on the publisher
+SEQLOCK_TIMEOUT = 1.0
+
+# Times wait() checks for a new frame before it starts sleeping between checks
+SPIN = 1000
+
+
+# Names of blocks created by publishers in this process
+_created = set()
+
+
+def _attach(name):
+    """Open an existing block without the resource tracker removing it when this process exits."""
+    from multiprocessing import resource_tracker, shared_memory
+    try:
+        return shared_memory.SharedMemory(name, track=False)
+    except TypeError:
+        # Before Python 3.13 every attached process is tracked as an owner,
+        # the tracker only holds each name once so leave a publisher's alone
+        shm = shared_memory.SharedMemory(name)
+        if name not in _created:
+            resource_tracker.unregister(shm._name, "shared_memory")
+        return shm
+
+
+def _running(pid):
+    """Check whether a process is still running."""
+    if pid == 0:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass  # Someone else's
+    return True
+
+
+class SharedFramePublisher:
+    """Write the latest frame to shared memory.
+
+    A block left behind by a publisher that has exited is replaced, but
+    one whose publisher is still running is only replaced if asked to,
+    since its readers would silently stop getting frames.
+
+    :param name: Name of the shared memory block
+    :param create: Create the block, or False to take over an existing one
+    :param replace: Replace a block even if its publisher is still running
+
+    """
+    def __init__(self, name=DEFAULT_NAME, create=True, replace=False):
+        from multiprocessing import shared_memory
+        self.name = name
+        self._owner = create
+        if create:
+            try:
+                self._shm = shared_memory.SharedMemory(name, create=True, size=SIZE)
+            except FileExistsError:
+                existing = _attach(name)
+                _, _, _, pid, _ = HEADER.unpack_from(existing.buf, 0)
+                existing.close()
+                if _running(pid) and not replace:
+                    raise FileExistsError(f"Shared frame {name!r} is in use by publisher PID {pid}.")
+                shared_memory.SharedMemory(name).unlink()
+                self._shm = shared_memory.SharedMemory(name, create=True, size=SIZE)
+            _created.add(name)
+            HEADER.pack_into(self._shm.buf, 0, MAGIC, VERSION, len(CHANNELS), os.getpid(), 0)
+        else:
+            # Take over a block readers are already attached to
+            self._shm = _attach(name)
+            magic, version, channels, pid, _ = HEADER.unpack_from(self._shm.buf, 0)
+            if magic != MAGIC or version != VERSION or channels != len(CHANNELS):
+                self._shm.close()
+                raise ValueError("Not an AS7343 shared frame.")
+            if pid != os.getpid() and _running(pid) and not replace:
+                self._shm.close()
+                raise FileExistsError(f"Shared frame {name!r} is in use by publisher PID {pid}.")
+            struct.pack_into("<I", self._shm.buf, PID_OFFSET, os.getpid())
+        self._seq = self._shm.buf[SEQ_OFFSET:SEQ_OFFSET + 8].cast('Q')
+        if self._seq[0] & 1:
+            # Left mid-write by a publisher that crashed
+            self._seq[0] += 1
+        self._sequence = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def publish(self, frame):
+        """Publish a frame.
+
+        :param frame: A StreamFrame holding a SpectralFrame, or a SpectralFrame
+
+        """
+        if isinstance(frame, StreamFrame):
+            sequence, dropped, data = frame.sequence, frame.dropped, frame.data
+        else:
+            sequence, dropped, data = self._sequence, 0, frame
+        self._sequence = sequence + 1
+
+        seq = self._seq
+        seq[0] += 1  # Odd, readers retry until the write is done
+        FRAME.pack_into(
+            self._shm.buf, FRAME_OFFSET,
+            sequence, data.timestamp, dropped, data.astep, data.atime, data.astatus, data.cycles, *data.counts)
+        seq[0] += 1
+
+    def run(self, sensor, timeout=5.0):
+        """Stream a sensor and publish every frame, until interrupted.
+
+        :param sensor: An AS7343 instance
+        :param timeout: Time in seconds to wait for each frame
+
+        """
+        try:
+            for frame in sensor.stream(timeout=timeout, frame=True):
+                self.publish(frame)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            sensor.stop_measurement()
+
+    def close(self):
+        """Close the block, and remove it if this publisher created it."""
+        self._seq.release()
+        if self._owner:
+            self._shm.unlink()
+            _created.discard(self.name)
+        self._shm.close()
+
+
+class SharedFrameReader:
+    """Read the latest frame from shared memory, with the same get_data() and stream() as an AS7343.
+
+    :param name: Name of the shared memory block
+
+    """
+    def __init__(self, name=DEFAULT_NAME):
+        self._shm = _attach(name)
+        magic, version, channels, _, _ = HEADER.unpack_from(self._shm.buf, 0)
+        if magic != MAGIC or version != VERSION or channels != len(CHANNELS):
+            self._shm.close()
+            raise ValueError("Not an AS7343 shared frame.")
+        self._seq = self._shm.buf[SEQ_OFFSET:SEQ_OFFSET + 8].cast('Q')
+        # Counter of the last frame read
+        self._last = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        self._seq.release()
+        self._shm.close()
+
+    @property
+    def published(self):
+        """Number of frames published so far."""
+        return self._seq[0] // 2
+
+    def latest(self):
+        """Get the newest StreamFrame holding a SpectralFrame, or None if nothing has been published."""
+        seq = self._seq
+        buf = self._shm.buf
+        t_start = None
+        while True:
+            before = seq[0]
+            if before == 0:
+                return None
+            if not before & 1:
+                sequence, timestamp, dropped, astep, atime, astatus, cycles, *counts = FRAME.unpack_from(buf, FRAME_OFFSET)
+                if seq[0] == before:
+                    self._last = before
+                    data = SpectralFrame(array('H', counts), astatus, atime, astep, timestamp, cycles)
+                    return StreamFrame(sequence, timestamp, dropped, data)
+            # Mid-write, the publisher may have been preempted so let it run
+            if t_start is None:
+                t_start = time.time()
+            elif time.time() - t_start > SEQLOCK_TIMEOUT:
+                raise TimeoutError("Shared frame is stuck mid-write, has the publisher crashed?")
+            time.sleep(0)
+
+    def wait(self, timeout=5.0):
+        """Wait for a frame newer than the last one read, and return it.
+
+        Spins briefly first, then checks every POLL_INTERVAL.
+
+        :param timeout: Time in seconds to wait
+
+        """
+        seq = self._seq
+        last = self._last
+        for _ in range(SPIN):
+            if seq[0] != last:
+                return self.latest()
+        t_start = time.time()
+        while seq[0] == last:
+            if time.time() - t_start > timeout:
+                raise TimeoutError("Timeout waiting for a shared frame.")
+            time.sleep(POLL_INTERVAL)
+        return self.latest()
+
+    def get_data(self, timeout=5.0, direct=False, frame=False):
+        """Get the newest frame, waiting only if it has already been read, see AS7343.get_data().
+
+        :param timeout: Time in seconds to wait for a frame
+        :param direct: Ignored, the publisher reads the sensor
+        :param frame: Return a SpectralFrame instead of a tuple of dicts
+
+        """
+        item = self.latest() if self._seq[0] != self._last else None
+        if item is None:
+            item = self.wait(timeout)
+        return _frame_data(item.data, frame)
+
+    def stream(self, timeout=5.0, frame=False):
+        """Yield each new frame as a StreamFrame, see AS7343.stream().
+
+        Only the newest frame is kept, so dropped includes frames
+        published while the reader was busy.
+
+        :param timeout: Time in seconds to wait for each frame
+        :param frame: Yield SpectralFrame data instead of tuples of dicts
+
+        """
+        previous = None
+        while True:
+            item = self.wait(timeout)
+            if previous is not None and item.sequence > previous + 1:
+                item = item._replace(dropped=item.dropped + item.sequence - previous - 1)
+            previous = item.sequence
+            yield item._replace(data=_frame_data(item.data, frame))
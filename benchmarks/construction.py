@@ -0,0 +1,34 @@
+#!/usr/bin/env python
+"""Benchmark AS7343() construction against a fake I2C bus.
+
+Run from the repository root: python benchmarks/construction.py
+"""
+import sys
+import time
+
+from i2cdevice import MockSMBus
+
+sys.path.insert(0, ".")
+
+from as7343 import AS7343  # noqa: E402
+
+ITERATIONS = 100
+
+
+def fake_bus():
+    return MockSMBus(1, default_registers={
+        0x58: 0x08,       # AUXID
+        0x59: 0x07,       # REVID
+        0x5A: 0b10000001  # ID
+    })
+
+
+def benchmark(**kwargs):
+    t_start = time.perf_counter()
+    for _ in range(ITERATIONS):
+        AS7343(i2c_dev=fake_bus(), **kwargs)
+    return (time.perf_counter() - t_start) / ITERATIONS
+
+
+print(f"reset:  {benchmark() * 1000:.3f}ms per sensor")
+print(f"attach: {benchmark(reset=False) * 1000:.3f}ms per sensor")
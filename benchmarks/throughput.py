@@ -0,0 +1,267 @@
+#!/usr/bin/env python
+"""Benchmark reading frames from an emulated AS7343.
+
+Run from the repository root:
+
+    python -m benchmarks.throughput            # print results
+    python -m benchmarks.throughput --check    # compare against baseline.json
+    python -m benchmarks.throughput --update   # store new baselines
+
+For each read mode and channel count this reports:
+
+    fps           frames per second
+    transactions  I2C transactions per frame, not counting polls
+    bytes         bytes on the bus per frame, not counting polls
+    polls         status reads per frame while waiting for data
+    overhead_ms   wall time per frame beyond the measurement itself
+    alloc_peak    peak bytes allocated while reading a frame (tracemalloc)
+    alloc_blocks  memory blocks still held per frame afterwards
+
+Results depend on the machine, and the emulator runs in the same
+process, so bus use and allocations shift with when its cycles land.
+Only fps and overhead_ms are compared for these, within TOLERANCE.
+A second run against a VirtualClock, where emulated time moves on a
+fixed step per transaction, is repeatable anywhere. Its transactions,
+bytes and polls are compared exactly and its allocations within
+TOLERANCE, and tests/test_benchmarks.py checks the exact ones on every
+test run.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+from as7343 import AS7343
+from as7343.emulator import ADDRESS, Emulator
+
+BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+# A Raspberry Pi at 400kHz: ~100us of software overhead per transaction, 9 bits per byte
+LATENCY = 100e-6
+BYTE_TIME = 9 / 400000
+
+# Short cycles to keep the benchmark quick, 1000 steps of 2.78us
+INTEGRATION_TIME = 2780
+
+MODES = ('get_data', 'direct', 'read_fifo')
+CHANNELS = (6, 12, 18)
+
+# Emulated time per transaction for repeatable runs
+VIRTUAL_STEP = 0.001
+
+# Frames per benchmark in repeatable runs
+VIRTUAL_FRAMES = 10
+
+# Metrics that must not get worse at all in repeatable runs, and those allowed to vary by TOLERANCE
+EXACT = ('transactions', 'bytes', 'polls')
+HIGHER_IS_BETTER = ('fps',)
+REALTIME = ('fps', 'overhead_ms')
+TOLERANCE = {
+    'fps': 0.2,
+    'transactions': 0.1,
+    'bytes': 0.1,
+    'polls': 0.5,
+    'overhead_ms': 0.5,
+    'alloc_peak': 0.25,
+    'alloc_blocks': 0.25,
+}
+
+
+class VirtualClock:
+    """A clock that moves on by a fixed step every time it's read.
+
+    The emulator reads its clock once per transaction, so with this
+    clock a run is the same every time, however fast the host is.
+
+    """
+    def __init__(self, step=VIRTUAL_STEP):
+        self.step = step
+        self.t = 0.0
+
+    def __call__(self):
+        self.t += self.step
+        return self.t
+
+
+def create(channels, latency=LATENCY, byte_time=BYTE_TIME, combined=True, clock=None):
+    """Create an AS7343 on an emulated bus."""
+    if clock is None:
+        bus = Emulator(latency=latency, byte_time=byte_time, combined=combined)
+    else:
+        bus = Emulator(latency=latency, byte_time=byte_time, combined=combined, clock=clock)
+    sensor = AS7343(i2c_dev=bus)
+    sensor.set_channels(channels)
+    sensor.set_integration_time(INTEGRATION_TIME)
+    sensor.set_measurement_time(INTEGRATION_TIME / 1000)
+    return sensor, bus
+
+
+def reader(sensor, mode):
+    if mode == 'direct':
+        return lambda: sensor.get_data(direct=True)
+    if mode == 'read_fifo':
+        return lambda: list(sensor.read_fifo())
+    return sensor.get_data
+
+
+def measure(mode, channels, frames=50, latency=LATENCY, byte_time=BYTE_TIME, combined=True, clock=None):
+    """Benchmark one read mode and channel count.
+
+    :param mode: One of MODES
+    :param channels: One of CHANNELS
+    :param frames: Number of frames to read
+    :param latency: Emulated time per transaction in seconds
+    :param byte_time: Emulated time per byte in seconds
+    :param combined: Allow combined i2c_rdwr transactions
+    :param clock: Clock for the emulator, eg: VirtualClock(), wall time results are left out if set
+
+    """
+    sensor, bus = create(channels, latency, byte_time, combined, clock)
+    read = reader(sensor, mode)
+    poll_register = ADDRESS['STATUS2'] if mode == 'direct' else ADDRESS['FIFO_LVL']
+
+    # The first read starts the measurement
+    read()
+    bus.reset_counters()
+
+    t_start = time.perf_counter()
+    for _ in range(frames):
+        read()
+    elapsed = time.perf_counter() - t_start
+
+    polls = bus.counts['read', poll_register]
+    # The last status read before each frame is the one that finds it ready
+    poll_transactions = polls - frames
+    transactions = bus.transactions - poll_transactions
+    # Each poll writes the register address and reads one byte
+    poll_bytes = poll_transactions * 2
+    result = {
+        'transactions': transactions / frames,
+        'bytes': (bus.bytes_read + bus.bytes_written - poll_bytes) / frames,
+        'polls': polls / frames,
+    }
+    if clock is None:
+        result['fps'] = frames / elapsed
+        result['overhead_ms'] = max(0.0, elapsed / frames - sensor.get_frame_period()) * 1000
+    result.update(measure_allocations(read, min(frames, 10)))
+    return result
+
+
+def measure_allocations(read, frames):
+    """Measure peak and retained allocations per frame with tracemalloc."""
+    tracemalloc.start()
+    try:
+        peak = 0
+        blocks_start = sum(stat.count for stat in tracemalloc.take_snapshot().statistics('filename'))
+        for _ in range(frames):
+            current, _ = tracemalloc.get_traced_memory()
+            if hasattr(tracemalloc, 'reset_peak'):
+                tracemalloc.reset_peak()
+            read()
+            peak = max(peak, tracemalloc.get_traced_memory()[1] - current)
+        blocks_end = sum(stat.count for stat in tracemalloc.take_snapshot().statistics('filename'))
+    finally:
+        tracemalloc.stop()
+    return {
+        'alloc_peak': peak,
+        'alloc_blocks': max(0, blocks_end - blocks_start) / frames,
+    }
+
+
+def run(frames=50, virtual=False, **kwargs):
+    """Benchmark every mode and channel count, returning results keyed by "mode/channels".
+
+    :param frames: Number of frames to read per benchmark
+    :param virtual: Run repeatably against a VirtualClock with no bus latency
+
+    """
+    if virtual:
+        kwargs.update(latency=0.0, byte_time=0.0)
+    results = {}
+    for mode in MODES:
+        for channels in CHANNELS:
+            if virtual:
+                kwargs['clock'] = VirtualClock()
+            results[f"{mode}/{channels}"] = measure(mode, channels, frames, **kwargs)
+    return results
+
+
+def compare(results, baseline, exact=False, metrics=None):
+    """Compare results against a baseline.
+
+    :param exact: Results are repeatable, so EXACT metrics must not get worse at all
+    :param metrics: Only compare these metrics, defaults to all of them
+    :returns: list of regressions, as strings
+
+    """
+    regressions = []
+    for key, expected in baseline.items():
+        if key not in results:
+            continue
+        for metric, value in expected.items():
+            actual = results[key].get(metric)
+            if actual is None or (metrics is not None and metric not in metrics):
+                continue
+            if exact and metric in EXACT:
+                failed = actual > value
+            elif metric in HIGHER_IS_BETTER:
+                failed = actual < value * (1 - TOLERANCE[metric])
+            else:
+                # Allow a little absolute slack for metrics that are near zero
+                failed = actual > value * (1 + TOLERANCE[metric]) + 1
+            if failed:
+                regressions.append(f"{key} {metric}: {actual:.2f}, baseline {value:.2f}")
+    return regressions
+
+
+def load_baseline(path=BASELINE):
+    with open(path) as f:
+        return json.load(f)
+
+
+def report(title, results):
+    metrics = [metric for metric in ('fps', 'transactions', 'bytes', 'polls', 'overhead_ms', 'alloc_peak', 'alloc_blocks') if metric in next(iter(results.values()))]
+    print(title)
+    print(f"{'benchmark':<14}" + "".join(f"{metric:>14}" for metric in metrics))
+    for key, result in results.items():
+        print(f"{key:<14}" + "".join(f"{result[metric]:>14.2f}" for metric in metrics))
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="Benchmark AS7343 reads against an emulated sensor.")
+    parser.add_argument("--frames", type=int, default=50, help="frames to read per benchmark")
+    parser.add_argument("--check", action="store_true", help="fail if results regress from the baseline")
+    parser.add_argument("--update", action="store_true", help="store the results as the new baseline")
+    parser.add_argument("--block-reads", action="store_true", help="disable combined i2c_rdwr transactions")
+    args = parser.parse_args(args)
+
+    results = {
+        'realtime': run(args.frames, combined=not args.block_reads),
+        'virtual': run(VIRTUAL_FRAMES, virtual=True, combined=not args.block_reads),
+    }
+    report("Real time, emulated bus latency:", results['realtime'])
+    report("Virtual clock, repeatable:", results['virtual'])
+
+    if args.update:
+        baseline = {
+            name: {key: {metric: round(value, 2) for metric, value in result.items()} for key, result in runs.items()}
+            for name, runs in results.items()
+        }
+        with open(BASELINE, "w") as f:
+            json.dump(baseline, f, indent=4, sort_keys=True)
+            f.write("\n")
+
+    if args.check:
+        baseline = load_baseline()
+        regressions = compare(results['realtime'], baseline['realtime'], metrics=REALTIME)
+        regressions += compare(results['virtual'], baseline['virtual'], exact=True)
+        for regression in regressions:
+            print(f"Regression: {regression}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
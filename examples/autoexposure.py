@@ -0,0 +1,23 @@
+from as7343 import AS7343
+from as7343.exposure import AutoExposure
+
+as7343 = AS7343()
+
+as7343.set_measurement_time(100)
+as7343.set_channels(18)
+
+# Keep the brightest channel at around half of full scale,
+# with integration time capped at 100ms
+exposure = AutoExposure(as7343, target=0.5, max_integration_time=100 * 1000)
+
+try:
+    gain = None
+    for frame in exposure.stream():
+        data = frame.data
+        if data.gain != gain:
+            print(f"Exposure changed, gain {data.gain}x")
+            gain = data.gain
+        print(f"{frame.sequence: 6d} | gain {data.gain: 5}x | F1 {data['F1']: 5d} | F4 {data['F4']: 5d} | F7 {data['F7']: 5d} | NIR {data['NIR']: 5d}")
+
+except KeyboardInterrupt:
+    as7343.stop_measurement()
@@ -1,21 +1,42 @@
-F1 = 5749
-F2 = 1756
-FZ = 2169
-F3 = 770
-F4 = 3141
-FY = 3747
-F5 = 1574
-FXL = 4776
-F6 = 3336
-F7 = 5435
-F8 = 864
-NIR = 10581
-
-vals = [F1, F2, FZ, F3, F4, FY, F5, FXL, F6, F7, F8, NIR]
-
-m = max(vals)
-
-print(m)
-
-for v in vals:
-    print(f"{m / v:.02f}")
+import sys
+
+from as7343 import AS7343
+from as7343.calibration import build_profile
+
+path = sys.argv[1] if len(sys.argv) > 1 else "calibration.json"
+
+# Gains to capture dark frames at, calibrate only at the gains you use
+GAINS = (1, 4, 16, 64, 256)
+FRAMES = 10
+
+as7343 = AS7343()
+
+as7343.set_integration_time(100 * 1000)
+as7343.set_measurement_time(100)
+as7343.set_channels(18)
+
+
+def capture(count):
+    as7343.get_data(frame=True)  # Discard the first frame after a change
+    return [as7343.get_data(frame=True) for _ in range(count)]
+
+
+input("Cover the sensor, then press Enter...")
+dark_frames = []
+for gain in GAINS:
+    as7343.set_gain(gain)
+    dark_frames += capture(FRAMES)
+    print(f"Captured dark frames at {gain}x")
+
+input("Point the sensor at the reference light, then press Enter...")
+as7343.set_gain(GAINS[0])
+reference_frames = capture(FRAMES)
+
+profile = build_profile(dark_frames, reference_frames)
+profile.save(path)
+
+as7343.stop_measurement()
+
+print(f"Saved {path}")
+for channel, value in zip(profile.to_dict()['channels'], profile.responsivity):
+    print(f"{channel:>4}: {value:.3f}")
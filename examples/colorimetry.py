@@ -0,0 +1,24 @@
+import sys
+
+from as7343 import AS7343
+from as7343.calibration import Calibration
+from as7343.colorimetry import Colorimetry
+
+# A profile from examples/calibrate.py, otherwise the datasheet typical responsivities
+calibration = Calibration.load(sys.argv[1]) if len(sys.argv) > 1 else Calibration.default()
+colorimetry = Colorimetry()
+
+as7343 = AS7343()
+
+as7343.set_gain(64)
+as7343.set_integration_time(100 * 1000)
+as7343.set_measurement_time(100)
+as7343.set_channels(18)
+
+try:
+    for frame in as7343.stream(frame=True):
+        colour = colorimetry.measure(calibration.apply(frame.data))
+        print(f"lux {colour.lux:10.1f} | CCT {colour.cct:7.0f}K | x {colour.x:.4f} y {colour.y:.4f} | u' {colour.u:.4f} v' {colour.v:.4f}")
+
+except KeyboardInterrupt:
+    as7343.stop_measurement()
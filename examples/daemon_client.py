@@ -0,0 +1,14 @@
+import sys
+
+from as7343.daemon import DEFAULT_PATH, DaemonClient
+
+# Start the daemon first, eg: python -m as7343.daemon --channels 18 --measurement-time 100
+path = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_PATH
+
+with DaemonClient(path) as as7343:
+    try:
+        for frame in as7343.stream(frame=True):
+            print(f"#{frame.sequence:6d} | gain {frame.data.gain: 5}x | F4 {frame.data['F4']: 5d} | NIR {frame.data['NIR']: 5d} | dropped {frame.dropped}")
+
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,17 @@
+from as7343 import AS7343
+from as7343.flicker import FlickerDetector
+
+as7343 = AS7343()
+
+# 256 * 2.78us per sample, about 1.4kHz
+flicker = FlickerDetector(as7343, fd_time=255, gain=16)
+
+try:
+    for samples in flicker.stream(block_size=1024):
+        result = flicker.analyse(samples)
+        print(f"{result.frequency:6.1f}Hz | depth {result.depth * 100:5.1f}% | percent flicker {result.percent:5.1f}%")
+
+except KeyboardInterrupt:
+    flicker.disable()
+    status = flicker.get_status()
+    print(f"On-chip verdict: 100Hz {status.hz100}, 120Hz {status.hz120}")
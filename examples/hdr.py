@@ -0,0 +1,17 @@
+from as7343 import AS7343, CHANNELS
+from as7343.hdr import HDR
+
+as7343 = AS7343()
+as7343.set_channels(18)
+
+# From very dim to bright, each exposure is queued while the one before it is measured
+hdr = HDR(as7343, ((512, 50 * 1000), (32, 50 * 1000), (1, 27800)))
+
+try:
+    for merged in hdr.stream():
+        values = " | ".join(f"{name} {merged.values[CHANNELS.index(name)]: 9.4f}" for name in ("F1", "F4", "FXL", "NIR"))
+        saturated = f" | saturated: {', '.join(merged.saturated)}" if merged.saturated else ""
+        print(f"{values} | restarts {hdr.restarts}{saturated}")
+
+except KeyboardInterrupt:
+    as7343.stop_measurement()
@@ -0,0 +1,25 @@
+from as7343 import AS7343
+from as7343.monitor import ThresholdMonitor
+
+# Wire INT to a GPIO and use an interrupt source to wait without polling, eg:
+# from as7343.interrupt import GPIOInterrupt
+# as7343 = AS7343(interrupt=GPIOInterrupt(4))
+as7343 = AS7343()
+
+as7343.set_gain(64)
+as7343.set_integration_time(50 * 1000)
+
+
+def changed(crossing):
+    direction = "up" if crossing.above else "down"
+    print(f"{crossing.timestamp:.3f} | light went {direction} to {crossing.value} counts, outside {crossing.low} - {crossing.high}")
+
+
+# Measure once a second, and report changes of more than 20% that last for three seconds
+monitor = ThresholdMonitor(as7343, channel='VIS', persistence=3, interval=1000)
+
+try:
+    monitor.run(changed, margin=0.2)
+
+except KeyboardInterrupt:
+    pass
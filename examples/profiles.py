@@ -0,0 +1,25 @@
+import time
+
+from as7343 import AS7343
+from as7343.profile import Profile
+
+as7343 = AS7343()
+
+# Compile each setup once, switching is then just a few register writes
+PROFILES = (
+    Profile("bright", gain=4, integration_time=10 * 1000, measurement_time=10, channels=18),
+    Profile("dim", gain=512, integration_time=100 * 1000, measurement_time=100, channels=18),
+    Profile("reflectance", gain=64, integration_time=50 * 1000, measurement_time=50, channels=18, led=True, led_current=8),
+)
+
+try:
+    while True:
+        for profile in PROFILES:
+            t_start = time.perf_counter()
+            profile.apply(as7343)
+            t_switch = (time.perf_counter() - t_start) * 1000
+            frame = as7343.get_data(frame=True)
+            print(f"{profile.name:>12} | switched in {t_switch:.2f}ms | gain {frame.gain: 5}x | F4 {frame['F4']: 5d} | NIR {frame['NIR']: 5d}")
+
+except KeyboardInterrupt:
+    as7343.stop_measurement()
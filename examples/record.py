@@ -0,0 +1,27 @@
+import sys
+
+from as7343 import AS7343
+from as7343.recorder import Recorder
+
+path = sys.argv[1] if len(sys.argv) > 1 else "capture.as7343"
+
+as7343 = AS7343()
+
+as7343.set_gain(512)
+as7343.set_integration_time(100 * 1000)
+as7343.set_measurement_time(100)
+as7343.set_channels(18)
+
+print(f"Recording to {path}, press Ctrl+C to stop.")
+
+with Recorder(path) as recorder:
+    try:
+        for frame in as7343.stream(frame=True):
+            recorder.append(frame)
+            if frame.dropped:
+                print(f"Dropped {frame.dropped} frames!")
+
+    except KeyboardInterrupt:
+        as7343.stop_measurement()
+
+    print(f"Recorded {len(recorder)} frames.")
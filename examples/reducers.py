@@ -0,0 +1,22 @@
+from as7343 import AS7343, CHANNELS
+from as7343.reducers import EMA, Mean, RollingWindow, Stage
+
+as7343 = AS7343()
+as7343.set_channels(18)
+as7343.set_integration_time(10 * 1000)
+as7343.set_measurement_time(10)
+
+# Report every 10 frames, without keeping the raw frames: the mean so far, a moving average and the median of the last 9
+stage = Stage({
+    'mean': Mean(),
+    'ema': EMA(alpha=0.2),
+    'median': RollingWindow(9),
+}, decimate=10)
+
+try:
+    for result in stage.run(as7343.stream(frame=True)):
+        f4 = CHANNELS.index("F4")
+        print(f"{result.count:2d} frames ({result.rejected} saturated) | F4 mean {result.values['mean'][f4]:8.1f} | ema {result.values['ema'][f4]:8.1f} | median {result.values['median'][f4]:8.1f}")
+
+except KeyboardInterrupt:
+    as7343.stop_measurement()
@@ -0,0 +1,23 @@
+import sys
+
+from as7343 import AS7343
+from as7343.shm import SharedFramePublisher, SharedFrameReader
+
+# Run "python shared_memory.py publish" in one terminal, and "python shared_memory.py" in others
+
+if len(sys.argv) > 1 and sys.argv[1] == "publish":
+    as7343 = AS7343()
+    as7343.set_channels(18)
+    as7343.set_measurement_time(10)
+    print("Publishing frames, press Ctrl+C to stop.")
+    with SharedFramePublisher() as publisher:
+        publisher.run(as7343)
+
+else:
+    with SharedFrameReader() as reader:
+        try:
+            for frame in reader.stream(frame=True):
+                print(f"#{frame.sequence:6d} | F4 {frame.data['F4']: 5d} | NIR {frame.data['NIR']: 5d} | dropped {frame.dropped}")
+
+        except KeyboardInterrupt:
+            pass
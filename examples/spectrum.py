@@ -11,12 +11,7 @@ as7343.set_illumination_led(True)
 
 try:
     while True:
-        values = as7343.get_data()
-        if values is None:
-            continue
-        data = values[0]
-        data.update(values[1])
-        data.update(values[2])
+        data = as7343.get_data(frame=True).as_dict()
         print("""
 Red:    {f7}
 Orange: {fxl}
@@ -0,0 +1,20 @@
+from as7343 import AS7343
+
+as7343 = AS7343()
+
+as7343.set_gain(512)
+as7343.set_integration_time(100 * 1000)
+as7343.set_measurement_time(100)
+as7343.set_channels(18)
+
+try:
+    for frame in as7343.stream():
+        data = frame.data[0]
+        data.update(frame.data[1])
+        data.update(frame.data[2])
+        if frame.dropped:
+            print(f"Dropped {frame.dropped} frames!")
+        print(f"{frame.sequence: 6d} {frame.timestamp:.3f} | F1 {data['f1']: 5d} | F4 {data['f4']: 5d} | F7 {data['f7']: 5d} | NIR {data['nir']: 5d}")
+
+except KeyboardInterrupt:
+    as7343.stop_measurement()
@@ -12,14 +12,27 @@ class SMBusFakeDevice(MockSMBus):
             0x59: 0x07,       # Fake rev ID
             0x5A: 0b10000001  # Fake ID (part number?)
         })
+        self.fifo = []
 
     def write_i2c_block_data(self, i2c_address, register, values):
         self.regs[register:register + len(values)] = values
+        # CONTROL.FIFO_CLR empties the FIFO and clears FIFO_OV
+        if register == 0xFA and values[0] & 0b00000010:
+            self.fifo = []
+            self.regs[0xFD] = 0
+            self.regs[0xBC] &= 0b01111111
+            self.regs[0xFA] &= 0b11111101
 
     def read_i2c_block_data(self, i2c_address, register, length):
-        # Catch reads from FDATA and decriment FIFO_LVL
-        if register == 0xFE and self.regs[0xFD] > 0:
-            self.regs[0xFD] -= 1
+        # Catch reads from FDATA, pop words from the fake FIFO and decrement FIFO_LVL
+        if register == 0xFE:
+            data = []
+            for _ in range(max(1, length // 2)):
+                word = self.fifo.pop(0) if self.fifo else 0
+                data += [word & 0xff, word >> 8]
+                if self.regs[0xFD] > 0:
+                    self.regs[0xFD] -= 1
+            return data[:length]
 
         return self.regs[register:register + length]
 
@@ -0,0 +1,125 @@
+# noqa D100
+import asyncio
+
+import pytest
+
+
+def test_async_get_data(smbus):
+    """Test get_data does not block the event loop while waiting."""
+    from as7343 import AS7343
+    from as7343.aio import AsyncAS7343
+
+    async def main():
+        async with AsyncAS7343(AS7343()) as as7343:
+            i2c = as7343.sensor._as7343._i2c
+
+            async def frame_ready():
+                await asyncio.sleep(0.05)
+                i2c.fifo = [0x03, 1, 2, 3, 4, 5, 6]
+                i2c.regs[0xFD] = 7
+
+            task = asyncio.ensure_future(frame_ready())
+            results = await as7343.get_data(timeout=1.0)
+            await task
+            return results
+
+    results = asyncio.run(main())
+    assert results[0]['nir'] == 4
+
+
+def test_async_get_data_timeout(smbus):
+    """Test get_data times out."""
+    from as7343 import AS7343
+    from as7343.aio import AsyncAS7343
+
+    async def main():
+        async with AsyncAS7343(AS7343()) as as7343:
+            await as7343.get_data(timeout=0.1)
+
+    with pytest.raises(TimeoutError):
+        asyncio.run(main())
+
+
+def test_async_stream(smbus):
+    """Test async iteration over a stream."""
+    from as7343 import AS7343
+    from as7343.aio import AsyncAS7343
+
+    async def main():
+        async with AsyncAS7343(AS7343()) as as7343:
+            await as7343.set_channels(6)
+            i2c = as7343.sensor._as7343._i2c
+
+            async def frames_ready():
+                await asyncio.sleep(0.05)
+                i2c.fifo = [0x03, 1, 2, 3, 4, 5, 6, 0x03, 7, 8, 9, 10, 11, 12]
+                i2c.regs[0xFD] = 14
+
+            task = asyncio.ensure_future(frames_ready())
+            frames = []
+            async for frame in as7343.stream(timeout=1.0):
+                frames.append(frame)
+                if len(frames) == 2:
+                    break
+            await task
+            return frames
+
+    frames = asyncio.run(main())
+    assert [frame.sequence for frame in frames] == [0, 1]
+    assert frames[1].data[0]['nir'] == 10
+
+
+def test_async_create(smbus):
+    """Test constructing the sensor on the executor."""
+    from as7343 import PART_ID
+    from as7343.aio import AsyncAS7343
+
+    async def main():
+        async with await AsyncAS7343.create() as as7343:
+            return await as7343.get_version()
+
+    assert asyncio.run(main())[2] == PART_ID
+
+
+def test_async_create_executor(smbus):
+    """Test an executor passed in is left running by close."""
+    from concurrent.futures import ThreadPoolExecutor
+
+    from as7343 import PART_ID
+    from as7343.aio import AsyncAS7343
+
+    async def main(executor):
+        async with await AsyncAS7343.create(executor=executor) as as7343:
+            await as7343.get_version()
+        return await asyncio.get_running_loop().run_in_executor(executor, lambda: PART_ID)
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        assert asyncio.run(main(executor)) == PART_ID
+
+
+def test_async_close_does_not_block(smbus):
+    """Test close waits for outstanding bus work without blocking the event loop."""
+    import time
+
+    from as7343 import AS7343
+    from as7343.aio import AsyncAS7343
+
+    async def main():
+        as7343 = AsyncAS7343(AS7343())
+        loop = asyncio.get_running_loop()
+        busy = loop.run_in_executor(as7343._executor, time.sleep, 0.2)
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        task = asyncio.ensure_future(ticker())
+        await as7343.close()
+        task.cancel()
+        await busy
+        return ticks
+
+    assert asyncio.run(main()) >= 5
@@ -0,0 +1,20 @@
+# noqa D100
+
+
+def test_benchmark_baseline():
+    """Test repeatable benchmarks haven't regressed from benchmarks/baseline.json."""
+    from benchmarks.throughput import EXACT, VIRTUAL_FRAMES, compare, load_baseline, run
+
+    # Allocations vary with the Python version and whatever else is traced, so leave them out
+    baseline = {key: {metric: result[metric] for metric in EXACT} for key, result in load_baseline()['virtual'].items()}
+    results = run(VIRTUAL_FRAMES, virtual=True)
+    assert compare(results, baseline, exact=True) == []
+
+
+def test_benchmark_compare():
+    """Test a regression is reported."""
+    from benchmarks.throughput import compare
+
+    baseline = {'get_data/6': {'transactions': 2.0, 'fps': 100.0}}
+    assert compare({'get_data/6': {'transactions': 2.0, 'fps': 95.0}}, baseline, exact=True) == []
+    assert len(compare({'get_data/6': {'transactions': 3.0, 'fps': 50.0}}, baseline, exact=True)) == 2
@@ -0,0 +1,93 @@
+# noqa D100
+import math
+from array import array
+
+import pytest
+
+
+def make_frame(counts, again=0x05, atime=0, astep=99, cycles=3):
+    from as7343 import SpectralFrame
+    return SpectralFrame(array('H', counts), again, atime=atime, astep=astep, cycles=cycles)
+
+
+def test_calibration_normalises():
+    """Test dark offsets, gain and integration steps are all taken out."""
+    from as7343 import CHANNELS
+    from as7343.calibration import Calibration
+    n = len(CHANNELS)
+    responsivity = [2.0] * n
+    calibration = Calibration(responsivity, dark={16: [100] * n})
+
+    # 16x gain, 100 steps
+    frame = make_frame([100 + 16 * 100 * 2 * 3] * n)
+    assert list(calibration.apply(frame)) == pytest.approx([3.0] * n)
+
+    # Doubling the integration time gives the same result
+    frame = make_frame([100 + 16 * 200 * 2 * 3] * n, atime=1)
+    assert list(calibration.apply(frame)) == pytest.approx([3.0] * n)
+
+    # Missing gains use the dark offsets of the nearest one
+    frame = make_frame([100 + 32 * 100 * 2 * 3] * n, again=0x06)
+    assert list(calibration.apply(frame)) == pytest.approx([3.0] * n)
+
+
+def test_calibration_crosstalk():
+    """Test the crosstalk matrix is applied after normalising."""
+    from as7343 import CHANNELS
+    from as7343.calibration import Calibration
+    n = len(CHANNELS)
+    crosstalk = [[1.0 if row == col else 0.0 for col in range(n)] for row in range(n)]
+    crosstalk[0][1] = -0.5  # Take half of F2 out of F1
+
+    calibration = Calibration([1.0] * n, crosstalk=crosstalk)
+    frame = make_frame([2000, 1000] + [0] * (n - 2), again=0x01, atime=0, astep=999)
+    result = calibration.apply(frame)
+    assert result[0] == pytest.approx(1.5)
+    assert result[1] == pytest.approx(1.0)
+
+
+def test_calibration_unread_channels():
+    """Test channels not read in 6 channel mode are NaN."""
+    from as7343 import CHANNELS, SpectralFrame
+    from as7343.calibration import Calibration
+    results = [0x01] + [1000] * 6
+    frame = SpectralFrame.from_results(results, atime=0, astep=999)
+    result = Calibration.default().apply(frame)
+    assert math.isnan(result[CHANNELS.index('F1')])
+    assert not math.isnan(result[CHANNELS.index('VIS')])
+
+
+def test_build_profile(tmp_path):
+    """Test building a profile from frames and loading it back."""
+    from as7343 import CHANNELS
+    from as7343.calibration import Calibration, build_profile
+    n = len(CHANNELS)
+    dark_frames = [make_frame([10 + c for c in range(n)], again=again) for again in (0x01, 0x05) for _ in range(3)]
+    reference_frames = [make_frame([10 + c + 100 * 16 * (c + 1) for c in range(n)])]
+
+    profile = build_profile(dark_frames, reference_frames, name="test")
+    assert profile.dark[16.0] == [10.0 + c for c in range(n)]
+    assert profile.responsivity == pytest.approx([(c + 1) / n for c in range(n)])
+
+    path = str(tmp_path / "profile.json")
+    profile.save(path)
+    loaded = Calibration.load(path)
+    assert loaded.name == "test"
+    assert list(loaded.apply(reference_frames[0])) == pytest.approx([float(n)] * n)
+
+
+def test_calibration_batch():
+    """Test calibrating a batch gives the same results as single frames."""
+    numpy = pytest.importorskip('numpy')
+    from as7343 import CHANNELS
+    from as7343.calibration import Calibration
+    n = len(CHANNELS)
+    crosstalk = numpy.eye(n)
+    crosstalk[2][3] = 0.1
+    calibration = Calibration([0.5 + c for c in range(n)], dark={4: [5] * n, 64: [50] * n}, crosstalk=crosstalk.tolist())
+
+    frames = [make_frame([1000 * (f + 1) + c for c in range(n)], again=again, atime=f) for f, again in enumerate((0x03, 0x07, 0x05))]
+    counts = numpy.array([frame.counts for frame in frames])
+    result = calibration.apply_batch(counts, [frame.astatus for frame in frames], [frame.atime for frame in frames], [frame.astep for frame in frames])
+    expected = numpy.array([calibration.apply(frame) for frame in frames])
+    assert numpy.allclose(result, expected)
@@ -0,0 +1,85 @@
+# noqa D100
+import math
+
+import pytest
+
+
+def planck(wavelength, temperature):
+    wavelength *= 1e-9
+    return 1.0 / (wavelength ** 5 * (math.exp(1.4388e-2 / (wavelength * temperature)) - 1.0))
+
+
+def blackbody(temperature):
+    from as7343 import CHANNELS
+    from as7343.colorimetry import CENTRES
+    return [planck(CENTRES[channel], temperature) if channel in CENTRES else math.nan for channel in CHANNELS]
+
+
+def test_colorimetry_equal_energy():
+    """Test a flat spectrum comes out close to illuminant E."""
+    from as7343 import CHANNELS
+    from as7343.colorimetry import K_M, Colorimetry
+    colour = Colorimetry().measure([1.0] * len(CHANNELS))
+    assert colour.x == pytest.approx(1 / 3, abs=0.005)
+    assert colour.y == pytest.approx(1 / 3, abs=0.005)
+    assert colour.lux == pytest.approx(K_M * colour.Y)
+
+
+def test_colorimetry_blackbody():
+    """Test CCT and chromaticity of blackbody light, ignoring NaN in unused channels."""
+    from as7343.colorimetry import Colorimetry
+    colorimetry = Colorimetry()
+    for temperature in (2856, 4000, 6504):
+        colour = colorimetry.measure(blackbody(temperature))
+        assert colour.cct == pytest.approx(temperature, rel=0.02)
+
+    # Illuminant A
+    colour = colorimetry.measure(blackbody(2856))
+    assert (colour.x, colour.y) == pytest.approx((0.4476, 0.4074), abs=0.005)
+    assert (colour.u, colour.v) == pytest.approx((0.2560, 0.5243), abs=0.005)
+
+
+def test_colorimetry_dark():
+    """Test no light gives NaN chromaticity rather than raising."""
+    from as7343 import CHANNELS
+    from as7343.colorimetry import Colorimetry
+    colour = Colorimetry().measure([0.0] * len(CHANNELS))
+    assert colour.lux == 0.0
+    assert math.isnan(colour.cct) and math.isnan(colour.x)
+
+
+def test_colorimetry_batch():
+    """Test converting a batch gives the same results as single frames."""
+    numpy = pytest.importorskip('numpy')
+    from as7343.colorimetry import Colorimetry
+    colorimetry = Colorimetry(scale=2.0)
+    frames = [blackbody(temperature) for temperature in (2000, 3000, 5000, 8000)]
+    result = colorimetry.measure_batch(numpy.array(frames))
+    for n, frame in enumerate(frames):
+        expected = colorimetry.measure(frame)
+        assert [value[n] for value in result] == pytest.approx(list(expected))
+
+
+def test_colorimetry_12_channels():
+    """Test 12 channel frames use only the channels read, and 18 channel colorimetry refuses them."""
+    from as7343 import CHANNELS, FRAME_INDEX, SpectralFrame
+    from as7343.calibration import Calibration
+    from as7343.colorimetry import Colorimetry
+    colorimetry = Colorimetry(cycles=2)
+    used = {CHANNELS[column] for column in colorimetry._columns}
+    assert used == {'F2', 'F3', 'F4', 'F6', 'FZ', 'FY', 'FXL'}
+
+    # Blackbody light read with 12 channels, NaN in the channels not read
+    values = [value if index >= 0 else math.nan for value, index in zip(blackbody(4000), FRAME_INDEX[2])]
+    colour = colorimetry.measure(values)
+    assert colour.cct == pytest.approx(4000, rel=0.05)
+
+    results = [0] * 14
+    for channel, index in enumerate(FRAME_INDEX[2]):
+        if index >= 0:
+            results[index] = 1000
+    frame = SpectralFrame.from_results(results, 29, 599, cycles=2)
+    values = Calibration.default().apply(frame)
+    assert not math.isnan(colorimetry.measure(values).lux)
+    with pytest.raises(ValueError):
+        Colorimetry().measure(values)
@@ -0,0 +1,152 @@
+# noqa D100
+import pytest
+
+
+def sensor():
+    from as7343 import AS7343
+    from as7343.emulator import Emulator, LightSource
+    as7343 = AS7343(i2c_dev=Emulator(LightSource(level=0.001)))
+    as7343.set_integration_time(5000)
+    as7343.set_measurement_time(3)
+    return as7343
+
+
+def test_frame_record():
+    """Test frames survive the binary framing."""
+    from as7343 import SpectralFrame, StreamFrame
+    from as7343.daemon import FRAME, decode_frame, encode_frame
+    results = [0b10000101, 1, 2, 3, 4, 5, 5, 0b00000101, 6, 7, 8, 9, 0, 0]
+    frame = StreamFrame(42, 1234.5, 3, SpectralFrame.from_results(results, 1, 999, 1234.5))
+    record = encode_frame(2, frame)
+    assert len(record) == FRAME.size == 52
+
+    sensor, decoded = decode_frame(record)
+    assert sensor == 2
+    assert decoded.sequence == 42 and decoded.dropped == 3 and decoded.timestamp == 1234.5
+    assert decoded.data.counts == frame.data.counts
+    assert (decoded.data.gain, decoded.data.saturated, decoded.data.cycles) == (16, True, 2)
+    assert (decoded.data.atime, decoded.data.astep) == (1, 999)
+
+
+def test_client_drop_oldest():
+    """Test a client that falls behind loses its oldest frames, and is told how many."""
+    import socket
+
+    from as7343 import SpectralFrame, StreamFrame
+    from as7343.daemon import _Client, decode_frame, encode_frame
+    a, b = socket.socketpair()
+    client = _Client(a, queue_size=4)
+    for sequence in range(10):
+        client.put(encode_frame(sequence % 2, StreamFrame(sequence, float(sequence), 0, SpectralFrame.from_results([1] + [0] * 6))))
+
+    frames = [decode_frame(client.get(0)) for _ in range(4)]
+    assert [(sensor, frame.sequence) for sensor, frame in frames] == [(0, 6), (1, 7), (0, 8), (1, 9)]
+    # Sequences 0-5 were dropped, three from each sensor
+    assert [frame.dropped for _, frame in frames] == [3, 3, 0, 0]
+    assert client.get(0) is None
+    client.close()
+    b.close()
+
+
+def test_daemon_clients(tmp_path):
+    """Test every client gets the same frames through the AS7343 API."""
+    from as7343 import SpectralFrame
+    from as7343.daemon import Daemon, DaemonClient
+    path = str(tmp_path / "as7343.sock")
+
+    with Daemon(sensor(), path) as daemon:
+        with DaemonClient(path) as first, DaemonClient(path) as second:
+            stream = second.stream(frame=True)
+            sequences = [next(stream).sequence for _ in range(3)]
+            frames = [next(first.stream(frame=True)) for _ in range(3)]
+            assert sequences == sorted(sequences)
+            assert all(isinstance(frame.data, SpectralFrame) for frame in frames)
+            assert daemon.clients == 2
+
+            data = first.get_data()
+            assert len(data) == 1 and data[0]['vis_tl'] > 0
+            assert first.get_data(frame=True).gain == 1024
+
+        with pytest.raises(ValueError):
+            DaemonClient(path, sensor=1)
+
+    assert daemon.error is None
+
+
+class ThreadCheckedMuxBus:
+    """Route transfers to emulated sensors through a TCA9548A, failing if another thread switched channel in between."""
+    def __init__(self, devices):
+        import threading
+        self.devices = devices
+        self.selected = None
+        self.owner = None
+        self.threading = threading
+
+    def write_byte(self, i2c_address, value):
+        self.selected = value.bit_length() - 1 if value else None
+        self.owner = self.threading.get_ident()
+
+    def _device(self):
+        assert self.owner == self.threading.get_ident(), "Mux channel switched by another thread"
+        return self.devices[self.selected]
+
+    def read_i2c_block_data(self, i2c_address, register, length):
+        return self._device().read_i2c_block_data(i2c_address, register, length)
+
+    def write_i2c_block_data(self, i2c_address, register, values):
+        return self._device().write_i2c_block_data(i2c_address, register, values)
+
+
+def test_daemon_shared_bus(tmp_path):
+    """Test sensors behind one multiplexer are streamed from one thread, each frame from its own sensor."""
+    import threading
+
+    from as7343 import AS7343
+    from as7343.daemon import Daemon, DaemonClient
+    from as7343.emulator import Emulator, LightSource
+    from as7343.sensorarray import TCA9548A, MuxChannel
+    bus = ThreadCheckedMuxBus({0: Emulator(LightSource(level=0.001)), 1: Emulator(LightSource(level=0.004))})
+    mux = TCA9548A(bus)
+    sensors = []
+    for channel in (0, 1):
+        as7343 = AS7343(i2c_dev=MuxChannel(bus, mux, channel))
+        as7343.set_gain(16)
+        as7343.set_integration_time(5000)
+        as7343.set_measurement_time(3)
+        sensors.append(as7343)
+
+    path = str(tmp_path / "as7343.sock")
+    with Daemon(sensors, path) as daemon:
+        assert [thread.name for thread in threading.enumerate() if thread.name.startswith("as7343-bus")] == ["as7343-bus0"]
+        with DaemonClient(path, sensor=0) as first, DaemonClient(path, sensor=1) as second:
+            for _ in range(5):
+                dim = first.get_data(frame=True)['VIS']
+                bright = second.get_data(frame=True)['VIS']
+                assert 3.5 < bright / dim < 4.5
+    assert daemon.error is None
+
+
+def test_daemon_single_owner(tmp_path):
+    """Test a second daemon can't take over a running one's socket, but a stale socket is replaced."""
+    import socket
+
+    from as7343.daemon import Daemon, DaemonClient
+    path = str(tmp_path / "as7343.sock")
+
+    with Daemon(sensor(), path):
+        with pytest.raises(FileExistsError):
+            Daemon(sensor(), path).start()
+        with DaemonClient(path) as client:
+            assert client.get_data(frame=True)
+
+    # Bound but nobody listening, as left by a daemon that was killed
+    stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    stale.bind(path)
+    stale.close()
+    with Daemon(sensor(), path):
+        with DaemonClient(path) as client:
+            assert client.get_data(frame=True)
+
+    (tmp_path / "file").write_text("not a socket")
+    with pytest.raises(FileExistsError):
+        Daemon(sensor(), str(tmp_path / "file")).start()
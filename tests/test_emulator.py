@@ -0,0 +1,155 @@
+# noqa D100
+import time
+
+import pytest
+
+
+def fast_sensor(channels=6, **kwargs):
+    """Create an emulated sensor with a ~5ms cycle."""
+    from as7343 import AS7343
+    from as7343.emulator import Emulator
+    bus = Emulator(**kwargs)
+    as7343 = AS7343(i2c_dev=bus)
+    as7343.set_channels(channels)
+    as7343.set_integration_time(5000)
+    as7343.set_measurement_time(3)
+    return as7343, bus
+
+
+@pytest.mark.parametrize('channels', (6, 12, 18))
+def test_emulator_get_data(channels):
+    """Test frames carry the emulated light level for each channel count."""
+    from as7343.emulator import LightSource
+    light = LightSource(levels={'F1': 0.0001, 'NIR': 0.0002}, level=0.0004)
+    as7343, bus = fast_sensor(channels, light=light, combined=False)
+    as7343.set_gain(256)
+
+    frame = as7343.get_data(frame=True)
+    steps = (frame.atime + 1) * (frame.astep + 1)
+    assert frame.cycles == channels // 6
+    assert frame.gain == 256
+    assert not frame.saturated
+    assert frame['NIR'] == int(0.0002 * 256 * steps)
+    assert frame['FZ'] == int(0.0004 * 256 * steps)
+    if channels == 18:
+        assert frame['F1'] == int(0.0001 * 256 * steps)
+    else:
+        assert frame['F1'] == 0
+
+    direct = as7343.get_data(direct=True, frame=True)
+    assert list(direct.counts) == list(frame.counts)
+
+
+def test_emulator_timing():
+    """Test cycles run at the rate set by ATIME, ASTEP and WTIME."""
+    as7343, bus = fast_sensor(combined=False)
+    as7343.set_measurement_time(20)
+
+    as7343.start_measurement()
+    time.sleep(0.2)
+    as7343.stop_measurement()
+    assert 6 <= bus.cycles <= 10
+
+
+def test_emulator_saturation():
+    """Test bright light saturates at high gain but not at low gain."""
+    from as7343.emulator import LightSource
+    as7343, bus = fast_sensor(light=LightSource(level=0.01), combined=False)
+
+    as7343.set_gain(256)
+    assert as7343.get_data(frame=True).saturated
+    assert as7343._as7343.get('STATUS2').ASAT_ANA
+
+    as7343.stop_measurement()
+    as7343.clear_fifo()
+    as7343.set_gain(1)
+    assert not as7343.get_data(frame=True).saturated
+
+
+def test_emulator_overflow():
+    """Test a FIFO left unread overflows and the stream reports dropped frames."""
+    as7343, bus = fast_sensor(combined=False)
+
+    stream = as7343.stream(frame=True)
+    first = next(stream)
+    time.sleep(0.15)
+    assert as7343._as7343.get('STATUS4').FIFO_OV
+    # Frames drained along with the first are yielded before the FIFO is checked again
+    for frame in stream:
+        if frame.dropped:
+            break
+    stream.close()
+    assert first.dropped == 0
+    assert frame.dropped > 0
+
+
+def test_emulator_banks():
+    """Test bank 1 registers can only be reached with REG_BANK set."""
+    from as7343 import PART_ID
+    from as7343.emulator import Emulator
+    bus = Emulator()
+
+    with pytest.raises(OSError):
+        bus.read_i2c_block_data(0x39, 0x5A, 1)
+    bus.write_i2c_block_data(0x39, 0xBF, [0b00010000])
+    assert bus.read_i2c_block_data(0x39, 0x5A, 1) == [PART_ID]
+
+    with pytest.raises(OSError):
+        bus.read_i2c_block_data(0x40, 0x80, 1)
+
+
+def test_emulator_reset():
+    """Test the sensor doesn't respond during a soft reset, and the driver waits it out."""
+    from as7343 import AS7343
+    from as7343.emulator import Emulator
+    bus = Emulator(reset_time=0.005)
+    AS7343(i2c_dev=bus)
+
+    bus.write_i2c_block_data(0x39, 0xFA, [0b00001000])
+    with pytest.raises(OSError):
+        bus.read_i2c_block_data(0x39, 0x80, 1)
+
+
+def test_emulator_little_endian():
+    """Test ASTEP is written least significant byte first."""
+    as7343, bus = fast_sensor(combined=False)
+    as7343.set_integration_time(27800)
+    assert bus.regs[0xD4] | (bus.regs[0xD5] << 8) == 9999
+    assert as7343._as7343.get('ASTEP').ASTEP == pytest.approx(27800)
+
+
+def test_emulator_counters():
+    """Test combined transactions read a frame in fewer transfers than block reads."""
+    pytest.importorskip('smbus2')
+    as7343, bus = fast_sensor(18, combined=False)
+    as7343.get_data()
+    level = 21
+    bus.reset_counters()
+    as7343.drain_fifo(level)
+    assert bus.transactions == 2  # 32 + 10 bytes
+    assert bus.bytes_read == 42
+
+    as7343, bus = fast_sensor(18)
+    as7343.get_data()
+    bus.reset_counters()
+    as7343.drain_fifo(level)
+    assert bus.transactions == 1
+    assert bus.bytes_read == 42
+    assert bus.counts['read', 0xFE] == 1
+
+
+def test_emulator_scheduled_polls():
+    """Test FIFO reads sleep until a frame is due instead of polling for all of it."""
+    from as7343.emulator import ADDRESS
+    as7343, bus = fast_sensor(18, latency=0.0001)
+    as7343.set_integration_time(10000)
+    as7343.set_measurement_time(10)
+
+    as7343.get_data()
+    bus.reset_counters()
+    for _ in range(5):
+        as7343.get_data()
+
+    # Polling every 1ms would take ~30 reads per 30ms frame
+    assert bus.counts['read', ADDRESS['FIFO_LVL']] / 5 <= 6
+    assert as7343._schedule.period == pytest.approx(as7343.get_frame_period(), rel=0.1)
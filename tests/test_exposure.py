@@ -0,0 +1,124 @@
+# noqa D100
+import pytest
+
+
+def simulate(as7343, level):
+    """Build the frame the sensor's current settings would read for a light level."""
+    from array import array
+
+    from as7343 import CHANNELS, SpectralFrame
+    registers = as7343._as7343
+    atime = registers.values['ATIME']
+    astep = registers.values['ASTEP']
+    again = registers.values['CFG1'] & 0b00011111
+    gain = 1 << (again - 1) if again else 0.5
+    steps = (atime + 1) * (astep + 1)
+    full_scale = min(steps, 65535)
+    peak = level * gain * steps
+    astatus = again
+    if peak >= full_scale:
+        astatus |= 0b10000000
+    counts = array('H', [int(min(peak * (n + 1) / len(CHANNELS), full_scale)) for n in range(len(CHANNELS))])
+    return SpectralFrame(counts, astatus, atime, astep)
+
+
+def settle(as7343, control, level, frames=10):
+    """Run the controller until it stops changing the settings, returning the number of frames."""
+    for n in range(frames):
+        if not control.update(simulate(as7343, level)):
+            return n
+    raise AssertionError("Exposure did not settle.")
+
+
+def test_exposure_in_range(smbus):
+    """Test a frame near the target leaves the settings alone."""
+    from as7343 import AS7343
+    from as7343.exposure import AutoExposure
+    as7343 = AS7343()
+    control = AutoExposure(as7343)
+    as7343.set_gain(1)
+    as7343.set_integration_time(65535 * 2.78)
+
+    assert not control.update(simulate(as7343, 0.5))
+
+
+def test_exposure_dim(smbus):
+    """Test a dim scene settles in one frame with more gain."""
+    from as7343 import AS7343
+    from as7343.exposure import AutoExposure
+    as7343 = AS7343()
+    control = AutoExposure(as7343)
+
+    assert settle(as7343, control, 0.0002) == 1
+    fraction = control.measure(simulate(as7343, 0.0002))
+    assert 0.25 <= fraction <= 0.75
+
+
+def test_exposure_saturated(smbus):
+    """Test a sudden bright light recovers from saturation in a few frames."""
+    from as7343 import AS7343
+    from as7343.exposure import AutoExposure
+    as7343 = AS7343()
+    control = AutoExposure(as7343)
+
+    assert settle(as7343, control, 0.0002) == 1
+    assert settle(as7343, control, 1.0) <= 4
+    frame = simulate(as7343, 1.0)
+    assert not frame.saturated
+    assert 0.25 <= control.measure(frame) <= 0.75
+
+
+def test_exposure_long_integration(smbus):
+    """Test integration time beyond the ADC full scale is used before gain."""
+    from as7343 import AS7343
+    from as7343.exposure import STEP_US, AutoExposure
+    control = AutoExposure(AS7343(), max_integration_time=4 * 65535 * STEP_US)
+
+    gain, integration_time = control._solve(0.5 / 4)
+    assert gain == 1
+    assert integration_time == pytest.approx(4 * 65535 * STEP_US, rel=0.001)
+
+
+def test_exposure_slow(smbus):
+    """Test exposure changes are limited to max_step per frame without fast mode."""
+    from as7343 import AS7343
+    from as7343.exposure import AutoExposure
+    as7343 = AS7343()
+    control = AutoExposure(as7343, fast=False, max_step=4)
+    as7343.set_gain(1)
+    as7343.set_integration_time(65535 * 2.78)
+
+    control.update(simulate(as7343, 0.001))
+    assert as7343._as7343.get('CFG1').AGAIN == 4
+
+
+@pytest.mark.parametrize('channels', (12, 18))
+def test_exposure_stream(channels):
+    """Test streamed frames are labelled with the settings they were taken with, as the exposure changes."""
+    from as7343 import AS7343, FRAME_INDEX
+    from as7343.emulator import Emulator, LightSource
+    from as7343.exposure import AutoExposure
+    as7343 = AS7343(i2c_dev=Emulator(LightSource(level=0.001)))
+    as7343.set_channels(channels)
+    read = [channel for channel, index in enumerate(FRAME_INDEX[channels // 6]) if index >= 0]
+    as7343.set_gain(2048)
+    as7343.set_integration_time(5000)
+    as7343.set_measurement_time(3)
+    control = AutoExposure(as7343, max_integration_time=20000)
+
+    gains = set()
+    stream = control.stream()
+    for _ in range(12):
+        frame = next(stream)
+        data = frame.data
+        gains.add(data.gain)
+        if not data.saturated:
+            # Counts only match the light level with the gain and integration time they were taken with,
+            # in every cycle
+            steps = data.gain * (data.atime + 1) * (data.astep + 1)
+            assert [data.counts[channel] / steps for channel in read] == pytest.approx([0.001] * len(read), rel=0.01)
+    stream.close()
+    as7343.stop_measurement()
+
+    assert len(gains) > 1
+    assert 0.25 <= control.measure(data) <= 0.75
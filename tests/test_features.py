@@ -9,9 +9,9 @@ def test_set_integration_time(smbus):
 
     # Integration time is stored as 2.78us per lsb
     # so returned values experience quantization
-    # int(50000/2.78)*2.78 == 49998.299
+    # round(50000/2.78)*2.78 == 50001.08
     as7343.set_integration_time(50000)
-    assert round(as7343._as7343.ASTEP.get_ASTEP(), 1) == 49998.3
+    assert round(as7343._as7343.ASTEP.get_ASTEP(), 1) == 50001.1
     assert as7343._as7343.ATIME.get_ATIME() == 0  # Repeat once
 
     # For example: 27800 will alias to 27799.99
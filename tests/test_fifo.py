@@ -0,0 +1,81 @@
+# noqa D100
+import pytest
+
+
+def test_drain_fifo_burst(smbus):
+    """Test the FIFO is drained in one burst and decoded little-endian."""
+    from as7343 import AS7343
+    as7343 = AS7343()
+    i2c = as7343._as7343._i2c
+
+    words = [0x0042, 0x1234, 0xBEEF, 0x0001, 0xFFFF, 0x0100, 0x00FF]
+    i2c.fifo = list(words)
+    i2c.regs[0xFD] = len(words)
+
+    assert list(as7343.read_fifo()) == words
+    assert i2c.regs[0xFD] == 0
+
+
+def test_drain_fifo_transactions(smbus):
+    """Test an 18 channel frame only needs two 32 byte SMBus reads."""
+    from as7343 import AS7343
+    as7343 = AS7343()
+    i2c = as7343._as7343._i2c
+
+    reads = []
+    read_i2c_block_data = i2c.read_i2c_block_data
+
+    def counting_read(i2c_address, register, length):
+        reads.append((register, length))
+        return read_i2c_block_data(i2c_address, register, length)
+
+    i2c.read_i2c_block_data = counting_read
+    i2c.fifo = list(range(21))
+
+    assert as7343.drain_fifo(21) == tuple(range(21))
+    assert reads == [(0xFE, 32), (0xFE, 10)]
+
+
+def test_drain_fifo_empty(smbus):
+    """Test draining an empty FIFO does not touch the bus."""
+    from as7343 import AS7343
+    as7343 = AS7343()
+
+    assert as7343.drain_fifo(0) == ()
+
+
+def test_get_data_direct(smbus):
+    """Test reading the DATA registers gives the same frame as the FIFO."""
+    from as7343 import AS7343
+    as7343 = AS7343()
+    i2c = as7343._as7343._i2c
+
+    as7343.set_channels(18)
+    astatus = 0b10000011
+    values = [100 * (n + 1) for n in range(18)]
+
+    i2c.regs[0x90] = 0b01000000  # STATUS2.AVALID
+    i2c.regs[0x94] = astatus
+    for n, value in enumerate(values):
+        i2c.regs[0x95 + n * 2] = value & 0xff
+        i2c.regs[0x96 + n * 2] = value >> 8
+
+    direct = as7343.get_data(direct=True)
+
+    i2c.fifo = [astatus] + values[0:6] + [astatus] + values[6:12] + [astatus] + values[12:18]
+    i2c.regs[0xFD] = 21
+    fifo = as7343.get_data()
+
+    assert direct == fifo
+    assert direct[0]['fz'] == int(100 * 4.88)
+    assert direct[2]['vis_br'] == 1800
+    assert direct[0]['saturated'] and direct[0]['gain'] == 4
+
+
+def test_get_data_direct_timeout(smbus):
+    """Test the direct read times out without STATUS2.AVALID."""
+    from as7343 import AS7343
+    as7343 = AS7343()
+
+    with pytest.raises(TimeoutError):
+        as7343.get_data(timeout=0.1, direct=True)
@@ -0,0 +1,138 @@
+# noqa D100
+import math
+
+import pytest
+
+
+def sine(frequency, sample_rate, count, mean=128, amplitude=64):
+    return [int(round(mean + amplitude * math.sin(2 * math.pi * frequency * n / sample_rate))) for n in range(count)]
+
+
+def test_flicker_configure(smbus):
+    """Test FD_TIME, FD_GAIN and 8-bit FIFO mode are programmed."""
+    from as7343 import AS7343
+    from as7343.flicker import FlickerDetector
+    as7343 = AS7343()
+    flicker = FlickerDetector(as7343, fd_time=0x1FF, gain=64)
+    i2c = as7343._as7343._i2c
+
+    assert i2c.regs[0xE0] == 0xFF
+    assert i2c.regs[0xE2] == (7 << 3) | 0x01  # FD_GAIN 64x, FD_TIME[10:8]
+    assert i2c.regs[0xD6] & 0b10000000 == 0   # FD_TIME > 255, 16-bit samples
+
+    flicker.configure(fd_time=200)
+    assert i2c.regs[0xD6] & 0b10000000
+    assert flicker.sample_rate == pytest.approx(1000000 / (201 * 2.78))
+
+    with pytest.raises(ValueError):
+        flicker.configure(fd_time=2048)
+
+
+def test_flicker_status(smbus):
+    """Test the on-chip 100Hz/120Hz verdicts are decoded."""
+    from as7343 import AS7343
+    from as7343.flicker import FlickerDetector
+    as7343 = AS7343()
+    flicker = FlickerDetector(as7343)
+    flicker.enable()
+    i2c = as7343._as7343._i2c
+
+    assert i2c.regs[0x80] & 0b01000000  # FDEN
+
+    i2c.regs[0xE3] = 0b00101101  # Valid, 120Hz valid and clear, 100Hz valid and detected
+    status = flicker.get_status()
+    assert status.valid
+    assert not status.saturated
+    assert status.hz100 is True
+    assert status.hz120 is False
+
+    i2c.regs[0xE3] = 0
+    assert flicker.get_status().hz100 is None
+
+
+def test_flicker_raw_samples(smbus):
+    """Test raw 8-bit samples are read from the FIFO, two per entry."""
+    from as7343 import AS7343
+    from as7343.flicker import FlickerDetector
+    as7343 = AS7343()
+    as7343.start_measurement()
+    flicker = FlickerDetector(as7343)
+    i2c = as7343._as7343._i2c
+
+    flicker.enable(raw=True)
+    assert i2c.regs[0xDF] & 0b10000000  # FIFO_WRITE_FD
+    assert i2c.regs[0x80] & 0b00010010 == 0  # SMUXEN and SP_EN off
+
+    i2c.fifo = [(n * 2) | ((n * 2 + 1) << 8) for n in range(32)]
+    i2c.regs[0xFD] = 32
+    samples = flicker.read_samples(64, timeout=0.1)
+    assert samples.typecode == 'B'
+    assert list(samples) == list(range(64))
+
+    flicker.disable()
+    assert i2c.regs[0xDF] & 0b10000000 == 0
+    assert as7343.running
+
+
+def test_flicker_interrupt(smbus):
+    """Test streaming samples arms the FIFO interrupt and waits on it, even after a direct read."""
+    import threading
+
+    from as7343 import AS7343
+    from as7343.flicker import FlickerDetector
+    from as7343.interrupt import FakeInterrupt
+    interrupt = FakeInterrupt()
+    as7343 = AS7343(interrupt=interrupt)
+    as7343._arm_interrupt(True)
+    flicker = FlickerDetector(as7343)
+    i2c = as7343._as7343._i2c
+
+    def samples_ready():
+        i2c.fifo = [(n * 2) | ((n * 2 + 1) << 8) for n in range(16)]
+        i2c.regs[0xFD] = 16
+        interrupt.trigger()
+
+    timer = threading.Timer(0.05, samples_ready)
+    timer.start()
+    samples = flicker.read_samples(32, timeout=1.0)
+    timer.join()
+
+    assert list(samples) == list(range(32))
+    assert as7343._as7343.INTERNAB.get_FIEN() == 1
+    assert interrupt.waits >= 1
+
+
+def test_flicker_analyse():
+    """Test the flicker frequency and depth are found between FFT bins."""
+    from as7343.flicker import analyse, goertzel
+    sample_rate = 1000000 / (256 * 2.78)
+    samples = sine(97.3, sample_rate, 512)
+
+    result = analyse(samples, sample_rate)
+    assert result.frequency == pytest.approx(97.3, abs=0.5)
+    assert result.depth == pytest.approx(0.5, abs=0.1)
+    assert result.percent == pytest.approx(50, abs=1)
+
+    assert goertzel(samples, 97.3, sample_rate) == pytest.approx(64, rel=0.1)
+    assert goertzel(samples, 300, sample_rate) < 5
+
+
+def test_flicker_analyse_numpy():
+    """Test numpy's FFT agrees with the pure Python DFT."""
+    pytest.importorskip('numpy')
+    import sys
+
+    from as7343.flicker import analyse
+    sample_rate = 1000.0
+    samples = sine(120, sample_rate, 256)
+    result = analyse(samples, sample_rate)
+
+    numpy = sys.modules['numpy']
+    sys.modules['numpy'] = None
+    try:
+        fallback = analyse(samples, sample_rate)
+    finally:
+        sys.modules['numpy'] = numpy
+
+    assert result.frequency == pytest.approx(fallback.frequency)
+    assert result.amplitude == pytest.approx(fallback.amplitude)
@@ -0,0 +1,86 @@
+# noqa D100
+from array import array
+
+import pytest
+
+
+def test_frame_from_results():
+    """Test FIFO results are mapped into channel order."""
+    from as7343 import CHANNELS, SpectralFrame
+
+    results = [0x03, 10, 11, 12, 13, 14, 15,   # FZ FY FXL NIR VIS VIS
+               0x83, 20, 21, 22, 23, 24, 25,   # F2 F3 F4 F6
+               0x03, 30, 31, 32, 33, 34, 35]   # F1 F7 F8 F5
+    frame = SpectralFrame.from_results(results, atime=1, astep=999, timestamp=123.0)
+
+    assert dict(zip(CHANNELS, frame.counts)) == {
+        'F1': 30, 'F2': 20, 'F3': 21, 'F4': 22, 'F5': 33, 'F6': 23, 'F7': 31, 'F8': 32,
+        'FZ': 10, 'FY': 11, 'FXL': 12, 'NIR': 13, 'VIS': 14
+    }
+    assert frame.saturated
+    assert frame.gain == 4
+    assert (frame.atime, frame.astep, frame.timestamp) == (1, 999, 123.0)
+    assert frame['NIR'] == 13
+    assert isinstance(frame.counts, array) and frame.counts.typecode == 'H'
+
+
+def test_frame_six_channels():
+    """Test channels not read in 6 channel mode are zero."""
+    from as7343 import SpectralFrame
+
+    frame = SpectralFrame.from_results([0x00, 10, 11, 12, 13, 14, 15])
+
+    assert frame['FZ'] == 10
+    assert frame['F1'] == 0
+    assert not frame.saturated
+    assert frame.gain == 0.5
+
+
+def test_frame_raw_is_zero_copy():
+    """Test raw() is a view onto the counts."""
+    from as7343 import SpectralFrame
+
+    frame = SpectralFrame.from_results([0x03, 10, 11, 12, 13, 14, 15])
+    raw = frame.raw()
+    frame.counts[8] = 999
+
+    assert raw[8] == 999
+
+
+def test_frame_matches_get_data(smbus):
+    """Test compensated frame values agree with the ResultCycle dicts."""
+    from as7343 import AS7343
+    as7343 = AS7343()
+    i2c = as7343._as7343._i2c
+    as7343.set_channels(18)
+
+    results = [0x03, 10, 11, 12, 13, 14, 15, 0x03, 20, 21, 22, 23, 24, 25, 0x03, 30, 31, 32, 33, 34, 35]
+
+    i2c.fifo = list(results)
+    i2c.regs[0xFD] = 21
+    data = as7343.get_data()
+
+    i2c.fifo = list(results)
+    i2c.regs[0xFD] = 21
+    frame = as7343.get_data(frame=True)
+
+    merged = {}
+    for cycle in data:
+        merged.update(cycle)
+    values = frame.as_dict()
+
+    for channel in ('f1', 'f2', 'f3', 'f4', 'f5', 'f6', 'f7', 'f8', 'fz', 'fy', 'fxl', 'nir'):
+        assert values[channel] == merged[channel]
+    assert frame.astep == as7343._as7343.values['ASTEP']
+
+
+def test_frame_numpy():
+    """Test the optional NumPy view."""
+    numpy = pytest.importorskip('numpy')
+    from as7343 import SpectralFrame
+
+    frame = SpectralFrame.from_results([0x03, 10, 11, 12, 13, 14, 15])
+    view = frame.numpy()
+
+    assert view.dtype == numpy.uint16
+    assert view[8] == 10
@@ -0,0 +1,137 @@
+# noqa D100
+import math
+
+import pytest
+
+
+def test_saturated_channels():
+    """Test channels are flagged at full scale, or near the top of a cycle that reports saturation."""
+    from as7343 import CHANNELS
+    from as7343.hdr import saturated_channels
+
+    # One cycle: ASTATUS, then FZ, FY, FXL, NIR, 2xVIS
+    results = [0b00000100, 100, 200, 300, 400, 500, 600]
+    assert not any(saturated_channels(results, 1))
+
+    results[3] = 65535
+    flags = dict(zip(CHANNELS, saturated_channels(results, 1)))
+    assert flags['FXL'] and not flags['FZ'] and not flags['NIR']
+
+    # Analog saturation below full scale, only the brightest channels are taken
+    results = [0b10000100, 100, 200, 30000, 400, 20000, 20000]
+    flags = dict(zip(CHANNELS, saturated_channels(results, 1)))
+    assert flags['FXL'] and flags['VIS'] and not flags['FY']
+
+
+def test_merge():
+    """Test saturated exposures are dropped and the rest weighted by gain and integration steps."""
+    from as7343 import CHANNELS, SpectralFrame
+    from as7343.hdr import merge
+    low = SpectralFrame.from_results([0b00000001, 10, 20, 30, 40, 50, 50], 0, 99, 1.0, 1)    # 1x, 100 steps
+    high = SpectralFrame.from_results([0b10000101, 160, 320, 65535, 640, 800, 800], 0, 99, 2.0, 1)  # 16x
+    flags = [[False] * len(CHANNELS), [name == 'FXL' for name in CHANNELS]]
+
+    merged = merge([low, high], flags)
+    values = dict(zip(CHANNELS, merged.values))
+    assert merged.timestamp == 2.0
+    assert math.isclose(values['FZ'], (10 + 160) / (100 + 1600))
+    assert math.isclose(values['FXL'], 30 / 100)
+    assert math.isnan(values['F1'])
+    assert merged.saturated == ()
+
+    flags[0] = flags[1]
+    merged = merge([low, high], flags)
+    assert merged.saturated == ('FXL',)
+    assert math.isclose(merged.values[CHANNELS.index('FXL')], 30 / 100)
+
+
+def test_hdr_stream():
+    """Test a bracket runs back to back, with each exposure's own settings, and merges to the light level."""
+    from as7343 import AS7343, CHANNELS
+    from as7343.emulator import Emulator, LightSource
+    from as7343.hdr import HDR
+    light = LightSource(levels={'FZ': 0.01, 'NIR': 0.00005}, level=0.0001)
+    bus = Emulator(light)
+    as7343 = AS7343(i2c_dev=bus)
+    as7343.set_measurement_time(3)
+    # Long enough cycles that a busy host doesn't miss the last one and start over
+    hdr = HDR(as7343, ((1, 20000), (16, 20000), (256, 20000)))
+
+    stream = hdr.stream()
+    for _ in range(3):
+        merged = next(stream)
+        assert [frame.gain for frame in merged.frames] == [1, 16, 256]
+        values = dict(zip(CHANNELS, merged.values))
+        assert math.isclose(values['FZ'], 0.01, rel_tol=0.02)
+        assert math.isclose(values['NIR'], 0.00005, rel_tol=0.05)
+        assert math.isclose(values['FY'], 0.0001, rel_tol=0.05)
+        # FZ is too bright for 256x, the others aren't
+        assert merged.frames[2].saturated
+        assert merged.saturated == ()
+    stream.close()
+    assert hdr.restarts == 0
+
+    merged = hdr.get_data()
+    assert len(merged.frames) == 3
+
+
+@pytest.mark.parametrize('channels', (12, 18))
+def test_hdr_stream_channels(channels):
+    """Test each exposure covers every cycle of its frame with 12 and 18 channels."""
+    from as7343 import AS7343, CHANNELS, FRAME_INDEX
+    from as7343.emulator import Emulator, LightSource
+    from as7343.hdr import HDR
+    as7343 = AS7343(i2c_dev=Emulator(LightSource(level=0.0001)))
+    as7343.set_channels(channels)
+    as7343.set_measurement_time(3)
+    # Long enough cycles that a busy host doesn't miss the last one and start over
+    hdr = HDR(as7343, ((1, 20000), (16, 20000), (256, 20000)))
+
+    stream = hdr.stream()
+    for _ in range(3):
+        merged = next(stream)
+        assert [frame.gain for frame in merged.frames] == [1, 16, 256]
+        for channel, index in zip(CHANNELS, FRAME_INDEX[channels // 6]):
+            if index >= 0:
+                assert math.isclose(merged.values[CHANNELS.index(channel)], 0.0001, rel_tol=0.05)
+    stream.close()
+    assert hdr.restarts == 0
+
+
+def test_hdr_restarts():
+    """Test the bracket gives up once it has started over too many times in a row."""
+    from as7343 import AS7343
+    from as7343.emulator import Emulator, LightSource
+    from as7343.hdr import HDR, MAX_RESTARTS
+    as7343 = AS7343(i2c_dev=Emulator(LightSource(level=0.0001)))
+    as7343.set_measurement_time(3)
+    hdr = HDR(as7343, ((1, 5000), (16, 5000)))
+
+    # Expect a gain no frame will report
+    write = hdr._write
+
+    def wrong_gain(index):
+        atime, astep, _, period = write(index)
+        return atime, astep, 31, period
+
+    hdr._write = wrong_gain
+    with pytest.raises(RuntimeError):
+        hdr.get_data()
+    assert hdr.restarts == MAX_RESTARTS + 1
+
+
+@pytest.mark.parametrize('channels', (6, 18))
+def test_hdr_instrumentation(channels):
+    """Test HDR runs with instrumentation wrapping the sensor's waits."""
+    from as7343 import AS7343
+    from as7343.emulator import Emulator, LightSource
+    from as7343.hdr import HDR
+    as7343 = AS7343(i2c_dev=Emulator(LightSource(level=0.0001)))
+    as7343.set_channels(channels)
+    as7343.set_measurement_time(3)
+    as7343.start_instrumentation()
+    hdr = HDR(as7343, ((1, 20000), (16, 20000)))
+
+    merged = hdr.get_data()
+    assert [frame.gain for frame in merged.frames] == [1, 16]
+    assert as7343.stats()['transactions'] > 0
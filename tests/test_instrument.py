@@ -0,0 +1,88 @@
+# noqa D100
+import pytest
+
+
+def fast_sensor():
+    from as7343 import AS7343
+    from as7343.emulator import Emulator
+    as7343 = AS7343(i2c_dev=Emulator(combined=False))
+    as7343.set_integration_time(2780)
+    as7343.set_measurement_time(2.78)
+    return as7343
+
+
+def test_instrument_stats():
+    """Test phase timings and bus use are recorded per frame."""
+    as7343 = fast_sensor()
+    assert as7343.stats() is None
+
+    frames = []
+    as7343.start_instrumentation(frames.append)
+    for _ in range(3):
+        as7343.get_data()
+    as7343.get_data(direct=True, frame=True)
+
+    stats = as7343.stats()
+    assert stats['frames'] == 4
+    assert stats['phases']['wait']['count'] == 4
+    assert stats['phases']['drain']['sum'] > 0
+    assert stats['transactions'] >= 8
+    assert len(frames) == 4
+    assert sum(frame.transactions for frame in frames) == stats['transactions']
+    assert frames[0].wait > 0
+
+
+def test_instrument_timeout():
+    """Test timeouts are counted."""
+    as7343 = fast_sensor()
+    as7343.set_integration_time(100000)
+    as7343.start_instrumentation()
+
+    with pytest.raises(TimeoutError):
+        as7343.get_data(timeout=0.01)
+    assert as7343.stats()['timeouts'] == 1
+
+
+def test_instrument_overflow():
+    """Test FIFO overflows while streaming are counted."""
+    import time
+    as7343 = fast_sensor()
+    as7343.start_instrumentation()
+
+    stream = as7343.stream()
+    next(stream)
+    time.sleep(0.1)
+    # Frames drained along with the first are yielded before the FIFO is checked again
+    for frame in stream:
+        if frame.dropped:
+            break
+    stream.close()
+    assert as7343.stats()['overflows'] == 1
+
+
+def test_instrument_stop():
+    """Test stopping removes the wrappers and the counting bus."""
+    from as7343 import AS7343
+    as7343 = fast_sensor()
+    bus = as7343._as7343._i2c
+    as7343.start_instrumentation()
+    assert as7343._as7343._i2c is not bus
+
+    as7343.stop_instrumentation()
+    assert as7343._as7343._i2c is bus
+    assert as7343.drain_fifo.__func__ is AS7343.drain_fifo
+    assert as7343.stats() is None
+
+
+def test_instrument_prometheus():
+    """Test the Prometheus text format output."""
+    as7343 = fast_sensor()
+    instrumentation = as7343.start_instrumentation()
+    as7343.get_data()
+
+    text = instrumentation.prometheus(labels={'sensor': '1'})
+    assert '# TYPE as7343_frames_total counter' in text
+    assert 'as7343_frames_total{sensor="1"} 1' in text
+    assert 'as7343_i2c_bytes_total{sensor="1",direction="read"}' in text
+    assert 'as7343_phase_seconds_bucket{sensor="1",phase="wait",le="+Inf"} 1' in text
+    assert 'as7343_phase_seconds_count{sensor="1",phase="decode"} 1' in text
@@ -0,0 +1,74 @@
+# noqa D100
+import threading
+
+import pytest
+
+
+def count_reads(i2c, register):
+    """Wrap the fake bus so reads from register are counted."""
+    reads = []
+    read_i2c_block_data = i2c.read_i2c_block_data
+
+    def counting_read(i2c_address, reg, length):
+        if reg == register:
+            reads.append(reg)
+        return read_i2c_block_data(i2c_address, reg, length)
+
+    i2c.read_i2c_block_data = counting_read
+    return reads
+
+
+def test_interrupt_setup(smbus):
+    """Test the FIFO threshold and interrupt enables are programmed."""
+    from as7343 import AS7343
+    from as7343.interrupt import FakeInterrupt
+    as7343 = AS7343(interrupt=FakeInterrupt())
+
+    as7343.set_channels(18)
+    assert as7343._as7343.CFG8.get_FIFO_TH() == 16
+    assert as7343._as7343.PERS.get_APERS() == 0
+
+    as7343._arm_interrupt(False)
+    assert as7343._as7343.INTERNAB.get_FIEN() == 1
+    assert as7343._as7343.INTERNAB.get_SP_IEN() == 0
+
+    as7343._arm_interrupt(True)
+    assert as7343._as7343.INTERNAB.get_FIEN() == 0
+    assert as7343._as7343.INTERNAB.get_SP_IEN() == 1
+
+
+def test_get_data_interrupt(smbus):
+    """Test get_data blocks on the interrupt rather than polling FIFO_LVL."""
+    from as7343 import AS7343
+    from as7343.interrupt import FakeInterrupt
+    interrupt = FakeInterrupt()
+    as7343 = AS7343(interrupt=interrupt)
+    i2c = as7343._as7343._i2c
+    reads = count_reads(i2c, 0xFD)
+
+    def frame_ready():
+        i2c.fifo = [0x03, 1, 2, 3, 4, 5, 6]
+        i2c.regs[0xFD] = 7
+        interrupt.trigger()
+
+    timer = threading.Timer(0.05, frame_ready)
+    timer.start()
+    results = as7343.get_data(timeout=1.0)
+    timer.join()
+
+    assert results[0]['nir'] == 4
+    assert len(reads) <= 3
+    assert i2c.regs[0x93] == 0b00001100  # FINT and AINT written to clear them
+
+
+def test_get_data_interrupt_timeout(smbus):
+    """Test a missing interrupt still times out."""
+    from as7343 import AS7343
+    from as7343.interrupt import FakeInterrupt
+    interrupt = FakeInterrupt()
+    as7343 = AS7343(interrupt=interrupt)
+
+    with pytest.raises(TimeoutError):
+        as7343.get_data(timeout=0.25)
+
+    assert interrupt.waits <= 4
@@ -0,0 +1,109 @@
+# noqa D100
+import csv
+import json
+
+import pytest
+
+
+def sensor():
+    from as7343 import AS7343
+    from as7343.emulator import Emulator, LightSource
+    return AS7343(i2c_dev=Emulator(LightSource(level=0.001)))
+
+
+def test_logger_csv(tmp_path, capsys):
+    """Test the CLI configures the sensor and writes a CSV row per frame."""
+    from as7343 import CHANNELS
+    from as7343.logger import FIELDS, main
+    as7343 = sensor()
+    path = tmp_path / "log.csv"
+    summary = main(["--gain", "16", "--integration-time", "5000", "--measurement-time", "3", "--channels", "6",
+                    "--output", str(path), "--frames", "5"], sensor=as7343)
+
+    assert as7343._as7343.get('CFG1').AGAIN == 16
+    assert as7343._channel_count == 6
+    assert not as7343.running
+
+    with open(path, newline="") as f:
+        rows = list(csv.DictReader(f))
+    assert tuple(rows[0]) == FIELDS
+    assert [int(row['sequence']) for row in rows] == [0, 1, 2, 3, 4]
+    assert all(row['gain'] == '16' for row in rows)
+    assert int(rows[0]['VIS']) > 0 and rows[0]['F1'] == '0'
+    assert set(CHANNELS) <= set(rows[0])
+
+    assert summary.frames == 5
+    assert "5 frames" in capsys.readouterr().err
+
+
+def test_logger_rotate(tmp_path):
+    """Test files rotate by size, for both text and recordings."""
+    from as7343 import StreamFrame
+    from as7343.logger import RECORD_SIZE, RotatingLog
+    from as7343.recorder import Recording
+    as7343 = sensor()
+    as7343.set_integration_time(5000)
+    as7343.set_measurement_time(3)
+    stream = as7343.stream(frame=True)
+    frames = [next(stream) for _ in range(10)]
+    as7343.stop_measurement()
+
+    with RotatingLog(str(tmp_path / "log.ndjson"), 'ndjson', max_bytes=600) as log:
+        for frame in frames:
+            log.write(frame)
+    lines = [json.loads(line) for path in log.paths for line in open(path)]
+    assert len(log.paths) > 1
+    assert [line['sequence'] for line in lines] == list(range(10))
+
+    with RotatingLog(str(tmp_path / "log.rec"), 'rec', max_bytes=RECORD_SIZE * 4) as log:
+        for frame in frames:
+            log.write(frame)
+    assert [path.rsplit("-", 1)[1] for path in log.paths] == ["0001.rec", "0002.rec", "0003.rec"]
+    with Recording(log.paths[2]) as recording:
+        assert len(recording) == 2
+        assert recording.frame(1).counts == frames[9].data.counts
+
+    # Rotating by time uses frame timestamps
+    with RotatingLog(str(tmp_path / "timed.csv"), 'csv', max_seconds=10) as log:
+        for n, frame in enumerate(frames):
+            log.write(StreamFrame(n, n * 4.0, 0, frame.data))
+    assert len(log.paths) == 4
+
+    with pytest.raises(ValueError):
+        RotatingLog("-", 'rec')
+
+
+def test_logger_fresh_files(tmp_path, monkeypatch):
+    """Test runs never append to or overwrite earlier files, and full recordings roll over."""
+    from as7343 import logger
+    from as7343.logger import RECORD_SIZE, RotatingLog
+    from as7343.recorder import Recording
+    as7343 = sensor()
+    as7343.set_integration_time(5000)
+    as7343.set_measurement_time(3)
+    stream = as7343.stream(frame=True)
+    frames = [next(stream) for _ in range(6)]
+    as7343.stop_measurement()
+
+    # A second run numbers on from the first
+    for _ in range(2):
+        with RotatingLog(str(tmp_path / "log.rec"), 'rec', max_bytes=RECORD_SIZE * 4) as log:
+            for frame in frames:
+                log.write(frame)
+    assert [path.rsplit("-", 1)[1] for path in log.paths] == ["0003.rec", "0004.rec"]
+    with Recording(log.paths[0]) as recording:
+        assert len(recording) == 4
+
+    # An unrotated recording starts afresh, then rolls over once full
+    monkeypatch.setattr(logger, "RECORD_CAPACITY", 4)
+    path = str(tmp_path / "single.rec")
+    for _ in range(2):
+        with RotatingLog(path, 'rec') as log:
+            for frame in frames:
+                log.write(frame)
+    assert log.paths == [path, str(tmp_path / "single-0002.rec")]
+    with Recording(path) as recording:
+        assert len(recording) == 4
+        assert recording.frame(0).counts == frames[0].data.counts
+    with Recording(log.paths[1]) as recording:
+        assert len(recording) == 2
@@ -0,0 +1,89 @@
+# noqa D100
+import pytest
+
+
+def monitored_sensor(level=0.0004, **kwargs):
+    """Create an emulated sensor with a ~5ms cycle."""
+    from as7343 import AS7343
+    from as7343.emulator import Emulator, LightSource
+    light = LightSource(level=level)
+    bus = Emulator(light, **kwargs)
+    as7343 = AS7343(i2c_dev=bus)
+    as7343.set_gain(256)
+    as7343.set_integration_time(5000)
+    as7343.set_measurement_time(3)
+    return as7343, bus, light
+
+
+def test_persistence_code():
+    """Test persistence counts round up to the nearest APERS value."""
+    from as7343.monitor import persistence_code
+    assert persistence_code(1) == 1
+    assert persistence_code(4) == 4
+    assert persistence_code(60) == 15
+    with pytest.raises(ValueError):
+        persistence_code(61)
+
+
+def test_monitor_crossing():
+    """Test a crossing is reported only once the light leaves the window."""
+    from as7343.monitor import ThresholdMonitor
+    as7343, bus, light = monitored_sensor()
+    steps = 1800  # 5000us in 2.78us steps
+    level = int(0.0004 * 256 * steps)
+
+    monitor = ThresholdMonitor(as7343, 'VIS', low=level // 2, high=level * 2, persistence=2)
+    with monitor:
+        assert monitor.wait(timeout=0.1) is None
+
+        light.level = 0.0012
+        crossing = monitor.wait(timeout=1.0)
+        assert crossing.above and not crossing.below
+        assert crossing.value > level * 2
+        assert crossing.gain == 256
+
+    # Settings are put back
+    assert as7343._as7343.get('PERS').APERS == 0
+    assert as7343._as7343.get('INTERNAB').SP_IEN == 0
+
+
+def test_monitor_sleep_after_interrupt():
+    """Test the sensor stops measuring after a crossing until it's cleared."""
+    import time
+
+    from as7343.monitor import ThresholdMonitor
+    as7343, bus, light = monitored_sensor(level=0.002)
+
+    with ThresholdMonitor(as7343, 'FY', low=0, high=500) as monitor:
+        assert monitor.wait(timeout=1.0).above
+        assert as7343._as7343.get('STATUS4').SAI_ACT
+        cycles = bus.cycles
+        time.sleep(0.05)
+        assert bus.interrupt()
+        assert bus.cycles == cycles
+
+        monitor._clear()
+        assert not as7343._as7343.get('STATUS4').SAI_ACT
+        assert monitor.wait(timeout=1.0) is not None
+        assert bus.cycles > cycles
+
+
+def test_monitor_run_rearms():
+    """Test run() re-centres the window after each crossing."""
+    from as7343.monitor import ThresholdMonitor
+    as7343, bus, light = monitored_sensor(level=0.0001)
+    crossings = []
+
+    def changed(crossing):
+        crossings.append(crossing)
+        if len(crossings) == 2:
+            return False
+        light.level = 0.0004
+
+    ThresholdMonitor(as7343, 'VIS', low=0, high=0).run(changed, margin=0.1, timeout=1.0)
+    assert len(crossings) == 2
+    # The second crossing is against the window around the first level
+    first, second = crossings
+    assert second.low == int(first.value * 0.9)
+    assert second.above and second.value > first.value * 3
+    assert not as7343.running
@@ -0,0 +1,85 @@
+# noqa D100
+import pytest
+
+
+def test_solve_integration_time():
+    """Test ATIME and ASTEP land as close as possible to the time asked for."""
+    from as7343 import STEP_US, solve_integration_time
+    assert solve_integration_time(27800) == (0, 9999)
+    assert solve_integration_time(2.78) == (0, 0)
+
+    for time_us in (50000, 182187.3, 200000, 1000000, 46639948.8):
+        atime, astep = solve_integration_time(time_us)
+        assert 0 <= atime <= 255 and 0 <= astep <= 65534
+        steps = (atime + 1) * (astep + 1)
+        assert abs(steps * STEP_US - time_us) <= (atime + 1) * STEP_US / 2
+
+    with pytest.raises(ValueError):
+        solve_integration_time(46639948.8 * 1.01)
+
+
+def test_solve_integration_time_exact():
+    """Test a larger ATIME is used when it lands exactly, and every solver agrees."""
+    from as7343 import AS7343, STEP_US, solve_integration_time
+    from as7343.emulator import Emulator
+    from as7343.exposure import AutoExposure
+    from as7343.profile import Profile
+
+    # 100001 steps is 2 x 50000 (1 over) with the smallest ATIME, but exactly 11 x 9091
+    assert solve_integration_time(100001 * STEP_US) == (10, 9090)
+
+    as7343 = AS7343(i2c_dev=Emulator())
+    as7343.set_integration_time(100001 * STEP_US)
+    assert (as7343._as7343.get('ATIME').ATIME, as7343._as7343.values['ASTEP']) == (10, 9090)
+    assert Profile("p", integration_time=100001 * STEP_US).astep == 9090
+
+    as7343 = AS7343(i2c_dev=Emulator())
+    control = AutoExposure(as7343)
+    control.solve = lambda frame: (16, 100001 * STEP_US)
+    assert control.update(None)
+    assert (as7343._as7343.get('ATIME').ATIME, as7343._as7343.values['ASTEP']) == (10, 9090)
+
+
+def test_profile_apply():
+    """Test applying a profile writes only what changed, in as few transfers as possible."""
+    from as7343 import AS7343
+    from as7343.emulator import Emulator
+    from as7343.profile import Profile
+    bus = Emulator()
+    as7343 = AS7343(i2c_dev=bus)
+    bright = Profile("bright", gain=4, integration_time=10000, measurement_time=20, channels=18)
+    dim = Profile("dim", gain=512, integration_time=100000, measurement_time=100, channels=18, led=True, led_current=8)
+
+    bright.apply(as7343)
+    assert as7343._as7343.get('CFG1').AGAIN == 4
+    assert as7343._as7343.get('CFG20').auto_SMUX == 18
+    assert (as7343._as7343.values['ATIME'], as7343._as7343.values['ASTEP']) == (bright.atime, bright.astep)
+    assert as7343._read_cycles == 3
+
+    as7343.start_measurement()
+    bus.reset_counters()
+    assert dim.apply(as7343)
+    # CFG1, ASTEP, WTIME and LED (ATIME is 0 for both), with no reads and no restart
+    assert bus.transactions == 4
+    assert bus.bytes_read == 0
+    assert as7343._as7343.get('LED').LED_ACT
+    assert as7343.running
+
+    bus.reset_counters()
+    assert not dim.apply(as7343)
+    assert bus.transactions == 0
+
+
+def test_profile_restart():
+    """Test changing the channel count restarts the measurement."""
+    from as7343 import AS7343
+    from as7343.emulator import Emulator
+    from as7343.profile import Profile
+    bus = Emulator()
+    as7343 = AS7343(i2c_dev=bus)
+    as7343.start_measurement()
+
+    Profile("full", channels=18).apply(as7343)
+    assert as7343.running
+    assert as7343._as7343.get('ENABLE').SMUXEN
+    assert bus.fifo == []
@@ -0,0 +1,110 @@
+# noqa D100
+from array import array
+
+import pytest
+
+
+def make_frame(n):
+    from as7343 import CHANNELS, SpectralFrame
+    return SpectralFrame(array('H', [n * 100 + c for c in range(len(CHANNELS))]), 0x83 if n % 2 else 0x03, atime=n, astep=999, timestamp=1000.0 + n)
+
+
+def test_record_and_read(tmp_path):
+    """Test frames round trip through a recording."""
+    from as7343.recorder import Recorder, Recording
+    path = str(tmp_path / "capture.as7343")
+
+    with Recorder(path, capacity=10) as recorder:
+        for n in range(5):
+            recorder.append(make_frame(n))
+
+    with Recording(path) as recording:
+        assert len(recording) == 5
+        assert recording.capacity == 10
+        assert list(recording.channel('F1')) == [0, 100, 200, 300, 400]
+        assert list(recording.channel('VIS')) == [12, 112, 212, 312, 412]
+        assert list(recording.column('atime')) == [0, 1, 2, 3, 4]
+
+        frame = recording.frame(3)
+        assert list(frame.counts) == list(make_frame(3).counts)
+        assert frame.saturated and frame.gain == 4
+        assert (frame.atime, frame.astep, frame.timestamp) == (3, 999, 1003.0)
+
+
+def test_recording_time_slice(tmp_path):
+    """Test selecting frames by time."""
+    from as7343.recorder import Recorder, Recording
+    path = str(tmp_path / "capture.as7343")
+
+    with Recorder(path, capacity=10) as recorder:
+        for n in range(5):
+            recorder.append(make_frame(n))
+
+    recording = Recording(path)
+    frames = recording.time_slice(1001.0, 1003.0)
+    assert (frames.start, frames.stop) == (1, 3)
+    assert list(recording.channel('F2')[frames]) == [101, 201]
+    recording.close()
+
+
+def test_recorder_append_and_full(tmp_path):
+    """Test reopening a recording appends, and a full recording raises."""
+    from as7343.recorder import Recorder, Recording
+    path = str(tmp_path / "capture.as7343")
+
+    with Recorder(path, capacity=3) as recorder:
+        recorder.append(make_frame(0))
+
+    with Recorder(path) as recorder:
+        recorder.append(make_frame(1))
+        recorder.append(make_frame(2))
+        with pytest.raises(IndexError):
+            recorder.append(make_frame(3))
+
+    with Recording(path) as recording:
+        assert len(recording) == 3
+
+
+def test_replay(tmp_path):
+    """Test replaying frames through the AS7343 API."""
+    from as7343.recorder import Recorder, ReplaySource
+    path = str(tmp_path / "capture.as7343")
+
+    with Recorder(path, capacity=10) as recorder:
+        for n in range(3):
+            recorder.append(make_frame(n))
+
+    replay = ReplaySource(path)
+    replay.set_gain(1024)
+
+    data = replay.get_data()
+    assert data[0]['nir'] == 11
+    assert data[2]['f1'] == int(0 * 1.84)
+
+    frames = list(replay.stream(frame=True))
+    assert [frame.sequence for frame in frames] == [1, 2]
+    assert frames[1].data['F3'] == 202
+
+    with pytest.raises(EOFError):
+        replay.get_data()
+
+
+def test_not_a_recording(tmp_path, monkeypatch):
+    """Test opening something else fails, without leaving the file open."""
+    import as7343.recorder
+    from as7343.recorder import Recorder, Recording
+    path = tmp_path / "junk"
+    path.write_bytes(bytes(128))
+
+    opened = []
+
+    def tracked_open(*args, **kwargs):
+        opened.append(open(*args, **kwargs))
+        return opened[-1]
+
+    monkeypatch.setattr(as7343.recorder, "open", tracked_open, raising=False)
+    for cls in (Recording, Recorder):
+        with pytest.raises(ValueError):
+            cls(str(path))
+    assert len(opened) == 2
+    assert all(f.closed for f in opened)
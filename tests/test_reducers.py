@@ -0,0 +1,79 @@
+# noqa D100
+import math
+import statistics
+from array import array
+
+import pytest
+
+
+def frame(values, astatus=0b00000001, timestamp=0.0):
+    from as7343 import CHANNELS, SpectralFrame
+    return SpectralFrame(array('H', [values] * len(CHANNELS) if isinstance(values, int) else values), astatus, 0, 9999, timestamp)
+
+
+def test_mean_ema():
+    """Test the running mean and variance match the batch results, and the EMA follows a step."""
+    from as7343.reducers import EMA, Mean
+    samples = [10, 12, 9, 15, 11, 30, 8]
+    mean = Mean()
+    ema = EMA(alpha=0.5)
+    assert math.isnan(mean.value[0]) and math.isnan(mean.variance[0])
+    for sample in samples:
+        mean.update([float(sample)] * 13)
+        ema.update([float(sample)] * 13)
+    assert mean.value[0] == pytest.approx(statistics.mean(samples))
+    assert mean.variance[0] == pytest.approx(statistics.variance(samples))
+    assert mean.std[12] == pytest.approx(statistics.stdev(samples))
+
+    ema.reset()
+    ema.update([100.0] * 13)
+    assert ema.value[0] == 100.0
+    ema.update([200.0] * 13)
+    assert ema.value[0] == 150.0
+
+
+def test_rolling_window():
+    """Test median, minimum and maximum only cover the last few frames."""
+    from as7343.reducers import RollingWindow
+    samples = [5, 1, 9, 3, 7, 2, 8, 8, 0]
+    rolling = RollingWindow(4)
+    for n, sample in enumerate(samples):
+        rolling.update([float(sample)] * 13)
+        window = samples[max(0, n - 3):n + 1]
+        assert rolling.median[0] == statistics.median(window)
+        assert rolling.minimum[0] == min(window)
+        assert rolling.maximum[0] == max(window)
+    assert len(rolling._sorted[0]) == 4
+    assert math.isnan(RollingWindow(3, 'max').value[0])
+
+
+def test_stage():
+    """Test a stage decimates at a steady rate, drops saturated frames and resets blocks."""
+    from as7343.reducers import Mean, RollingWindow, Stage
+    frames = [frame(10 * n, timestamp=n) for n in range(1, 10)]
+    frames[4] = frame(65535, timestamp=5)               # Full scale
+    frames[5] = frame(60, astatus=0b10000001, timestamp=6)  # ASTATUS analog saturation
+
+    stage = Stage({'mean': Mean(), 'max': RollingWindow(9, 'max')}, decimate=3, reset=True)
+    results = list(stage.run(frames))
+    assert [result.timestamp for result in results] == [3, 6, 9]
+    assert [(result.count, result.rejected) for result in results] == [(3, 0), (1, 2), (3, 0)]
+    assert [result.values['mean'][0] for result in results] == [20, 40, 80]
+    assert results[1].values['max'][0] == 40
+
+
+def test_stage_stream():
+    """Test a stage runs on a sensor stream, normalising for gain."""
+    from as7343 import AS7343
+    from as7343.emulator import Emulator, LightSource
+    from as7343.reducers import Mean, Stage
+    bus = Emulator(LightSource(level=0.001))
+    as7343 = AS7343(i2c_dev=bus)
+    as7343.set_gain(16)
+    as7343.set_integration_time(5000)
+    as7343.set_measurement_time(3)
+
+    stage = Stage({'mean': Mean()}, decimate=4, normalise=True)
+    result = next(stage.run(as7343.stream(frame=True)))
+    assert result.count == 4
+    assert result.values['mean'][12] == pytest.approx(0.001, rel=0.05)
@@ -0,0 +1,120 @@
+# noqa D100
+import threading
+import time
+
+
+class FakeMuxBus:
+    """Route transfers to one of several fake sensors, selected through a TCA9548A at 0x70."""
+    def __init__(self, devices):
+        self.devices = devices
+        self.selected = None
+        self.selects = 0
+
+    def write_byte(self, i2c_address, value):
+        assert i2c_address == 0x70
+        self.selects += 1
+        self.selected = value.bit_length() - 1 if value else None
+
+    def read_i2c_block_data(self, i2c_address, register, length):
+        return self.devices[self.selected].read_i2c_block_data(i2c_address, register, length)
+
+    def write_i2c_block_data(self, i2c_address, register, values):
+        return self.devices[self.selected].write_i2c_block_data(i2c_address, register, values)
+
+
+def load_frame(i2c, nir):
+    i2c.fifo += [0x03, 1, 2, 3, nir, 5, 6]
+    i2c.regs[0xFD] = len(i2c.fifo)
+
+
+def make_array(smbus):
+    from as7343.sensorarray import SensorArray
+    muxed = FakeMuxBus({0: smbus.SMBus(1), 3: smbus.SMBus(1)})
+    direct = smbus.SMBus(2)
+    array = SensorArray([(1, 0), (1, 3), (2, None)], buses={1: muxed, 2: direct})
+    return array, {(1, 0): muxed.devices[0], (1, 3): muxed.devices[3], (2, None): direct}, muxed
+
+
+def test_sensor_array_get_data(smbus):
+    """Test every sensor is read through its own mux channel."""
+    array, devices, muxed = make_array(smbus)
+
+    for n, key in enumerate(array):
+        load_frame(devices[key], 10 + n)
+
+    frame_set = array.get_data(timeout=1.0)
+    array.close()
+
+    assert len(array) == 3
+    assert {key: data[0]['nir'] for key, data in frame_set.frames.items()} == {(1, 0): 10, (1, 3): 11, (2, None): 12}
+
+
+def test_sensor_array_call(smbus):
+    """Test calling a method across all sensors."""
+    array, devices, muxed = make_array(smbus)
+
+    array.call('set_gain', 64)
+    array.close()
+
+    for key in array:
+        assert array[key]._as7343.CFG1.get_AGAIN() == 64
+
+
+def test_sensor_array_stream(smbus):
+    """Test streamed frames are grouped by sequence number."""
+    array, devices, muxed = make_array(smbus)
+    array.call('set_measurement_time', 10)
+    array.call('set_integration_time', 1000)
+
+    stream = array.stream(timeout=1.0)
+
+    def load():
+        for key, i2c in devices.items():
+            load_frame(i2c, 1)
+            load_frame(i2c, 2)
+
+    timer = threading.Timer(0.1, load)
+    timer.start()
+    first = next(stream)
+    second = next(stream)
+    timer.join()
+    stream.close()
+    array.close()
+
+    assert set(first.frames) == set(devices)
+    assert all(frame.sequence == 0 and frame.data[0]['nir'] == 1 for frame in first.frames.values())
+    assert all(frame.sequence == 1 and frame.data[0]['nir'] == 2 for frame in second.frames.values())
+
+
+def test_sensor_array_stream_close(smbus):
+    """Test closing the stream stops the bus workers polling."""
+    array, devices, muxed = make_array(smbus)
+    array.call('set_measurement_time', 10)
+    array.call('set_integration_time', 1000)
+
+    stream = array.stream(timeout=5.0)
+
+    def load():
+        for i2c in devices.values():
+            load_frame(i2c, 1)
+
+    timer = threading.Timer(0.1, load)
+    timer.start()
+    next(stream)
+    timer.join()
+    stream.close()
+
+    reads = []
+    for i2c in devices.values():
+        read = i2c.read_i2c_block_data
+
+        def count(i2c_address, register, length, read=read):
+            reads.append(register)
+            return read(i2c_address, register, length)
+
+        i2c.read_i2c_block_data = count
+
+    time.sleep(0.05)
+    array.close()
+
+    assert reads == []
@@ -22,3 +22,53 @@ def test_fw_info_fail(smbus):
 
     with pytest.raises(RuntimeError):
         _ = AS7343(i2c_dev=i2c_dev)
+
+
+def test_soft_reset_polls(smbus):
+    """Test construction waits on INT_BUSY rather than a fixed delay."""
+    import time
+
+    from as7343 import AS7343
+    t_start = time.time()
+    AS7343()
+    assert time.time() - t_start < 0.5
+
+
+def test_soft_reset_busy(smbus):
+    """Test a reset that doesn't respond or stays busy times out."""
+    from as7343 import AS7343
+    as7343 = AS7343()
+    i2c = as7343._as7343._i2c
+    read_i2c_block_data = i2c.read_i2c_block_data
+    calls = []
+
+    def unresponsive(i2c_address, register, length):
+        if register == 0xBC:  # STATUS4
+            calls.append(register)
+            if len(calls) < 3:
+                raise OSError(121, "Remote I/O error")
+        return read_i2c_block_data(i2c_address, register, length)
+
+    i2c.read_i2c_block_data = unresponsive
+    as7343.soft_reset()
+    assert len(calls) == 3
+
+    i2c.regs[0xBC] = 0b00000001  # INT_BUSY
+    with pytest.raises(TimeoutError):
+        as7343.soft_reset(timeout=0.05)
+
+
+def test_attach(smbus):
+    """Test attaching to a configured sensor without resetting it."""
+    from as7343 import AS7343
+    i2c_dev = smbus.SMBus(1)
+    i2c_dev.regs[0xD6] = 0b01100000  # CFG20 auto_SMUX 18 channels
+    i2c_dev.regs[0x80] = 0b00010011  # ENABLE SMUXEN, SP_EN, PON
+    i2c_dev.regs[0x81] = 99          # ATIME
+
+    as7343 = AS7343(i2c_dev=i2c_dev, reset=False)
+
+    assert i2c_dev.regs[0xFA] & 0b00001000 == 0  # No SW_RESET
+    assert as7343._read_cycles == 3
+    assert as7343.running
+    assert i2c_dev.regs[0x81] == 99  # Configuration left alone
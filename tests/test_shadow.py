@@ -0,0 +1,101 @@
+# noqa D100
+
+
+def count_transfers(i2c):
+    """Record every read and write made through the fake bus."""
+    transfers = []
+    read_i2c_block_data = i2c.read_i2c_block_data
+    write_i2c_block_data = i2c.write_i2c_block_data
+
+    def read(i2c_address, register, length):
+        transfers.append(('read', register, length))
+        return read_i2c_block_data(i2c_address, register, length)
+
+    def write(i2c_address, register, values):
+        transfers.append(('write', register, list(values)))
+        return write_i2c_block_data(i2c_address, register, values)
+
+    i2c.read_i2c_block_data = read
+    i2c.write_i2c_block_data = write
+    return transfers
+
+
+def test_shadow_skips_reads_and_unchanged_writes(smbus):
+    """Test configuration registers are read-modify-written from the shadow."""
+    from as7343 import AS7343
+    as7343 = AS7343()
+    transfers = count_transfers(as7343._as7343._i2c)
+
+    as7343.set_gain(64)
+    assert transfers == [('write', 0xC6, [7])]
+
+    # Same value again, nothing to do
+    as7343.set_gain(64)
+    assert len(transfers) == 1
+
+
+def test_shadow_get_version(smbus):
+    """Test get_version only switches bank until the IDs are shadowed."""
+    from as7343 import AS7343, PART_ID
+    as7343 = AS7343()
+    transfers = count_transfers(as7343._as7343._i2c)
+
+    assert as7343.get_version()[2] == PART_ID
+    assert transfers == []
+
+
+def test_shadow_volatile(smbus):
+    """Test status registers are always read from the sensor."""
+    from as7343 import AS7343
+    as7343 = AS7343()
+    i2c = as7343._as7343._i2c
+
+    i2c.regs[0xBC] = 0b10000000
+    assert as7343._as7343.get('STATUS4').FIFO_OV
+    i2c.regs[0xBC] = 0
+    assert not as7343._as7343.get('STATUS4').FIFO_OV
+
+
+def test_configure_batches_writes(smbus):
+    """Test configure() combines adjacent registers into one block write."""
+    from as7343 import AS7343
+    as7343 = AS7343()
+    as7343._as7343.get('CFG3')  # Not set by the driver, so not in the shadow yet
+    transfers = count_transfers(as7343._as7343._i2c)
+
+    with as7343.configure():
+        as7343.set_gain(16)                          # CFG1 0xC6
+        as7343._as7343.set('CFG3', SAI=True)         # CFG3 0xC7
+        as7343.set_measurement_time(100)             # WTIME 0x83
+        assert transfers == []
+
+    assert transfers == [
+        ('write', 0x83, [34]),
+        ('write', 0xC6, [5, 0b00010000]),
+    ]
+    assert as7343._as7343.CFG1.get_AGAIN() == 16
+
+
+def test_configure_bank1(smbus):
+    """Test bank 1 registers are written with the bank selected."""
+    from as7343 import AS7343
+    as7343 = AS7343()
+    transfers = count_transfers(as7343._as7343._i2c)
+
+    with as7343.configure():
+        as7343._as7343.set('CFG12', SP_TH_CH=3)
+
+    assert transfers == [
+        ('write', 0xBF, [0b00010000]),
+        ('write', 0x66, [3]),
+        ('write', 0xBF, [0]),
+    ]
+
+
+def test_soft_reset_invalidates(smbus):
+    """Test a soft reset forgets the shadowed registers."""
+    from as7343 import AS7343
+    as7343 = AS7343()
+
+    as7343.soft_reset()
+    assert not as7343._as7343.is_shadowed('CFG1')
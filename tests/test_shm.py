@@ -0,0 +1,114 @@
+# noqa D100
+import os
+import subprocess
+import sys
+
+import pytest
+
+
+def frame(sequence, value=100, astatus=0b00000101):
+    from as7343 import SpectralFrame, StreamFrame
+    results = [astatus, value, value + 1, value + 2, value + 3, value + 4, value + 4]
+    return StreamFrame(sequence, 1000.0 + sequence, 0, SpectralFrame.from_results(results, 0, 999, 1000.0 + sequence))
+
+
+def test_shm_latest():
+    """Test readers see only the newest frame, and count the ones they missed."""
+    from as7343.shm import SharedFramePublisher, SharedFrameReader
+    name = f"as7343-test-{os.getpid()}"
+    with SharedFramePublisher(name) as publisher, SharedFrameReader(name) as reader:
+        assert reader.latest() is None
+        with pytest.raises(TimeoutError):
+            reader.wait(timeout=0.01)
+
+        publisher.publish(frame(0, 100))
+        latest = reader.latest()
+        assert latest.sequence == 0 and latest.timestamp == 1000.0
+        assert latest.data['FZ'] == 100 and latest.data.gain == 16 and latest.data.cycles == 1
+        assert latest.data.astep == 999
+
+        stream = reader.stream(frame=True)
+        publisher.publish(frame(1, 200))
+        assert next(stream).sequence == 1
+        for sequence in range(2, 6):
+            publisher.publish(frame(sequence, 300 + sequence))
+        item = next(stream)
+        assert (item.sequence, item.dropped, item.data['FZ']) == (5, 3, 305)
+        assert reader.published == 6
+
+        publisher.publish(frame(6, 400, astatus=0b10000101))
+        data = reader.get_data()
+        assert data[0]['fz'] > 0 and data[0]['saturated']
+
+
+def test_shm_other_process():
+    """Test a reader in another process gets the published frame."""
+    from as7343.shm import SharedFramePublisher
+    name = f"as7343-test-{os.getpid()}"
+    code = (
+        "from as7343.shm import SharedFrameReader\n"
+        f"with SharedFrameReader({name!r}) as reader:\n"
+        "    item = reader.wait(5.0)\n"
+        "    print(item.sequence, item.data['FXL'])\n"
+    )
+    with SharedFramePublisher(name) as publisher:
+        reader = subprocess.Popen([sys.executable, "-c", code], stdout=subprocess.PIPE, text=True,
+                                  cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        publisher.publish(frame(7, 500))
+        output, _ = reader.communicate(timeout=10)
+    assert output.split() == ["7", "502"]
+    assert reader.returncode == 0
+
+
+def test_shm_torn_write():
+    """Test a reader waits out a publisher that was preempted mid-write."""
+    import threading
+    import time
+
+    from as7343.shm import SharedFramePublisher, SharedFrameReader
+    name = f"as7343-test-{os.getpid()}"
+    with SharedFramePublisher(name) as publisher, SharedFrameReader(name) as reader:
+        publisher.publish(frame(1, 100))
+        publisher._seq[0] += 1  # Stall half way through a write
+
+        def finish():
+            time.sleep(0.05)
+            publisher._seq[0] += 1
+
+        thread = threading.Thread(target=finish)
+        thread.start()
+        assert reader.latest().sequence == 1
+        thread.join()
+
+
+def test_shm_replace():
+    """Test a live publisher's block is only replaced when asked, and a dead one's always is."""
+    from as7343.shm import SharedFramePublisher, SharedFrameReader
+    name = f"as7343-test-{os.getpid()}"
+    with SharedFramePublisher(name):
+        # Another process publishing under the same name
+        code = (
+            "import os\n"
+            "from as7343.shm import SharedFramePublisher\n"
+            "try:\n"
+            f"    SharedFramePublisher({name!r})\n"
+            "except FileExistsError:\n"
+            "    print('in use')\n"
+        )
+        output = subprocess.run([sys.executable, "-c", code], stdout=subprocess.PIPE, text=True, check=True,
+                                cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))).stdout
+        assert output.strip() == "in use"
+
+    # A publisher that exited without closing, leaving its block behind
+    code = (
+        "import os\n"
+        "from multiprocessing import resource_tracker\n"
+        "from as7343.shm import SharedFramePublisher\n"
+        f"publisher = SharedFramePublisher({name!r})\n"
+        "resource_tracker.unregister(publisher._shm._name, 'shared_memory')\n"
+        "os._exit(0)\n"
+    )
+    subprocess.run([sys.executable, "-c", code], check=True, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    with SharedFramePublisher(name) as publisher, SharedFrameReader(name) as reader:
+        publisher.publish(frame(3))
+        assert reader.latest().sequence == 3
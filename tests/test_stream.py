@@ -0,0 +1,84 @@
+# noqa D100
+import threading
+import time
+
+
+def load_frames(i2c, frames, overflow=False):
+    """Queue whole 6 channel frames in the fake FIFO."""
+    for frame in frames:
+        i2c.fifo += [0x03] + frame
+    i2c.regs[0xFD] = len(i2c.fifo)
+    if overflow:
+        i2c.regs[0xBC] |= 0b10000000
+
+
+def test_stream_splits_frames(smbus):
+    """Test several frames drained together are split and sequenced."""
+    from as7343 import AS7343
+    as7343 = AS7343()
+    i2c = as7343._as7343._i2c
+
+    stream = as7343.stream(timeout=1.0)
+    timer = threading.Timer(0.05, load_frames, (i2c, [[1, 2, 3, 4, 5, 6], [7, 8, 9, 10, 11, 12]]))
+    timer.start()
+
+    first = next(stream)
+    second = next(stream)
+    timer.join()
+
+    assert (first.sequence, first.dropped) == (0, 0)
+    assert (second.sequence, second.dropped) == (1, 0)
+    assert first.data[0]['nir'] == 4
+    assert second.data[0]['nir'] == 10
+    assert first.timestamp < second.timestamp <= time.time()
+    assert as7343.running
+
+
+def test_stream_partial_frame(smbus):
+    """Test a partial frame is left in the FIFO for the next drain."""
+    from as7343 import AS7343
+    as7343 = AS7343()
+    i2c = as7343._as7343._i2c
+
+    stream = as7343.stream(timeout=1.0)
+
+    def partial():
+        load_frames(i2c, [[1, 2, 3, 4, 5, 6]])
+        i2c.fifo += [0x03, 13, 14]
+        i2c.regs[0xFD] = len(i2c.fifo)
+
+    timer = threading.Timer(0.05, partial)
+    timer.start()
+    frame = next(stream)
+    timer.join()
+
+    assert frame.data[0]['nir'] == 4
+    assert i2c.fifo == [0x03, 13, 14]
+
+
+def test_stream_overflow(smbus):
+    """Test a FIFO overflow is cleared and reported as dropped frames."""
+    from as7343 import AS7343
+    as7343 = AS7343()
+    i2c = as7343._as7343._i2c
+    # Frames are due well before the timers fire, so reads don't sleep past them
+    as7343.set_integration_time(5000)
+    as7343.set_measurement_time(10)
+
+    stream = as7343.stream(timeout=1.0)
+
+    timer = threading.Timer(0.05, load_frames, (i2c, [[1, 2, 3, 4, 5, 6]]))
+    timer.start()
+    first = next(stream)
+    timer.join()
+
+    load_frames(i2c, [[0, 0, 0, 0, 0, 0]], overflow=True)
+    timer = threading.Timer(0.1, load_frames, (i2c, [[7, 8, 9, 10, 11, 12]]))
+    timer.start()
+    second = next(stream)
+    timer.join()
+
+    assert first.sequence == 0
+    assert second.dropped >= 1
+    assert second.sequence == 1 + second.dropped
+    assert second.data[0]['nir'] == 10